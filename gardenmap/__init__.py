@@ -1,15 +1,34 @@
 #!/usr/bin/env python
 
+import datetime
+import itertools
+import json
+import math
+import mimetypes
 import os
-from flask import Flask, render_template, request, jsonify
+import zlib
+from flask import Flask, Response, abort, current_app, g, render_template, request, jsonify, send_file, stream_with_context
 from flask_smorest import Api, Blueprint
 from marshmallow import validate, ValidationError
 import pathlib
-from typing import Any, Iterable, List
-
-
-from .schemas import GardenItemSchema, PlantSchema, VegetationSchema
+from typing import Any, Iterable, List, Mapping, Optional
+from werkzeug.http import http_date
+from werkzeug.local import LocalProxy
+from werkzeug.security import safe_join
+
+
+from .events import event_stream
+from .export import REVISION as EXPORT_REVISION
+from .grid import MAX_ITEMS
+from .icons import SPRITE_DIR, built_path, precompressed, sprite_manifest
+from .importer import CHUNK_SIZE, MAX_ERRORS, ImportFormatError, JSONItemReader, chunked, validate_chunk
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, SlowRequestProfiler
+from .projection import PLANT_FIELDS
+from .search import FACETS
+from .schemas import GardenItemSchema, PlantSchema, VegetationSchema, load_garden_items
+from .state import GARDEN_ID, AppState, GardenState
 from .storage import StorageError
+from .storage.columns import MIME_TYPE as COLUMNAR_MIME_TYPE, ColumnarError, GardenColumns
 
 
 # current working directory
@@ -20,50 +39,132 @@ STORAGE_BACKEND = os.getenv("GARDENMAP_STORAGE", "json").lower()
 # json storage settings
 JSON_PALETTE_PATH = os.getenv("GARDENMAP_PALETTE_PATH", str(cwd / "plants.json"))
 JSON_DATA_PATH = os.getenv("GARDENMAP_DATA_PATH", str(cwd / "garden.json"))
+# append garden mutations to a journal instead of rewriting garden.json
+JSON_JOURNAL = os.getenv("GARDENMAP_JSON_JOURNAL", "0") == "1"
+# cm (max_width of plants) per map unit, for /garden/conflicts
+CM_PER_UNIT = float(os.getenv("GARDENMAP_CM_PER_UNIT", "10"))
 # sqlite storage settings
 SQLITE_DB_PATH = os.getenv("GARDENMAP_DB_PATH", str(cwd / "gardenmap.db"))
+# collect timings for /metrics
+METRICS = os.getenv("GARDENMAP_METRICS", "0") == "1"
+# log sampled stacks of requests slower than this many seconds (needs METRICS, 0: off)
+PROFILE_SLOW = float(os.getenv("GARDENMAP_PROFILE_SLOW", "0"))
+# commit concurrent garden mutations of a process together (see gardenmap.storage.batch)
+GROUP_COMMIT = os.getenv("GARDENMAP_GROUP_COMMIT", "0") == "1"
+# seconds to wait for more writes before committing a batch, max. mutations per batch
+GROUP_COMMIT_WINDOW = float(os.getenv("GARDENMAP_GROUP_COMMIT_WINDOW", "0"))
+GROUP_COMMIT_MAX = int(os.getenv("GARDENMAP_GROUP_COMMIT_MAX", "256"))
+# gardenmap.asgi: threads answering requests, requests waiting for one (more get 503)
+ASGI_THREADS = int(os.getenv("GARDENMAP_ASGI_THREADS", "32"))
+ASGI_QUEUE = int(os.getenv("GARDENMAP_ASGI_QUEUE", "256"))
+# serve the gardens in subdirectories of this directory at /g/<garden_id>/ (unset: off)
+GARDENS_DIR = os.getenv("GARDENMAP_GARDENS_DIR")
+# max. gardens kept open per process, seconds until an unused one is closed
+GARDENS_MAX_OPEN = int(os.getenv("GARDENMAP_GARDENS_MAX_OPEN", "128"))
+GARDENS_IDLE = float(os.getenv("GARDENMAP_GARDENS_IDLE", "600"))
+# "shared": gardens use the default palette, "own": a copy of it per garden
+GARDENS_PALETTE = os.getenv("GARDENMAP_GARDENS_PALETTE", "shared").lower()
+
+# app configuration (see create_app)
+DEFAULT_CONFIG = {
+    "API_TITLE": "gardenmap API",
+    "API_VERSION": "v1",
+    "OPENAPI_VERSION": "3.0.2",
+    # Where the OpenAPI spec is served from (root is fine)
+    "OPENAPI_URL_PREFIX": "/",
+    # Swagger UI setup (served by flask-smorest if desired)
+    "OPENAPI_SWAGGER_UI_PATH": "/swagger-ui",
+    "OPENAPI_SWAGGER_UI_URL": "https://cdn.jsdelivr.net/npm/swagger-ui-dist/",
+    # limit request size (MB)
+    "MAX_CONTENT_LENGTH": 40 * 1024 * 1024,
+    # limit size of streamed POST /garden/import bodies (None: no limit)
+    "IMPORT_MAX_CONTENT_LENGTH": None,
+    "GARDENMAP_STORAGE": STORAGE_BACKEND,
+    "GARDENMAP_PALETTE_PATH": JSON_PALETTE_PATH,
+    "GARDENMAP_DATA_PATH": JSON_DATA_PATH,
+    "GARDENMAP_JSON_JOURNAL": JSON_JOURNAL,
+    "GARDENMAP_CM_PER_UNIT": CM_PER_UNIT,
+    "GARDENMAP_DB_PATH": SQLITE_DB_PATH,
+    "GARDENMAP_METRICS": METRICS,
+    "GARDENMAP_PROFILE_SLOW": PROFILE_SLOW,
+    "GARDENMAP_GROUP_COMMIT": GROUP_COMMIT,
+    "GARDENMAP_GROUP_COMMIT_WINDOW": GROUP_COMMIT_WINDOW,
+    "GARDENMAP_GROUP_COMMIT_MAX": GROUP_COMMIT_MAX,
+    "GARDENMAP_ASGI_THREADS": ASGI_THREADS,
+    "GARDENMAP_ASGI_QUEUE": ASGI_QUEUE,
+    "GARDENMAP_GARDENS_DIR": GARDENS_DIR,
+    "GARDENMAP_GARDENS_MAX_OPEN": GARDENS_MAX_OPEN,
+    "GARDENMAP_GARDENS_IDLE": GARDENS_IDLE,
+    "GARDENMAP_GARDENS_PALETTE": GARDENS_PALETTE,
+}
+
+def _state() -> GardenState:
+    """
+    Backends and indexes of the garden of the current request: the default
+    garden or /g/<garden_id>/ (set up on first use in this process).
+    """
+    if "garden_state" not in g:
+        state = current_app.extensions["gardenmap"].load()
+        garden_id = g.get("garden_id")
+        # gardens are only created by writes adding something, see AppState.garden()
+        if request.method == "DELETE" and garden_id is not None and not state.garden_exists(garden_id):
+            abort(404)
+        g.garden_state = state.garden(garden_id, create=request.method not in ("GET", "HEAD", "OPTIONS"))
+    return g.garden_state
+
+# shortcuts for the handlers
+palette_storage = LocalProxy(lambda: _state().palette_storage)
+garden_storage = LocalProxy(lambda: _state().garden_storage)
+garden_grid = LocalProxy(lambda: _state().garden_grid)
+conflict_index = LocalProxy(lambda: _state().conflict_index)
+palette_projection = LocalProxy(lambda: _state().palette_projection)
+palette_index = LocalProxy(lambda: _state().palette_index)
+svg_exporter = LocalProxy(lambda: _state().svg_exporter)
+garden_notifier = LocalProxy(lambda: _state().garden_notifier)
+metrics = LocalProxy(lambda: current_app.extensions["gardenmap"].metrics)
+
+
+def static_precompressed(filename):
+    """Serve static files, preferring minified and .br/.gz variants written by gardenmap-icons."""
+    path = safe_join(current_app.static_folder, filename)
+    if path is None:
+        abort(404)
+    # sprite sheets are build output themselves, with their variants next to them
+    built = None if filename.startswith(f"{SPRITE_DIR}/") else built_path(current_app.static_folder, filename)
+    served, encoding = precompressed(path, request.accept_encodings, built)
+    if served == path:
+        response = current_app.send_static_file(filename)
+    else:
+        response = send_file(
+            served,
+            mimetype=mimetypes.guess_type(filename)[0],
+            conditional=True,
+            max_age=current_app.get_send_file_max_age(filename)
+        )
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    if filename.startswith(f"{SPRITE_DIR}/month-"):
+        # sprite sheet names contain their content hash
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+    return response
+
 
-# initialize storage backend
-match STORAGE_BACKEND:
-
-    case "json":
-        from .storage.json import JSONFileStorage
-        palette_storage = JSONFileStorage(JSON_PALETTE_PATH)
-        garden_storage = JSONFileStorage(JSON_DATA_PATH)
-
-    case "sqlite":
-        from .storage.sqlite import SQLiteStorage
-        palette_storage = SQLiteStorage(SQLITE_DB_PATH, table="palette")
-        garden_storage = SQLiteStorage(SQLITE_DB_PATH, table="garden")
-
-    case _:
-        raise ArgumentError(f"invalid value \"{STORAGE_BACKEND}\" for STORAGE_BACKEND")
-
-
-# initialize flask
-app = Flask(__name__, static_url_path='')
-
-# minimal OpenAPI / flask-smorest configuration required by the library
-app.config.update(
-    {
-        "API_TITLE": "gardenmap API",
-        "API_VERSION": "v1",
-        "OPENAPI_VERSION": "3.0.2",
-        # Where the OpenAPI spec is served from (root is fine)
-        "OPENAPI_URL_PREFIX": "/",
-        # Swagger UI setup (served by flask-smorest if desired)
-        "OPENAPI_SWAGGER_UI_PATH": "/swagger-ui",
-        "OPENAPI_SWAGGER_UI_URL": "https://cdn.jsdelivr.net/npm/swagger-ui-dist/",
-        # limit request size (MB)
-        "MAX_CONTENT_LENGTH": 40 * 1024 * 1024
-    }
-)
-app.config.from_prefixed_env()
-
-# create API
-api = Api(app)
 # keep endpoints at same paths as before by registering a blueprint without a prefix
+# (and once more at /g/<garden_id> with GARDENMAP_GARDENS_DIR)
 blp = Blueprint("gardenmap", "gardenmap")
+# routes of the process, not of a garden
+metrics_blp = Blueprint("metrics", "metrics")
+
+@blp.url_value_preprocessor
+def _pull_garden_id(endpoint, values):
+    garden_id = (values or {}).pop("garden_id", None)
+    if garden_id is not None and not GARDEN_ID.fullmatch(garden_id):
+        abort(404)
+    g.garden_id = garden_id
 
 def _get_json_request():
     """Safely retrieve JSON body with size limits and validation."""
@@ -72,9 +173,116 @@ def _get_json_request():
         return None, (jsonify({"error": "invalid or missing JSON body"}), 400)
     return data, None
 
+def _is_columnar():
+    """Whether the request body is (or the response should be) in the columnar format."""
+    return request.args.get("format") == "columnar" or request.mimetype == COLUMNAR_MIME_TYPE
+
+def _get_columnar_request():
+    """Decode a columnar request body into a list of garden items."""
+    try:
+        columns = GardenColumns.decode(request.get_data(cache=False))
+    except ColumnarError as e:
+        return None, (jsonify({"error": f"invalid columnar body: {e}"}), 400)
+    items = list(columns.plants())
+    incomplete = [p["id"] for p in items if not {"plant_id", "x", "y"} <= p.keys()]
+    if incomplete:
+        return None, (jsonify({"error": "validation_failed", "details": "plant_id, x and y required", "ids": incomplete}), 422)
+    try:
+        with metrics.validation("garden_item"):
+            items = load_garden_items(items)
+    except ValidationError as e:
+        return None, (jsonify({"error": "validation_failed", "details": e.messages}), 422)
+    return items, None
+
+def _conditional(storage, *variant):
+    """
+    ETag/Last-Modified headers for a GET of storage data and, if the client's
+    copy is still current, the 304 response to send instead of the data.
+    """
+    version = storage.version()
+    if version is None:
+        return {}, None
+    etag = "-".join((version, f"{zlib.crc32(request.query_string):x}", *variant))
+    # always revalidate, the ETag makes that cheap
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    modified = storage.last_modified()
+    if modified:
+        headers["Last-Modified"] = http_date(modified)
+    if request.if_none_match:
+        if request.if_none_match.contains(etag):
+            return headers, Response(status=304, headers=headers)
+    elif modified and request.if_modified_since and int(modified) <= request.if_modified_since.timestamp():
+        return headers, Response(status=304, headers=headers)
+    return headers, None
+
+def _stream_plantlist(items: Iterable[str], headers, **extra):
+    """
+    Respond with {"plantlist": [...], **extra}, written piecewise from
+    JSON texts of the plants instead of serializing one big document.
+    """
+    def generate():
+        sep = '{"plantlist":['
+        parts = []
+        for text in items:
+            parts.append(sep)
+            parts.append(text)
+            sep = ","
+            if len(parts) >= 1024:
+                yield "".join(parts)
+                parts = []
+        if sep != ",":
+            # no plants
+            parts.append(sep)
+        parts.append("]")
+        for key, value in extra.items():
+            parts.append(f",{json.dumps(key)}:{json.dumps(value, ensure_ascii=False)}")
+        parts.append("}\n")
+        yield "".join(parts)
+
+    return Response(generate(), mimetype="application/json", headers=headers)
+
+def _get_projection_args():
+    """Parse optional ?fields=a,b,... and ?month=1..12 query arguments."""
+    fields = request.args.get("fields")
+    month = request.args.get("month")
+    if fields is not None:
+        fields = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = fields - set(PLANT_FIELDS)
+        if unknown:
+            return None, None, (jsonify({"error": f"unknown fields: {', '.join(sorted(unknown))}"}), 400)
+        # id is always needed to refer to a plant
+        fields = tuple(sorted(fields | {"id"}))
+    if month is not None:
+        try:
+            month = int(month)
+            if not 1 <= month <= 12:
+                raise ValueError
+        except ValueError:
+            return None, None, (jsonify({"error": "invalid month, expected 1..12"}), 400)
+    return fields, month, None
+
+def _get_bbox_arg():
+    """Parse optional ?bbox=x0,y0,x1,y1 query argument."""
+    raw = request.args.get("bbox")
+    if raw is None:
+        return None, None
+    try:
+        x0, y0, x1, y1 = (float(v) for v in raw.split(","))
+        if not all(math.isfinite(v) for v in (x0, y0, x1, y1)):
+            raise ValueError
+    except ValueError:
+        return None, (jsonify({"error": "invalid bbox, expected x0,y0,x1,y1"}), 400)
+    return (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)), None
+
+def _render_index():
+    # called when templates changed: jinja only notices by itself with TEMPLATES_AUTO_RELOAD
+    if current_app.jinja_env.cache is not None:
+        current_app.jinja_env.cache.clear()
+    return render_template("index.html")
+
 @blp.route('/')
 def index():
-    return render_template("index.html")
+    return current_app.extensions["gardenmap"].index_page.response(request, _render_index)
 
 @blp.route('/plants', methods=['GET', 'POST', 'PUT'])
 def plants():
@@ -88,7 +296,8 @@ def plants():
 
             schema = PlantSchema(many=isinstance(raw, list))
             try:
-                items = schema.load(raw)
+                with metrics.validation("plant"):
+                    items = schema.load(raw)
             except ValidationError as e:
                 return jsonify({"error": "validation_failed", "details": e.messages}), 422
 
@@ -107,7 +316,8 @@ def plants():
                 return err
 
             try:
-                updated = PlantSchema().load(raw)
+                with metrics.validation("plant"):
+                    updated = PlantSchema().load(raw)
             except ValidationError as e:
                 return jsonify({"error": "validation_failed", "details": e.messages}), 422
 
@@ -121,29 +331,96 @@ def plants():
             return jsonify({'status': 'updated'})
 
         case _:
+            fields, month, err = _get_projection_args()
+            if err:
+                return err
+
             try:
-                data = palette_storage.get_wrapped()
-                return jsonify(data)
+                # per-month icon sprite sheets (see gardenmap-icons --sprites)
+                sprites = sprite_manifest(current_app.static_folder)
+                sprites_tag = f"{zlib.crc32(''.join(s['url'] for s in sprites.values()).encode()):x}"
+                headers, not_modified = _conditional(palette_storage, sprites_tag)
+                if not_modified:
+                    return not_modified
+                extra = {"sprites": sprites} if sprites else {}
+                if fields or month:
+                    data = {"plantlist": palette_projection.get(palette_storage, fields, month)[0], **extra}
+                    return jsonify(data), headers
+                return _stream_plantlist(palette_storage.iter_json(), headers, **extra)
             except Timeout:
                 return jsonify({'error': 'resource busy, try again later'}), 503
             except StorageError:
                 return jsonify({'error': 'failed to read data'}), 500
 
 
+@blp.route('/plants/search', methods=['GET'])
+def plants_search():
+    """
+    Ids of palette plants matching all given criteria, best match first:
+      ?q=<words>                     words (or their beginnings) in name, trivname or notes
+      ?location=, ?soil=, ?snails=,
+      ?type=, ?lifetime=             one of the values (repeatable)
+      ?bloom=<month>[-<month>]       in bloom in any month of the range
+      ?limit=<n>
+    """
+    facets = {f: request.args.getlist(f) for f in (*FACETS, "lifetime") if request.args.getlist(f)}
+    months = None
+    try:
+        if "bloom" in request.args:
+            first, _, last = request.args["bloom"].partition("-")
+            first = int(first)
+            last = int(last) if last else first
+            if not (1 <= first <= 12 and 1 <= last <= 12):
+                raise ValueError
+            months = range(first, last + 1) if first <= last else [*range(first, 13), *range(1, last + 1)]
+        limit = int(request.args["limit"]) if "limit" in request.args else None
+        if limit is not None and limit < 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'invalid bloom or limit'}), 400
+
+    try:
+        headers, not_modified = _conditional(palette_storage)
+        if not_modified:
+            return not_modified
+        # rebuild if never built or changed by another worker
+        version = palette_storage.version()
+        with palette_index.lock:
+            if not palette_index.built or version != palette_index.version:
+                palette_index.rebuild(palette_storage.get_all())
+                palette_index.version = version
+        ids = palette_index.search(request.args.get("q", ""), facets, months, limit)
+        return jsonify({"ids": ids}), headers
+    except StorageError:
+        return jsonify({'error': 'failed to read data'}), 500
+
+
 @blp.route('/garden', methods=['GET', 'POST', 'PUT', 'DELETE'])
 def garden():
     global garden_storage
 
     match request.method:
+        case 'POST' if _is_columnar():
+            items, err = _get_columnar_request()
+            if err:
+                return err
+
+            try:
+                garden_storage.append(items)
+            except StorageError:
+                return jsonify({'error': 'failed to write data'}), 500
+
+            return jsonify({'status': 'success'})
+
         case 'POST':
             raw, err = _get_json_request()
             if err:
                 return err
 
             many = isinstance(raw, list)
-            schema = GardenItemSchema(many=many)
             try:
-                items = schema.load(raw)
+                with metrics.validation("garden_item"):
+                    items = load_garden_items(raw, many=many)
             except ValidationError as e:
                 return jsonify({"error": "validation_failed", "details": e.messages}), 422
 
@@ -169,20 +446,26 @@ def garden():
 
         case 'PUT':
             # update one or more placed plants. Client typically sends [{id,x,y}, ...]
-            raw, err = _get_json_request()
-            if err:
-                return err
-
-            if not isinstance(raw, list):
-                raw_items = [raw]
+            if _is_columnar():
+                validated, err = _get_columnar_request()
+                if err:
+                    return err
             else:
-                raw_items = raw
+                raw, err = _get_json_request()
+                if err:
+                    return err
 
-            # For update semantics we require id present on each item
-            try:
-                validated: List[dict] = GardenItemSchema(many=True).load(raw_items)
-            except ValidationError as e:
-                return jsonify({"error": "validation_failed", "details": e.messages}), 422
+                if not isinstance(raw, list):
+                    raw_items = [raw]
+                else:
+                    raw_items = raw
+
+                # For update semantics we require id present on each item
+                try:
+                    with metrics.validation("garden_item"):
+                        validated: List[dict] = load_garden_items(raw_items)
+                except ValidationError as e:
+                    return jsonify({"error": "validation_failed", "details": e.messages}), 422
 
             try:
                 # Use storage-specific batch update (merging semantics preserved)
@@ -209,13 +492,15 @@ def garden():
                     deleted_ids = payload
                 else:
                     try:
-                        items = GardenItemSchema(many=True).load(payload)
+                        with metrics.validation("garden_item"):
+                            items = load_garden_items(payload)
                     except ValidationError as e:
                         return jsonify({"error": "validation_failed", "details": e.messages}), 422
                     deleted_ids = [p['id'] for p in items]
             elif isinstance(payload, dict):
                 try:
-                    item = GardenItemSchema().load(payload)
+                    with metrics.validation("garden_item"):
+                        item = load_garden_items(payload, many=False)
                 except ValidationError as e:
                     return jsonify({"error": "validation_failed", "details": e.messages}), 422
                 deleted_ids = [item['id']]
@@ -232,22 +517,286 @@ def garden():
             return jsonify({'status': 'deleted'})
 
         case _:
+            bbox, err = _get_bbox_arg()
+            if err:
+                return err
+            fields, month, err = _get_projection_args()
+            if err:
+                return err
+            join = fields is not None or month is not None
+            columnar = _is_columnar()
+
             try:
-                data = garden_storage.get_wrapped()
-                return jsonify(data)
+                # a joined palette changes the response, too
+                variant = (palette_storage.version() or "",) if join else ()
+                headers, not_modified = _conditional(garden_storage, *variant)
+                if not_modified:
+                    return not_modified
+                if columnar:
+                    if bbox:
+                        columns = GardenColumns.from_plants(garden_storage.get_bbox(*bbox))
+                    else:
+                        columns = garden_storage.get_columns()
+                    header = {"version": garden_storage.version()}
+                    if join:
+                        by_id = palette_projection.get(palette_storage, fields, month)[1]
+                        header["plants"] = {pid: by_id[pid] for pid in columns.plant_ids if pid in by_id}
+                    return Response(columns.encode(**header), mimetype=COLUMNAR_MIME_TYPE, headers=headers)
+                if bbox:
+                    data = {"plantlist": garden_storage.get_bbox(*bbox)}
+                elif not join:
+                    return _stream_plantlist(garden_storage.iter_json(), headers)
+                else:
+                    data = garden_storage.get_wrapped()
+                if join:
+                    # projected palette entries of the plants placed
+                    by_id = palette_projection.get(palette_storage, fields, month)[1]
+                    used = {p.get("plant_id") for p in data["plantlist"]}
+                    data["plants"] = {pid: by_id[pid] for pid in used if pid in by_id}
+                return jsonify(data), headers
             except StorageError:
                 return jsonify({'error': 'failed to read data'}), 500
 
 
+@blp.route('/garden/export.svg', methods=['GET'])
+def garden_export_svg():
+    """Self-contained SVG of the garden in ?month=N (default: this month), optionally only ?bbox=x0,y0,x1,y1."""
+    bbox, err = _get_bbox_arg()
+    if err:
+        return err
+    _, month, err = _get_projection_args()
+    if err:
+        return err
+    if month is None:
+        month = datetime.date.today().month
 
-api.register_blueprint(blp)
+    def load():
+        plants = palette_projection.get(palette_storage, ("id", "scale", "vegetation"), month)[1]
+        placements = garden_storage.get_bbox(*bbox) if bbox else garden_storage.get_all()
+        return plants, placements
+
+    try:
+        palette_version = palette_storage.version()
+        headers, not_modified = _conditional(garden_storage, palette_version or "", str(month), EXPORT_REVISION)
+        if not_modified:
+            return not_modified
+        garden_version = garden_storage.version()
+        version = (garden_version, palette_version) if garden_version and palette_version else None
+        body = svg_exporter.export(version, month, bbox, load)
+        # read (or fail) before the response starts
+        first = next(body)
+    except StorageError:
+        return jsonify({'error': 'failed to read data'}), 500
+    except OSError:
+        return jsonify({'error': 'failed to read map'}), 500
+    headers["Content-Disposition"] = f'attachment; filename="garden-{month}.svg"'
+    return Response(itertools.chain([first], body), mimetype="image/svg+xml", headers=headers)
+
+
+@blp.route('/garden/import', methods=['POST'])
+def garden_import():
+    """
+    Import a garden export of any size. The body is parsed while it is
+    received and stored CHUNK_SIZE items at a time. Invalid items are
+    skipped. The response streams one JSON line per stored chunk
+      {"imported": n, "rejected": m}
+    followed by the result
+      {"status": "success"|"failed", "imported": n, "rejected": m, "errors": {index: messages}}
+    """
+    request.max_content_length = current_app.config["IMPORT_MAX_CONTENT_LENGTH"]
+    reader = JSONItemReader(request.stream)
+    result = {"imported": 0, "rejected": 0}
+    errors = {}
+
+    def valid_chunks():
+        offset = 0
+        for chunk in chunked(reader, CHUNK_SIZE):
+            with metrics.validation("garden_item"):
+                valid, rejected = validate_chunk(chunk, offset)
+            offset += len(chunk)
+            result["rejected"] += len(rejected)
+            for index, messages in rejected.items():
+                if len(errors) < MAX_ERRORS:
+                    errors[index] = messages
+            if valid:
+                yield valid
+
+    def generate():
+        try:
+            for count in garden_storage.bulk_append(valid_chunks()):
+                result["imported"] = count
+                yield json.dumps(result) + "\n"
+            result["status"] = "success"
+        except ImportFormatError as e:
+            result.update({"status": "failed", "error": str(e)})
+        except StorageError:
+            result.update({"status": "failed", "error": "failed to write data"})
+        result["errors"] = errors
+        yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@blp.route('/garden/changes', methods=['GET'])
+def garden_changes():
+    """
+    Changes of the garden since ?since=<version>:
+      {"version": ..., "changes": [{"version", "op", "ids", "data"}, ...]}
+    or, without ?since or if those changes are no longer known, the whole garden:
+      {"version": ..., "snapshot": [...]}
+    """
+    since = request.args.get("since")
+    try:
+        if since:
+            version, changes = garden_storage.changes_since(since)
+            if changes is not None:
+                return jsonify({"version": version, "changes": changes})
+        version, plantlist = garden_storage.snapshot()
+        return jsonify({"version": version, "snapshot": plantlist})
+    except StorageError:
+        return jsonify({'error': 'failed to read data'}), 500
+
+
+@blp.route('/garden/events', methods=['GET'])
+def garden_events():
+    """Server-Sent Events stream of garden changes after ?since=<version> (or Last-Event-ID)."""
+    since = request.headers.get("Last-Event-ID") or request.args.get("since", "")
+    try:
+        # fail early (with a proper status) if storage is unavailable
+        garden_storage.changes_since(since)
+    except StorageError:
+        return jsonify({'error': 'failed to read data'}), 500
+    state = _state()
+    ended = current_app.extensions["gardenmap"].until_created(g.get("garden_id"), state)
+    return Response(
+        stream_with_context(event_stream(state.garden_storage, state.garden_notifier, since, ended=ended)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@blp.route('/garden/view', methods=['GET'])
+def garden_view():
+    """
+    Placed plants inside ?bbox=x0,y0,x1,y1 for display at ?zoom=<scale>.
+    Returns single plants when zoomed in (or few plants are in view),
+    otherwise one cluster per grid cell.
+    """
+    bbox, err = _get_bbox_arg()
+    if err:
+        return err
+    if bbox is None:
+        return jsonify({'error': 'bbox required'}), 400
+    # grid cells of infinite bounds can't be computed
+    if not all(math.isfinite(v) for v in bbox):
+        return jsonify({'error': 'invalid bbox, expected x0,y0,x1,y1'}), 400
+    try:
+        zoom = float(request.args.get("zoom", 1))
+        if not zoom > 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'invalid zoom'}), 400
+
+    try:
+        headers, not_modified = _conditional(garden_storage)
+        if not_modified:
+            return not_modified
+        # rebuild if never built or changed by another worker
+        version = garden_storage.version()
+        if not garden_grid.built or version != garden_grid.version:
+            garden_grid.rebuild(garden_storage.get_all())
+            garden_grid.version = version
+        level = garden_grid.level_for_zoom(zoom)
+        if level == 0 or garden_grid.count(*bbox) <= MAX_ITEMS:
+            return jsonify({"level": None, "plantlist": garden_storage.get_bbox(*bbox), "clusters": []}), headers
+        return jsonify({
+            "level": garden_grid.cell_sizes[level],
+            "plantlist": [],
+            "clusters": garden_grid.clusters(level, *bbox)
+        }), headers
+    except StorageError:
+        return jsonify({'error': 'failed to read data'}), 500
+
+
+@blp.route('/garden/conflicts', methods=['GET'])
+def garden_conflicts():
+    """
+    Pairs of placed plants closer to each other than half their max_width
+    each, optionally only those with a plant inside ?bbox=x0,y0,x1,y1:
+      {"conflicts": [{"ids", "plant_ids", "distance", "min_distance"}, ...]}
+    """
+    bbox, err = _get_bbox_arg()
+    if err:
+        return err
+
+    try:
+        palette_version = palette_storage.version()
+        headers, not_modified = _conditional(garden_storage, palette_version or "")
+        if not_modified:
+            return not_modified
+        # rebuild if never built or changed by another worker
+        version = garden_storage.version()
+        with conflict_index.lock:
+            if not conflict_index.built or version != conflict_index.version \
+                    or palette_version != conflict_index.palette_version:
+                conflict_index.rebuild(palette_storage.get_all(), garden_storage.get_all())
+                conflict_index.version = version
+                conflict_index.palette_version = palette_version
+        return jsonify({"conflicts": conflict_index.pairs(bbox)}), headers
+    except StorageError:
+        return jsonify({'error': 'failed to read data'}), 500
+
+
+@metrics_blp.route('/metrics', methods=['GET'])
+def metrics_view():
+    """Request and storage timings of this process in Prometheus text format (GARDENMAP_METRICS=1)."""
+    if not metrics.enabled:
+        abort(404)
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+def create_app(config: Optional[Mapping[str, Any]] = None) -> Flask:
+    """
+    Create the flask app. Configuration is DEFAULT_CONFIG (from GARDENMAP_*
+    environment variables), FLASK_* environment variables and `config`, in
+    that order. Storage is opened on first use, see AppState.
+    """
+    app = Flask(__name__, static_url_path='')
+    app.config.update(DEFAULT_CONFIG)
+    app.config.from_prefixed_env()
+    if config:
+        app.config.update(config)
+    app.view_functions["static"] = static_precompressed
+
+    state = AppState(app.config, os.path.join(app.root_path, app.template_folder), app.static_folder)
+    app.extensions["gardenmap"] = state
+    slow = app.config["GARDENMAP_PROFILE_SLOW"]
+    state.metrics.instrument_app(app, SlowRequestProfiler(slow, logger=app.logger) if slow > 0 else None)
+
+    api = Api(app)
+    api.register_blueprint(blp)
+    if app.config["GARDENMAP_GARDENS_DIR"]:
+        api.register_blueprint(blp, name="garden", url_prefix="/g/<garden_id>", parameters=[{
+            "in": "path", "name": "garden_id", "required": True, "schema": {"type": "string"},
+            "description": "garden in GARDENMAP_GARDENS_DIR ([A-Za-z0-9_-], created on first write)",
+        }])
+    api.register_blueprint(metrics_blp)
+    return app
+
+
+def __getattr__(name):
+    # gardenmap.app: the default app, created on first access
+    if name == "app":
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def main():
     debug_flag = os.getenv("FLASK_DEBUG", "0") == "1"
     host = os.getenv("GARDENMAP_HOST", "127.0.0.1")
     try:
-        app.run(host=host, debug=debug_flag)
+        create_app().run(host=host, debug=debug_flag)
     except Exception:
         raise
 
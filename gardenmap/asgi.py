@@ -0,0 +1,303 @@
+"""
+used for ASGI servers: uvicorn gardenmap.asgi:app (or hypercorn, or
+gunicorn -k uvicorn.workers.UvicornWorker)
+
+Requests are answered by the flask app in a bounded thread pool
+(GARDENMAP_ASGI_THREADS), so storage access, JSON parsing and lock waits
+never block the event loop. Requests beyond the pool wait in a bounded
+queue (GARDENMAP_ASGI_QUEUE); once that is full, further requests are
+answered with 503 immediately instead of piling up. Request and response
+bodies are streamed, a slow client holds back its own response only.
+
+/garden/events streams are served on the event loop itself: they only
+borrow a thread for each look at the change log, so idle streams cost a
+coroutine instead of a thread. Those looks count against the same limit
+as requests; while it is reached, a stream skips its look and tries again
+after the poll interval. The streams bypass the flask app: its
+before/after_request hooks don't run for them (request metrics are
+recorded here instead).
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import io
+import json
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from flask import Flask
+from werkzeug.exceptions import ClientDisconnected, HTTPException
+from werkzeug.routing import RequestRedirect, Rule
+
+import gardenmap
+from .events import async_event_stream
+from .state import GARDEN_ID
+from .storage import StorageError
+
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict]]
+Send = Callable[[Dict], Awaitable[None]]
+
+# endpoints served by _events() instead of the flask view
+EVENT_ENDPOINTS = ("gardenmap.garden_events", "garden.garden_events")
+
+
+class _RequestBody(io.RawIOBase):
+    """wsgi.input of a request, read by the worker thread from the ASGI body messages."""
+
+    def __init__(self, receive: Receive, loop: asyncio.AbstractEventLoop) -> None:
+        self.receive = receive
+        self.loop = loop
+        self.chunk = memoryview(b"")
+        self.more = True
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        while not self.chunk and self.more:
+            message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnected()
+            self.chunk = memoryview(message.get("body", b""))
+            self.more = message.get("more_body", False)
+        size = min(len(buffer), len(self.chunk))
+        buffer[:size] = self.chunk[:size]
+        self.chunk = self.chunk[size:]
+        return size
+
+
+def _environ(scope: Scope, body: io.BufferedReader) -> Dict[str, Any]:
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        # the body ends with the last ASGI message, also without Content-Length
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", ()):
+        key = name.decode("latin-1").upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = f"HTTP_{key}"
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class ASGIApp:
+    """ASGI application serving a gardenmap flask app."""
+
+    def __init__(self, app: Flask, threads: Optional[int] = None, queue: Optional[int] = None) -> None:
+        self.app = app
+        self.threads = threads or app.config["GARDENMAP_ASGI_THREADS"]
+        self.queue = app.config["GARDENMAP_ASGI_QUEUE"] if queue is None else queue
+        self.executor = concurrent.futures.ThreadPoolExecutor(self.threads, thread_name_prefix="gardenmap")
+        # requests running in or waiting for the pool (only changed on the event loop)
+        self.pending = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        match scope["type"]:
+            case "http":
+                rule, args = self._match(scope)
+                garden_id = args.get("garden_id")
+                if rule is not None and rule.endpoint in EVENT_ENDPOINTS \
+                        and (garden_id is None or GARDEN_ID.fullmatch(garden_id)):
+                    await self._events(scope, receive, send, rule, garden_id)
+                else:
+                    await self._wsgi(scope, receive, send)
+            case "lifespan":
+                await self._lifespan(receive, send)
+            case _:
+                raise ValueError(f"unsupported ASGI scope type \"{scope['type']}\"")
+
+    def _match(self, scope: Scope) -> Tuple[Optional[Rule], Dict]:
+        adapter = self.app.url_map.bind("", script_name=scope.get("root_path") or None)
+        try:
+            return adapter.match(scope["path"], scope["method"], return_rule=True)
+        except (HTTPException, RequestRedirect):
+            # not found etc., answered by flask
+            return None, {}
+
+    async def _run(self, fn: Callable, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args))
+
+    def _busy(self) -> bool:
+        return self.pending >= self.threads + self.queue
+
+    async def _counted(self, fn: Callable, *args: Any) -> Any:
+        """_run(), counted in self.pending."""
+        self.pending += 1
+        try:
+            return await self._run(fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            match message["type"]:
+                case "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                case "lifespan.shutdown":
+                    self.executor.shutdown(wait=False, cancel_futures=True)
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+    async def _error(self, send: Send, status: int, error: str, headers: List[Tuple[bytes, bytes]] = ()) -> None:
+        body = json.dumps({"error": error}).encode()
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _busy_error(self, send: Send) -> None:
+        await self._error(send, 503, "resource busy, try again later", [(b"retry-after", b"1")])
+
+    async def _wsgi(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self._busy():
+            await self._busy_error(send)
+            return
+        await self._counted(self._respond, scope, receive, send, asyncio.get_running_loop())
+
+    def _respond(self, scope: Scope, receive: Receive, send: Send, loop: asyncio.AbstractEventLoop) -> None:
+        """Run the flask app in a worker thread, send its response from there."""
+        def call(message: Dict) -> None:
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        status_headers: List = []
+
+        def start_response(status: str, headers: List[Tuple[str, str]], exc_info: Any = None) -> None:
+            status_headers[:] = [int(status.split(" ", 1)[0]), [
+                (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers
+            ]]
+
+        started = False
+
+        def start() -> None:
+            nonlocal started
+            if not started:
+                call({"type": "http.response.start", "status": status_headers[0], "headers": status_headers[1]})
+                started = True
+
+        body = io.BufferedReader(_RequestBody(receive, loop))
+        result = self.app(_environ(scope, body), start_response)
+        try:
+            for chunk in result:
+                if chunk:
+                    start()
+                    call({"type": "http.response.body", "body": chunk, "more_body": True})
+            start()
+            call({"type": "http.response.body", "body": b""})
+        except OSError:
+            # client went away
+            pass
+        finally:
+            close = getattr(result, "close", None)
+            if close is not None:
+                close()
+
+    async def _events(self, scope: Scope, receive: Receive, send: Send, rule: Rule, garden_id: Optional[str]) -> None:
+        """GET /garden/events (see gardenmap.garden_events) without a thread per stream."""
+        started = time.perf_counter()
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope.get("headers", ())}
+        query = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        since = headers.get("last-event-id") or query.get("since", "")
+        state = self.app.extensions["gardenmap"]
+        if self._busy():
+            await self._busy_error(send)
+            return
+        try:
+            garden = await self._counted(lambda: state.load().garden(garden_id, create=False))
+            # fail early (with a proper status) if storage is unavailable
+            version, _ = await self._counted(garden.garden_storage.changes_since, since)
+        except KeyError:
+            await self._error(send, 404, "not found")
+            return
+        except StorageError:
+            await self._error(send, 500, "failed to read data")
+            return
+
+        async def changes_since(token: str) -> Tuple[str, Optional[List[Dict]]]:
+            if self._busy():
+                # no changes this time, look again after the poll interval
+                return token, []
+            return await self._counted(garden.garden_storage.changes_since, token)
+
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]})
+        metrics = state.metrics
+        if metrics.enabled:
+            # like the flask app's after_request hook (see Metrics.instrument_app)
+            metrics.request_duration.observe(time.perf_counter() - started, rule.rule, scope["method"], 200)
+        messages = async_event_stream(
+            changes_since, garden.garden_notifier, since or version, ended=state.until_created(garden_id, garden)
+        )
+        disconnected = asyncio.ensure_future(_disconnected(receive))
+        step = None
+        size = 0
+        try:
+            while True:
+                step = asyncio.ensure_future(messages.__anext__())
+                await asyncio.wait((step, disconnected), return_when=asyncio.FIRST_COMPLETED)
+                if not step.done():
+                    return
+                try:
+                    message = step.result()
+                except (StopAsyncIteration, StorageError):
+                    break
+                body = message.encode("utf-8")
+                size += len(body)
+                await send({"type": "http.response.body", "body": body, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        except OSError:
+            # client went away
+            pass
+        finally:
+            disconnected.cancel()
+            if step is not None and not step.done():
+                step.cancel()
+                # the stream must have stopped before it can be closed
+                await asyncio.wait((step,))
+            await messages.aclose()
+            if metrics.enabled:
+                metrics.response_size.observe(size, rule.rule)
+
+
+async def _disconnected(receive: Receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def create_asgi_app(config: Optional[Dict[str, Any]] = None) -> ASGIApp:
+    """ASGIApp of gardenmap.create_app(config)."""
+    return ASGIApp(gardenmap.create_app(config))
+
+
+def __getattr__(name: str) -> Any:
+    # gardenmap.asgi.app: created on first access, like gardenmap.app
+    if name == "app":
+        app = globals()["app"] = create_asgi_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
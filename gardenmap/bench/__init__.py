@@ -0,0 +1,8 @@
+"""
+Benchmarks for gardenmap (not needed at runtime).
+
+  gardenmap-bench (python -m gardenmap.bench)
+                                          storage operations, routes and concurrent
+                                          writers on all backends (see gardenmap.bench.run)
+  python -m gardenmap.bench.validation    GardenItemSchema vs. load_garden_items()
+"""
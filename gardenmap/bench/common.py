@@ -0,0 +1,107 @@
+"""
+Shared parts of the benchmark suites: storage setup per backend, timing
+and resource usage.
+"""
+
+import json
+import math
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:
+    # not on windows
+    resource = None
+
+from ..state import AppState
+from ..storage import StorageBase
+from .data import BUNDLED_DIR
+
+
+# "json-journal" is the json backend with GARDENMAP_JSON_JOURNAL
+BACKENDS = ("json", "json-journal", "sqlite")
+
+
+def config_for(backend: str, directory: str, group_commit: bool = False) -> Dict[str, Any]:
+    """create_app() configuration of a backend with its files in directory."""
+    return {
+        "GARDENMAP_STORAGE": "sqlite" if backend == "sqlite" else "json",
+        "GARDENMAP_JSON_JOURNAL": backend == "json-journal",
+        "GARDENMAP_PALETTE_PATH": os.path.join(directory, "plants.json"),
+        "GARDENMAP_DATA_PATH": os.path.join(directory, "garden.json"),
+        "GARDENMAP_DB_PATH": os.path.join(directory, "gardenmap.db"),
+        "GARDENMAP_CM_PER_UNIT": 10.0,
+        "GARDENMAP_METRICS": False,
+        "GARDENMAP_PROFILE_SLOW": 0.0,
+        "GARDENMAP_GROUP_COMMIT": group_commit,
+        "GARDENMAP_GROUP_COMMIT_WINDOW": 0.0,
+        "GARDENMAP_GROUP_COMMIT_MAX": 256,
+    }
+
+
+def open_storages(config: Dict[str, Any]) -> Tuple[StorageBase, StorageBase]:
+    """New (palette, garden) storage handles, as the app opens them."""
+    return AppState(config, os.path.join(BUNDLED_DIR, "templates"), os.path.join(BUNDLED_DIR, "static")).open_storage()
+
+
+def populate(config: Dict[str, Any], palette: List[Dict], garden: List[Dict]) -> None:
+    """Store palette and garden (json files are written directly, faster than appending)."""
+    if config["GARDENMAP_STORAGE"] == "json":
+        for path, plants in ((config["GARDENMAP_PALETTE_PATH"], palette), (config["GARDENMAP_DATA_PATH"], garden)):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"plantlist": plants}, f, ensure_ascii=False)
+        return
+    palette_storage, garden_storage = open_storages(config)
+    palette_storage.append(palette)
+    garden_storage.append(garden)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """q-th percentile (nearest rank) of sorted values."""
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def summarize(latencies: List[float], items: int = 1) -> Dict[str, Any]:
+    """Throughput and latency statistics of timed runs of an operation on `items` items."""
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    return {
+        "runs": len(ordered),
+        "items": items,
+        "ops_per_second": round(len(ordered) / total, 2) if total else None,
+        "items_per_second": round(len(ordered) * items / total, 1) if total else None,
+        "first_ms": round(latencies[0] * 1000, 3),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def measure(
+    fn: Callable[[int], Any], repeat: int, budget: float, items: int = 1
+) -> Dict[str, Any]:
+    """
+    Time fn(run) up to `repeat` times, but stop once `budget` seconds are
+    used up (after at least one run). The first run is reported separately
+    as first_ms: it includes cold caches.
+    """
+    latencies = []
+    started = time.perf_counter()
+    for run in range(repeat):
+        start = time.perf_counter()
+        fn(run)
+        latencies.append(time.perf_counter() - start)
+        if time.perf_counter() - started > budget:
+            break
+    return summarize(latencies, items)
+
+
+def peak_rss_kb() -> Optional[int]:
+    """Peak resident set size of this process (and its finished children), in KiB."""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # bytes on macOS
+    return peak // 1024 if os.uname().sysname == "Darwin" else peak
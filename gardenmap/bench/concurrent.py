@@ -0,0 +1,87 @@
+"""
+Concurrent writers in separate processes, each with its own storage
+handle, contending for the backend's write lock (FileLock / SQLite).
+With --threads, every process runs that many writer threads sharing its
+handle, like the threads of a gunicorn gthread worker.
+
+Every writer moves `batch` random plants per update_many() call, as
+dragging a selection in the browser does, `writes` times or until the
+time budget is used up.
+"""
+
+import multiprocessing
+import random
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+from ..storage import StorageError
+from .common import config_for, open_storages, populate, summarize
+from .data import make_garden, make_palette
+
+
+def _writer(config: Dict, garden: List[Dict], number: int, options: Any, barrier, results) -> None:
+    _, storage = open_storages(config)
+    latencies = []
+    errors = []
+    barrier.wait()
+    started = time.time()
+
+    def write(rnd: random.Random) -> None:
+        for _ in range(options.writes):
+            moves = [
+                {"id": p["id"], "plant_id": p["plant_id"], "x": p["x"] + 1, "y": p["y"]}
+                for p in rnd.sample(garden, min(options.batch, len(garden)))
+            ]
+            start = time.perf_counter()
+            try:
+                storage.update_many(moves)
+            except StorageError:
+                # lock timeout
+                errors.append(1)
+                continue
+            latencies.append(time.perf_counter() - start)
+            if time.time() - started > options.budget:
+                break
+
+    threads = [
+        threading.Thread(target=write, args=(random.Random(options.seed + number * options.threads + i),))
+        for i in range(options.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((started, time.time(), latencies, len(errors)))
+
+
+def run(backend: str, size: int, options: Any) -> List[Dict]:
+    garden = make_garden(size, options.seed)
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        config = config_for(backend, directory, options.group_commit)
+        populate(config, make_palette(options.palette, options.seed), garden)
+        barrier = ctx.Barrier(options.writers)
+        queue = ctx.Queue()
+        writers = [
+            ctx.Process(target=_writer, args=(config, garden, number, options, barrier, queue))
+            for number in range(options.writers)
+        ]
+        for writer in writers:
+            writer.start()
+        done = [queue.get() for _ in writers]
+        for writer in writers:
+            writer.join()
+
+    latencies = [latency for _, _, writer_latencies, _ in done for latency in writer_latencies]
+    wall = max(end for _, end, _, _ in done) - min(start for start, _, _, _ in done)
+    stats = summarize(latencies, min(options.batch, size)) if latencies else {"runs": 0}
+    # throughput of all writers together
+    stats["ops_per_second"] = round(len(latencies) / wall, 2) if wall else None
+    stats["items_per_second"] = round(len(latencies) * min(options.batch, size) / wall, 1) if wall else None
+    return [{
+        "suite": "concurrent", "backend": backend, "size": size, "operation": "update_many",
+        "writers": options.writers, "threads": options.threads, **stats,
+        "errors": sum(errors for _, _, _, errors in done), "wall_seconds": round(wall, 3),
+    }]
@@ -0,0 +1,65 @@
+"""
+Synthetic palettes and gardens for benchmarks.
+
+Gardens are tiles of the bundled garden.json: every tile repeats its
+placements (with a little jitter) next to the previous one, so plant_id
+frequencies, clustering and density stay those of a real garden at any
+size. Everything is derived from a seed.
+"""
+
+import json
+import math
+import os
+import random
+from typing import Dict, List, Tuple
+
+
+BUNDLED_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# max. offset (map units) of a copied placement from its original
+JITTER = 2.0
+
+
+def bundled(name: str) -> List[Dict]:
+    with open(os.path.join(BUNDLED_DIR, name), encoding="utf-8") as f:
+        return json.load(f)["plantlist"]
+
+
+def make_palette(size: int = 0, seed: int = 0) -> List[Dict]:
+    """The bundled palette, padded with renamed copies to `size` entries."""
+    rnd = random.Random(seed)
+    palette = bundled("plants.json")
+    originals = list(palette)
+    for i in range(len(palette), size):
+        entry = dict(rnd.choice(originals))
+        entry["id"] = f"{entry['id']}-{i}"
+        entry["name"] = f"{entry.get('name', '')} {i}"
+        palette.append(entry)
+    return palette
+
+
+def extent(plants: List[Dict]) -> Tuple[float, float, float, float]:
+    """Bounding box (x0, y0, x1, y1) of placements."""
+    xs = [p["x"] for p in plants]
+    ys = [p["y"] for p in plants]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def make_garden(size: int, seed: int = 0) -> List[Dict]:
+    """`size` placements tiled from the bundled garden (ids are unique)."""
+    rnd = random.Random(seed)
+    template = bundled("garden.json")
+    x0, y0, x1, y1 = extent(template)
+    width, height = x1 - x0, y1 - y0
+    tiles = math.ceil(size / len(template))
+    columns = math.ceil(math.sqrt(tiles))
+    base = rnd.getrandbits(40)
+    garden = []
+    for i in range(size):
+        tile, original = divmod(i, len(template))
+        p = template[original]
+        dx = (tile % columns) * width + rnd.uniform(-JITTER, JITTER)
+        dy = (tile // columns) * height + rnd.uniform(-JITTER, JITTER)
+        # same mix of id types as the browser writes (mostly 12 digit hex)
+        pid = 1754000000000 + i if isinstance(p["id"], int) else f"{(base + i) % (1 << 48):012x}"
+        garden.append({"id": pid, "plant_id": p["plant_id"], "x": p["x"] + dx, "y": p["y"] + dy})
+    return garden
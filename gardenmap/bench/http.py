@@ -0,0 +1,89 @@
+"""
+Drive the routes of an app on one backend through the flask test client.
+
+Every request is made in full (streamed bodies are read to the end).
+first_ms of GET routes includes building caches and indexes.
+"""
+
+import random
+import tempfile
+from typing import Any, Dict, List
+
+from .. import create_app
+from .common import config_for, measure, populate
+from .data import make_garden, make_palette
+from .storage import view_box
+
+
+def run(backend: str, size: int, options: Any) -> List[Dict]:
+    rnd = random.Random(options.seed)
+    garden = make_garden(size, options.seed)
+    batch = options.batch
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        config = config_for(backend, directory, options.group_commit)
+        populate(config, make_palette(options.palette, options.seed), garden)
+        app = create_app(config)
+        client = app.test_client()
+
+        def request(method: str, url: str, status: int = 200, **kwargs: Any) -> int:
+            response = client.open(url, method=method, **kwargs)
+            length = len(response.get_data())
+            if response.status_code != status:
+                raise RuntimeError(f"{method} {url}: {response.status_code} {response.get_data()[:200]!r}")
+            return length
+
+        def timed(name: str, method: str, url: str, status: int = 200, items: int = 1, **kwargs: Any) -> None:
+            sizes = []
+            stats = measure(lambda run: sizes.append(request(method, url, status, **kwargs)), options.repeat, options.budget, items)
+            results.append({
+                "suite": "http", "backend": backend, "size": size, "operation": name,
+                **stats, "response_bytes": sizes[-1],
+            })
+
+        bbox = ",".join(f"{v:.1f}" for v in view_box(garden))
+        token = client.get("/garden/changes").get_json()["version"]
+        etag = client.get("/garden").headers.get("ETag", "")
+
+        timed("GET /", "GET", "/")
+        timed("GET /plants", "GET", "/plants")
+        timed("GET /plants?fields&month", "GET", "/plants?fields=id,name,scale,vegetation&month=6")
+        timed("GET /plants/search", "GET", "/plants/search?q=sa&bloom=5-7")
+        timed("GET /garden", "GET", "/garden", items=size)
+        timed("GET /garden (304)", "GET", "/garden", status=304, headers={"If-None-Match": etag})
+        timed("GET /garden?bbox", "GET", f"/garden?bbox={bbox}")
+        timed("GET /garden?fields&month", "GET", "/garden?fields=id,scale,vegetation&month=6", items=size)
+        timed("GET /garden?format=columnar", "GET", "/garden?format=columnar", items=size)
+        timed("GET /garden/view", "GET", f"/garden/view?bbox={bbox}&zoom=0.5")
+        timed("GET /garden/conflicts", "GET", f"/garden/conflicts?bbox={bbox}")
+        timed("GET /garden/export.svg", "GET", "/garden/export.svg?month=6", items=size)
+
+        posted = []
+
+        def post(run: int) -> None:
+            plants = [
+                {"id": f"http-{run}-{i}", "plant_id": garden[i % size]["plant_id"], "x": 0.0, "y": 0.0}
+                for i in range(batch)
+            ]
+            request("POST", "/garden", json=plants)
+            posted.append([p["id"] for p in plants])
+
+        def put(run: int) -> None:
+            moves = [
+                {"id": p["id"], "plant_id": p["plant_id"], "x": p["x"] + 1, "y": p["y"]}
+                for p in rnd.sample(garden, min(batch, size))
+            ]
+            request("PUT", "/garden", json=moves)
+
+        def delete(run: int) -> None:
+            request("DELETE", "/garden", json=posted.pop() if posted else [f"missing-{run}"])
+
+        for name, fn, items in (("POST /garden", post, batch), ("PUT /garden", put, min(batch, size)),
+                                ("DELETE /garden", delete, batch)):
+            results.append({
+                "suite": "http", "backend": backend, "size": size, "operation": name,
+                **measure(fn, options.repeat, options.budget, items),
+            })
+        timed("GET /garden/changes", "GET", f"/garden/changes?since={token}")
+    return results
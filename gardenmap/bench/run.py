@@ -0,0 +1,168 @@
+"""
+Run the benchmark suites and report the results as JSON:
+
+  gardenmap-bench [--suites storage,http,concurrent] [--backends json,json-journal,sqlite]
+                  [--sizes 1000,10000,100000] [--output results.json] [--compare old.json]
+
+Every (suite, backend, size) case runs in a fresh process, so peak_rss_kb
+is that of the case alone. Data is synthetic and seeded (see
+gardenmap.bench.data): runs with the same options on two commits are
+comparable, --compare prints the differences to a previous result file.
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+from typing import Any, Callable, Dict, List, Optional
+
+from . import concurrent, http, storage
+from .common import BACKENDS, peak_rss_kb
+from .data import BUNDLED_DIR
+
+
+SUITES: Dict[str, Callable[[str, int, Any], List[Dict]]] = {
+    "storage": storage.run,
+    "http": http.run,
+    "concurrent": concurrent.run,
+}
+# result fields identifying a measurement
+KEY = ("suite", "backend", "size", "operation", "group_commit", "writers", "threads")
+
+
+def _case(suite: str, backend: str, size: int, options: Any, queue) -> None:
+    try:
+        results = SUITES[suite](backend, size, options)
+    except Exception as e:
+        queue.put({"suite": suite, "backend": backend, "size": size, "error": f"{type(e).__name__}: {e}"})
+        raise
+    rss = peak_rss_kb()
+    for result in results:
+        result["group_commit"] = options.group_commit
+        result["peak_rss_kb"] = rss
+        queue.put(result)
+    queue.put(None)
+
+
+def run_case(suite: str, backend: str, size: int, options: Any) -> List[Dict]:
+    """Run one case in a new process, return its results."""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_case, args=(suite, backend, size, options, queue))
+    process.start()
+    results = []
+    while True:
+        result = queue.get()
+        if result is None:
+            break
+        results.append(result)
+        if "error" in result:
+            break
+    process.join()
+    return results
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BUNDLED_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _key(result: Dict) -> tuple:
+    return tuple(result.get(k) for k in KEY)
+
+
+def compare(old: Dict, new: Dict, threshold: float) -> List[str]:
+    """
+    Print p50 latency and throughput of new relative to old results,
+    return the measurements whose p50 grew by more than threshold.
+    """
+    before = {_key(r): r for r in old.get("results", ()) if "p50_ms" in r}
+    regressions = []
+    print(f"{'measurement':70} {'p50 ms':>21} {'ops/s':>21}", file=sys.stderr)
+    for result in new["results"]:
+        previous = before.get(_key(result))
+        if previous is None or "p50_ms" not in result:
+            continue
+        name = " ".join(str(v) for v in _key(result) if v is not None)
+        ratio = result["p50_ms"] / previous["p50_ms"] if previous["p50_ms"] else 1.0
+        print(
+            f"{name:70} {previous['p50_ms']:>9.3f} -> {result['p50_ms']:>9.3f}"
+            f" {previous['ops_per_second'] or 0:>9.1f} -> {result['ops_per_second'] or 0:>9.1f}"
+            f"{'  !' if ratio > threshold else ''}",
+            file=sys.stderr
+        )
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def _list(text: str) -> List[str]:
+    return [v.strip() for v in text.split(",") if v.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="gardenmap performance benchmarks")
+    parser.add_argument("--suites", type=_list, default=list(SUITES), help="comma separated: " + ",".join(SUITES))
+    parser.add_argument("--backends", type=_list, default=list(BACKENDS), help="comma separated: " + ",".join(BACKENDS))
+    parser.add_argument("--sizes", type=lambda t: [int(v) for v in _list(t)], default=[1000, 10000, 100000],
+                        help="comma separated numbers of placed plants (e.g. 1000,1000000)")
+    parser.add_argument("--palette", type=int, default=0, help="palette entries (default: the bundled palette)")
+    parser.add_argument("--repeat", type=int, default=50, help="max. runs per operation")
+    parser.add_argument("--budget", type=float, default=5.0, help="max. seconds per operation (after the first run)")
+    parser.add_argument("--batch", type=int, default=100, help="plants per append/update_many/delete")
+    parser.add_argument("--writers", type=int, default=4, help="processes of the concurrent suite")
+    parser.add_argument("--threads", type=int, default=1, help="threads per process of the concurrent suite")
+    parser.add_argument("--writes", type=int, default=50, help="update_many calls per concurrent writer thread")
+    parser.add_argument("--group-commit", action="store_true", help="commit concurrent garden writes together")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results to this file instead of stdout")
+    parser.add_argument("--compare", help="results of an earlier run to compare with (printed to stderr)")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="with --compare: exit with status 1 if a p50 latency grew by more than this factor")
+    options = parser.parse_args(argv)
+    for name, values, known in (("suite", options.suites, SUITES), ("backend", options.backends, BACKENDS)):
+        unknown = set(values) - set(known)
+        if unknown:
+            parser.error(f"unknown {name}: {', '.join(sorted(unknown))}")
+
+    report = {
+        "meta": {
+            "commit": _commit(),
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "options": {k: v for k, v in vars(options).items() if k not in ("output", "compare")},
+        },
+        "results": [],
+    }
+    for suite in options.suites:
+        for backend in options.backends:
+            for size in options.sizes:
+                print(f"{suite} {backend} {size} ...", file=sys.stderr)
+                report["results"].extend(run_case(suite, backend, size, options))
+
+    text = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, options.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {options.threshold}x", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Time every StorageBase operation of one backend on a garden of a given size.
+
+Reads run first, on a fresh handle, so first_ms is a cold read. Mutations
+keep the garden at its size: appended batches are deleted again.
+"""
+
+import random
+import tempfile
+from typing import Any, Dict, List
+
+from ..importer import CHUNK_SIZE, chunked
+from .common import config_for, measure, open_storages, populate
+from .data import extent, make_garden, make_palette
+
+
+# max. number of plants imported by the bulk_append benchmark
+BULK_ITEMS = 100_000
+
+
+def view_box(garden: List[Dict], fraction: float = 0.1):
+    """Box around the center of the garden covering `fraction` of its area."""
+    x0, y0, x1, y1 = extent(garden)
+    cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+    scale = fraction ** 0.5 / 2
+    return cx - (x1 - x0) * scale, cy - (y1 - y0) * scale, cx + (x1 - x0) * scale, cy + (y1 - y0) * scale
+
+
+def run(backend: str, size: int, options: Any) -> List[Dict]:
+    rnd = random.Random(options.seed)
+    garden = make_garden(size, options.seed)
+    batch = options.batch
+    results = []
+
+    def record(operation: str, stats: Dict) -> None:
+        results.append({"suite": "storage", "backend": backend, "size": size, "operation": operation, **stats})
+
+    def timed(operation: str, fn, items: int = 1, repeat: int = options.repeat) -> None:
+        record(operation, measure(fn, repeat, options.budget, items))
+
+    def moved(plant: Dict) -> Dict:
+        return {**plant, "x": plant["x"] + rnd.uniform(-1, 1), "y": plant["y"] + rnd.uniform(-1, 1)}
+
+    with tempfile.TemporaryDirectory() as directory:
+        config = config_for(backend, directory, options.group_commit)
+        populate(config, make_palette(options.palette, options.seed), garden)
+        _, storage = open_storages(config)
+        box = view_box(garden)
+        in_view = len(storage.get_bbox(*box))
+        _, storage = open_storages(config)
+
+        # reads
+        timed("get_all", lambda run: storage.get_all(), size)
+        timed("iter_json", lambda run: sum(1 for _ in storage.iter_json()), size)
+        timed("get_bbox", lambda run: storage.get_bbox(*box), in_view)
+        timed("get_columns", lambda run: storage.get_columns(), size)
+        timed("get_wrapped", lambda run: storage.get_wrapped(), size)
+        timed("snapshot", lambda run: storage.snapshot(), size)
+        timed("version", lambda run: storage.version())
+        timed("last_modified", lambda run: storage.last_modified())
+        token = storage.version()
+
+        # mutations
+        appended = []
+
+        def append(run: int) -> None:
+            plants = [
+                {"id": f"bench-{run}-{i}", "plant_id": garden[i % size]["plant_id"], "x": 0.0, "y": 0.0}
+                for i in range(batch)
+            ]
+            storage.append(plants)
+            appended.append([p["id"] for p in plants])
+
+        def delete(run: int) -> None:
+            storage.delete_by_ids(appended.pop() if appended else [f"missing-{run}"])
+
+        timed("update_one", lambda run: storage.update_one(moved(rnd.choice(garden))))
+        timed("update_many", lambda run: storage.update_many(
+            [{"id": p["id"], "plant_id": p["plant_id"], "x": p["x"] + 1, "y": p["y"]}
+             for p in rnd.sample(garden, min(batch, size))]
+        ), min(batch, size))
+        timed("append", append, batch)
+        timed("delete_by_ids", delete, batch)
+        # everything since the reads (may be more than the change log holds)
+        timed("changes_since", lambda run: storage.changes_since(token))
+
+        bulk = [
+            {"id": f"bulk-{i}", "plant_id": garden[i % size]["plant_id"], "x": 0.0, "y": 0.0}
+            for i in range(min(size, BULK_ITEMS))
+        ]
+        timed("bulk_append", lambda run: sum(1 for _ in storage.bulk_append(chunked(bulk, CHUNK_SIZE))), len(bulk), repeat=1)
+        storage.delete_by_ids([p["id"] for p in bulk])
+    return results
@@ -0,0 +1,64 @@
+"""
+Compare marshmallow's GardenItemSchema(many=True).load() with the fast
+path of load_garden_items() on a bulk import:
+
+  python -m gardenmap.bench.validation [--items 100000] [--repeat 5]
+"""
+
+import argparse
+import json
+import random
+import time
+
+from ..schemas import GardenItemSchema, load_garden_items
+
+
+def make_items(n, seed=0):
+    """n garden items shaped like those sent by the browser (parsed from JSON)."""
+    rnd = random.Random(seed)
+    plant_ids = [f"plant-{i}" for i in range(150)]
+    items = [
+        {
+            "id": f"{rnd.getrandbits(48):012x}" if i % 2 else 1754001128195 + i,
+            "plant_id": rnd.choice(plant_ids),
+            "x": rnd.uniform(0, 1000),
+            "y": rnd.uniform(0, 1000),
+        }
+        for i in range(n)
+    ]
+    # same types as request.get_json() returns
+    return json.loads(json.dumps(items))
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=100_000, help="number of garden items")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per variant (best is reported)")
+    args = parser.parse_args()
+
+    items = make_items(args.items)
+    assert load_garden_items(items) == GardenItemSchema(many=True).load(items)
+
+    results = {
+        "marshmallow": best_of(lambda: GardenItemSchema(many=True).load(items), args.repeat),
+        "load_garden_items": best_of(lambda: load_garden_items(items), args.repeat),
+    }
+    print(json.dumps({
+        "items": args.items,
+        "seconds": results,
+        "items_per_second": {k: round(args.items / v) for k, v in results.items()},
+        "speedup": round(results["marshmallow"] / results["load_garden_items"], 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
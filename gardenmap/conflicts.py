@@ -0,0 +1,148 @@
+"""
+Spacing analysis: find placed plants that crowd each other.
+
+Every plant occupies a circle of its palette entry's max_width (cm)
+around its position. Two placements conflict if their circles overlap.
+Plants with max_width -1 (spreading ground cover) or without max_width
+are meant to fill gaps and are left out.
+
+Placements are bucketed into a uniform grid whose cells are as large as
+the widest plant, so a conflict partner is always in the same or one of
+the 8 neighbouring cells. Like GridIndex, the index is built once and then
+updated by listening to storage mutations: moving a selection only
+re-checks the moved plants.
+"""
+
+import math
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+# cm of max_width per map unit
+CM_PER_UNIT = 10.0
+
+
+class ConflictIndex:
+    def __init__(self, cm_per_unit: float = CM_PER_UNIT) -> None:
+        self.cm_per_unit = cm_per_unit
+        self.lock = threading.RLock()
+        self.built = False
+        # storage versions the index reflects (maintained by the caller)
+        self.version: Optional[str] = None
+        self.palette_version: Optional[str] = None
+        # plant_id -> radius (map units)
+        self.radius: Dict[str, float] = {}
+        self.cell_size = 1.0
+        # id -> (plant_id, x, y, radius) of placements taking part
+        self.items: Dict[Any, Tuple[str, float, float, float]] = {}
+        # (ix, iy) -> ids
+        self.cells: Dict[Tuple[int, int], Set[Any]] = {}
+        # id -> ids it conflicts with
+        self.conflicts: Dict[Any, Set[Any]] = {}
+
+    def _cell_key(self, x: float, y: float) -> Tuple[int, int]:
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def _remove(self, pid: Any) -> None:
+        entry = self.items.pop(pid, None)
+        if entry is None:
+            return
+        key = self._cell_key(entry[1], entry[2])
+        cell = self.cells[key]
+        cell.discard(pid)
+        if not cell:
+            del self.cells[key]
+        for other in self.conflicts.pop(pid, ()):
+            partners = self.conflicts[other]
+            partners.discard(pid)
+            if not partners:
+                del self.conflicts[other]
+
+    def _add(self, pid: Any, plant_id: str, x: float, y: float, r: float) -> None:
+        self.items[pid] = (plant_id, x, y, r)
+        ix, iy = self._cell_key(x, y)
+        # compare squared distances of all candidates in the 3x3 neighbourhood
+        found = []
+        for cx in (ix - 1, ix, ix + 1):
+            for cy in (iy - 1, iy, iy + 1):
+                for other in self.cells.get((cx, cy), ()):
+                    _, ox, oy, orad = self.items[other]
+                    dx, dy, limit = ox - x, oy - y, orad + r
+                    if dx * dx + dy * dy < limit * limit:
+                        found.append(other)
+        self.cells.setdefault((ix, iy), set()).add(pid)
+        if found:
+            self.conflicts.setdefault(pid, set()).update(found)
+            for other in found:
+                self.conflicts.setdefault(other, set()).add(pid)
+
+    def _put(self, plant: Dict, merge: bool = False) -> None:
+        """Insert or (merge-)update one placement."""
+        pid = plant.get("id")
+        old = self.items.get(pid)
+        if merge and old is not None:
+            plant_id = plant.get("plant_id", old[0])
+            x, y = plant.get("x", old[1]), plant.get("y", old[2])
+        else:
+            plant_id, x, y = plant.get("plant_id"), plant.get("x"), plant.get("y")
+        self._remove(pid)
+        r = self.radius.get(plant_id)
+        if r and isinstance(x, (int, float)) and isinstance(y, (int, float)):
+            self._add(pid, plant_id, float(x), float(y), r)
+
+    def rebuild(self, palette: Iterable[Dict], plants: Iterable[Dict]) -> None:
+        with self.lock:
+            self.radius = {}
+            for p in palette:
+                width = p.get("max_width")
+                if isinstance(width, (int, float)) and width > 0:
+                    self.radius[p.get("id")] = width / 2 / self.cm_per_unit
+            # partners are at most two of the largest radii apart
+            self.cell_size = 2 * max(self.radius.values(), default=0.5)
+            self.items = {}
+            self.cells = {}
+            self.conflicts = {}
+            for p in plants:
+                self._put(p)
+            self.built = True
+
+    def apply(self, op: str, arg: Any) -> None:
+        """Storage listener: apply one mutation."""
+        with self.lock:
+            if not self.built:
+                return
+            match op:
+                case "append":
+                    for p in arg:
+                        self._put(p)
+                case "update":
+                    self._put(arg)
+                case "merge":
+                    for p in arg:
+                        self._put(p, merge=True)
+                case "delete":
+                    for pid in arg:
+                        self._remove(pid)
+
+    def pairs(self, bbox: Optional[Tuple[float, float, float, float]] = None) -> List[Dict]:
+        """Conflicting pairs, optionally only those with a plant inside the bounding box."""
+        result = []
+        with self.lock:
+            done = set()
+            for pid, partners in self.conflicts.items():
+                plant_id, x, y, r = self.items[pid]
+                inside = bbox is None or (bbox[0] <= x <= bbox[2] and bbox[1] <= y <= bbox[3])
+                for other in partners:
+                    if other in done:
+                        continue
+                    o_plant_id, ox, oy, orad = self.items[other]
+                    if not inside and not (bbox[0] <= ox <= bbox[2] and bbox[1] <= oy <= bbox[3]):
+                        continue
+                    result.append({
+                        "ids": [pid, other],
+                        "plant_ids": [plant_id, o_plant_id],
+                        "distance": math.hypot(ox - x, oy - y),
+                        "min_distance": r + orad,
+                    })
+                done.add(pid)
+        return result
@@ -0,0 +1,145 @@
+"""
+Server-Sent Events for garden changes.
+
+Streams are fed from the storage change log (StorageBase.changes_since),
+which already is the shared record of mutations of all gunicorn workers:
+a stream polls it cheaply (file stamp or version row) and is woken up
+immediately by mutations made in its own process.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .storage import StorageBase
+
+
+# max. seconds between two looks at the change log
+POLL_INTERVAL = 1.0
+# seconds between keepalive comments on idle streams
+KEEPALIVE = 15.0
+# streams end after this many seconds, EventSource reconnects with Last-Event-ID
+MAX_AGE = 300.0
+# reconnect delay (ms) suggested to clients
+RETRY = 1000
+
+
+class ChangeNotifier:
+    """Storage listener that wakes up the event streams of this process."""
+
+    def __init__(self) -> None:
+        self.cond = threading.Condition()
+        # (event loop, asyncio.Event) of streams waiting in wait_async()
+        self.waiters: set = set()
+
+    def __call__(self, op: str, arg: Any) -> None:
+        with self.cond:
+            self.cond.notify_all()
+            waiters = list(self.waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # loop closed
+                pass
+
+    def wait(self, timeout: float) -> None:
+        with self.cond:
+            self.cond.wait(timeout)
+
+    async def wait_async(self, timeout: float) -> None:
+        """wait() for coroutines: blocks no thread."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self.cond:
+            self.waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.cond:
+                self.waiters.discard(waiter)
+
+
+def _message(event: str, version: str, data: Any) -> str:
+    return (
+        f"id: {version}\nevent: {event}\n"
+        f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+    )
+
+
+class _Stream:
+    """Position and timers of one event stream (shared by event_stream() and async_event_stream())."""
+
+    def __init__(self, since: str, keepalive: float, max_age: float, ended: Optional[Callable[[], bool]]) -> None:
+        self.token = since
+        self.keepalive = keepalive
+        self.max_age = max_age
+        self.ended = ended
+        self.start = self.last_sent = time.monotonic()
+
+    def running(self) -> bool:
+        return time.monotonic() - self.start < self.max_age and not (self.ended and self.ended())
+
+    def messages(self, version: str, changes: Optional[List[Dict]]) -> List[str]:
+        """Return the messages for changes_since(self.token) = (version, changes), move on to version."""
+        if changes is None:
+            messages = [_message("reset", version, {})]
+        elif changes:
+            messages = [_message("change", change["version"], change) for change in changes]
+        elif time.monotonic() - self.last_sent >= self.keepalive:
+            messages = [": keepalive\n\n"]
+        else:
+            messages = []
+        if messages:
+            self.last_sent = time.monotonic()
+        self.token = version
+        return messages
+
+
+def event_stream(
+    storage: StorageBase,
+    notifier: ChangeNotifier,
+    since: str,
+    poll_interval: float = POLL_INTERVAL,
+    keepalive: float = KEEPALIVE,
+    max_age: float = MAX_AGE,
+    ended: Optional[Callable[[], bool]] = None,
+) -> Iterator[str]:
+    """
+    Yield SSE messages for changes after version `since`:
+
+      event: change  data: {"version", "op", "ids", "data"}
+      event: reset   data: {}   (changes unknown, reload the whole garden)
+
+    The stream ends after `max_age` seconds, or once ended() returns True.
+    """
+    yield f"retry: {RETRY}\n\n"
+    stream = _Stream(since or storage.changes_since("")[0], keepalive, max_age, ended)
+    while stream.running():
+        yield from stream.messages(*storage.changes_since(stream.token))
+        notifier.wait(poll_interval)
+
+
+async def async_event_stream(
+    changes_since: Callable[[str], Awaitable[Tuple[str, Optional[List[Dict]]]]],
+    notifier: ChangeNotifier,
+    since: str,
+    poll_interval: float = POLL_INTERVAL,
+    keepalive: float = KEEPALIVE,
+    max_age: float = MAX_AGE,
+    ended: Optional[Callable[[], bool]] = None,
+) -> AsyncIterator[str]:
+    """
+    event_stream() for asyncio: the change log is read by awaiting
+    changes_since(token) (which runs StorageBase.changes_since in a thread
+    pool), and waiting for changes blocks no thread.
+    """
+    yield f"retry: {RETRY}\n\n"
+    stream = _Stream(since or (await changes_since(""))[0], keepalive, max_age, ended)
+    while stream.running():
+        for message in stream.messages(*await changes_since(stream.token)):
+            yield message
+        await notifier.wait_async(poll_interval)
@@ -0,0 +1,175 @@
+"""
+Server-side SVG export of the garden.
+
+The export is the map template with every placed plant drawn as a <use>
+of its month's icon. Each distinct icon is inlined once as a minified
+<symbol> (see gardenmap.icons.icon_symbol), so the file is self-contained
+and does not grow with repeated species. Output is produced piecewise and
+finished exports are kept per (garden version, palette version, month,
+bbox) in a small LRU cache.
+"""
+
+from collections import OrderedDict
+import os
+import threading
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from .icons import SVG_NS, icon_symbol, symbol_id
+
+
+# icon size (map units) at scale 1, same as viewIconWidth in main.js
+ICON_WIDTH = 5
+# decimal places of coordinates in the export
+PRECISION = 3
+# number of finished exports kept
+CACHE_SIZE = 8
+# exports larger than this (characters) are not cached
+MAX_CACHED = 16 * 1024 * 1024
+# uses written per chunk of output
+CHUNK_ITEMS = 500
+# part of the export's ETag, bumped when the same data renders differently
+# (2: symbols keep their colours)
+REVISION = "2"
+
+_MARKER = "\x00plantlist\x00"
+
+
+def _number(value: float) -> str:
+    text = f"{value:.{PRECISION}f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+class SVGExporter:
+    def __init__(self, map_path: str, static_dir: str, size: int = CACHE_SIZE) -> None:
+        self.map_path = map_path
+        self.static_dir = static_dir
+        self.size = size
+        self.lock = threading.Lock()
+        # key -> rendered export
+        self._cache: OrderedDict = OrderedDict()
+        # icon path -> (mtime, <symbol> text or None if unreadable)
+        self._symbols: Dict[str, Tuple[float, Optional[str]]] = {}
+        # (mtime, bbox) -> (text before plants, text after plants, text after symbols)
+        self._templates: Dict[Tuple[float, Optional[Tuple]], Tuple[str, str, str]] = {}
+
+    def _template(self, bbox: Optional[Tuple[float, float, float, float]]) -> Tuple[str, str, str]:
+        """Split the serialized map at the plant list and at the end of the document."""
+        mtime = os.stat(self.map_path).st_mtime
+        key = (mtime, bbox)
+        template = self._templates.get(key)
+        if template is not None:
+            return template
+        # keep the map's namespace prefixes
+        for _, (prefix, uri) in ET.iterparse(self.map_path, events=("start-ns",)):
+            if uri != SVG_NS and prefix:
+                ET.register_namespace(prefix, uri)
+        root = ET.parse(self.map_path).getroot()
+        plantlist = root.find(".//*[@id='plantlist']")
+        if plantlist is None:
+            plantlist = ET.SubElement(root, f"{{{SVG_NS}}}g", {"id": "plantlist"})
+        plantlist.clear()
+        plantlist.set("id", "plantlist")
+        plantlist.text = _MARKER
+        if bbox:
+            x0, y0, x1, y1 = bbox
+            root.set("viewBox", " ".join(_number(v) for v in (x0, y0, x1 - x0, y1 - y0)))
+            # plants and map share the viewport's coordinates, show them unpanned
+            viewport = root.find(".//*[@id='viewport']")
+            if viewport is not None:
+                viewport.set("transform", "translate(0) scale(1)")
+        text = ET.tostring(root, encoding="unicode", xml_declaration=True)
+        head, tail = text.split(_MARKER)
+        end = tail.rindex("</")
+        template = (head, tail[:end], tail[end:])
+        self._templates = {key: template, **{k: v for k, v in self._templates.items() if k[0] == mtime}}
+        return template
+
+    def _symbol(self, icon: str) -> Optional[str]:
+        """Minified <symbol> of an icon, None if it can't be read."""
+        path = os.path.join(self.static_dir, icon.lstrip("/"))
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        cached = self._symbols.get(icon)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            text = ET.tostring(icon_symbol(path, icon, PRECISION), encoding="unicode")
+        except (OSError, ET.ParseError):
+            text = None
+        self._symbols[icon] = (mtime, text)
+        return text
+
+    def _render(
+        self, plants: Dict[str, Dict], placements: Iterable[Dict], month: int,
+        bbox: Optional[Tuple[float, float, float, float]]
+    ) -> Iterator[str]:
+        head, before_end, end = self._template(bbox)
+        yield head
+        key = str(month)
+        # icon -> symbol id, or None if it can't be drawn
+        used: Dict[str, Optional[str]] = {}
+        symbols = []
+        parts = []
+        for p in placements:
+            plant = plants.get(p.get("plant_id"))
+            x, y = p.get("x"), p.get("y")
+            if plant is None or not isinstance(x, (int, float)) or not isinstance(y, (int, float)):
+                continue
+            icon = ((plant.get("vegetation") or {}).get("icon") or {}).get(key)
+            if not icon:
+                continue
+            if icon not in used:
+                symbol = self._symbol(icon)
+                used[icon] = symbol_id(icon) if symbol else None
+                if symbol:
+                    symbols.append(symbol)
+            sid = used[icon]
+            if sid is None:
+                continue
+            size = _number(ICON_WIDTH * (plant.get("scale") or 1))
+            parts.append(
+                f'<use href="#{sid}" x="{_number(x)}" y="{_number(y)}" width="{size}" height="{size}"/>'
+            )
+            if len(parts) >= CHUNK_ITEMS:
+                yield "".join(parts)
+                parts = []
+        yield "".join(parts)
+        yield before_end
+        yield f'<defs id="icons">{"".join(symbols)}</defs>'
+        yield end
+
+    def export(
+        self, version: Optional[Tuple], month: int, bbox: Optional[Tuple[float, float, float, float]],
+        load: Callable[[], Tuple[Dict[str, Dict], Iterable[Dict]]]
+    ) -> Iterator[str]:
+        """
+        Yield the SVG export. `version` identifies the data (None: don't
+        cache), load() returns ({plant id: palette entry}, placed plants)
+        and is only called if the export isn't cached.
+        """
+        key = None if version is None else (*version, month, bbox)
+        if key is not None:
+            with self.lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    yield cached
+                    return
+        plants, placements = load()
+        parts = []
+        length = 0
+        for part in self._render(plants, placements, month, bbox):
+            length += len(part)
+            if length <= MAX_CACHED:
+                parts.append(part)
+            else:
+                parts = None
+            yield part
+        if key is not None and parts is not None:
+            with self.lock:
+                self._cache[key] = "".join(parts)
+                while len(self._cache) > self.size:
+                    self._cache.popitem(last=False)
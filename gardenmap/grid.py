@@ -0,0 +1,157 @@
+"""
+Multi-resolution grid index over placed plants for level-of-detail views.
+
+Every level divides the map into square cells of a fixed size and keeps
+per cell the number of plants, the sum of their positions (for the
+centroid) and a count per plant_id (for the dominant species). The index
+is built once from storage and then updated incrementally by listening
+to storage mutations (see StorageBase.add_listener).
+"""
+
+from collections import Counter
+import math
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# cell sizes (map units) of the grid levels, finest first
+CELL_SIZES = (8, 16, 32, 64, 128, 256, 512)
+# minimum on-screen size (px) of a cluster cell
+MIN_CELL_PX = 48
+# return single plants if no more than this many are inside the view
+MAX_ITEMS = 2000
+
+
+class Cell:
+    __slots__ = ("count", "sum_x", "sum_y", "plants")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.plants: Counter = Counter()
+
+
+class GridIndex:
+    def __init__(self, cell_sizes: Iterable[float] = CELL_SIZES) -> None:
+        self.cell_sizes = tuple(sorted(cell_sizes))
+        self.lock = threading.RLock()
+        self.built = False
+        # storage version the index reflects (maintained by the caller)
+        self.version: Optional[str] = None
+        # id -> (plant_id, x, y)
+        self.items: Dict[Any, Tuple[Optional[str], float, float]] = {}
+        # one {(ix, iy): Cell} dict per level
+        self.levels: List[Dict[Tuple[int, int], Cell]] = [{} for _ in self.cell_sizes]
+
+    def _cell_key(self, level: int, x: float, y: float) -> Tuple[int, int]:
+        size = self.cell_sizes[level]
+        return (math.floor(x / size), math.floor(y / size))
+
+    def _add(self, pid: Any, plant_id: Optional[str], x: float, y: float) -> None:
+        self.items[pid] = (plant_id, x, y)
+        for level, cells in enumerate(self.levels):
+            key = self._cell_key(level, x, y)
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = Cell()
+            cell.count += 1
+            cell.sum_x += x
+            cell.sum_y += y
+            cell.plants[plant_id] += 1
+
+    def _remove(self, pid: Any) -> None:
+        entry = self.items.pop(pid, None)
+        if entry is None:
+            return
+        plant_id, x, y = entry
+        for level, cells in enumerate(self.levels):
+            key = self._cell_key(level, x, y)
+            cell = cells[key]
+            cell.count -= 1
+            if cell.count == 0:
+                del cells[key]
+                continue
+            cell.sum_x -= x
+            cell.sum_y -= y
+            cell.plants[plant_id] -= 1
+            if cell.plants[plant_id] <= 0:
+                del cell.plants[plant_id]
+
+    def _put(self, plant: Dict, merge: bool = False) -> None:
+        """Insert or (merge-)update one plant."""
+        pid = plant.get("id")
+        old = self.items.get(pid)
+        if merge and old is not None:
+            plant_id = plant.get("plant_id", old[0])
+            x, y = plant.get("x", old[1]), plant.get("y", old[2])
+        else:
+            plant_id, x, y = plant.get("plant_id"), plant.get("x"), plant.get("y")
+        self._remove(pid)
+        # stored positions that are not finite have no cell
+        if isinstance(x, (int, float)) and isinstance(y, (int, float)) and math.isfinite(x) and math.isfinite(y):
+            self._add(pid, plant_id, float(x), float(y))
+
+    def rebuild(self, plants: Iterable[Dict]) -> None:
+        with self.lock:
+            self.items = {}
+            self.levels = [{} for _ in self.cell_sizes]
+            for p in plants:
+                self._put(p)
+            self.built = True
+
+    def apply(self, op: str, arg: Any) -> None:
+        """Storage listener: apply one mutation."""
+        with self.lock:
+            if not self.built:
+                return
+            match op:
+                case "append":
+                    for p in arg:
+                        self._put(p)
+                case "update":
+                    self._put(arg)
+                case "merge":
+                    for p in arg:
+                        self._put(p, merge=True)
+                case "delete":
+                    for pid in arg:
+                        self._remove(pid)
+
+    def level_for_zoom(self, zoom: float, min_cell_px: float = MIN_CELL_PX) -> int:
+        """Finest level whose cells are at least min_cell_px on screen."""
+        for level, size in enumerate(self.cell_sizes):
+            if size * zoom >= min_cell_px:
+                return level
+        return len(self.cell_sizes) - 1
+
+    def clusters(self, level: int, x0: float, y0: float, x1: float, y1: float) -> List[Dict]:
+        """Return clusters of all cells of a level overlapping the bounding box."""
+        size = self.cell_sizes[level]
+        ix0, iy0 = self._cell_key(level, x0, y0)
+        ix1, iy1 = self._cell_key(level, x1, y1)
+        result = []
+        with self.lock:
+            cells = self.levels[level]
+            # iterate over whichever is smaller: the cells in view or all occupied cells
+            if (ix1 - ix0 + 1) * (iy1 - iy0 + 1) <= len(cells):
+                keys = (
+                    (ix, iy) for ix in range(ix0, ix1 + 1) for iy in range(iy0, iy1 + 1)
+                    if (ix, iy) in cells
+                )
+            else:
+                keys = (k for k in cells if ix0 <= k[0] <= ix1 and iy0 <= k[1] <= iy1)
+            for key in keys:
+                cell = cells[key]
+                result.append({
+                    "x": cell.sum_x / cell.count,
+                    "y": cell.sum_y / cell.count,
+                    "count": cell.count,
+                    "plant_id": cell.plants.most_common(1)[0][0],
+                    "cell": [key[0] * size, key[1] * size, size],
+                })
+        return result
+
+    def count(self, x0: float, y0: float, x1: float, y1: float) -> int:
+        """Upper bound of plants inside the bounding box (counted on the coarsest level)."""
+        return sum(c["count"] for c in self.clusters(len(self.cell_sizes) - 1, x0, y0, x1, y1))
@@ -0,0 +1,397 @@
+"""
+Static asset optimization: write minified plant icon SVGs and precompressed
+.gz (and .br, if the optional brotli module is installed) variants of the
+static files to build/ below the static directory. The app serves them
+instead of the (untouched) sources while they are up to date, picking the
+encoding by Accept-Encoding negotiation.
+
+With --sprites, the icons of every month in the palette's vegetation.icon
+entries are also packed into one <symbol> sprite sheet per month, named
+by content hash (sprites/month-<N>.<hash>.svg) and listed in
+sprites/manifest.json:
+
+  { "<month>": { "url": "/sprites/month-<N>.<hash>.svg", "icons": ["/<icon>.svg", ...] } }
+
+Each icon becomes <symbol id="<icon file name without .svg>">.
+
+usage: gardenmap-icons [--precision N] [--no-minify] [--sprites] [--palette PATH] [directory]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+# editor namespaces whose elements and attributes are never rendered
+EDITOR_NS = (
+    "http://www.inkscape.org/namespaces/inkscape",
+    "http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd",
+    "http://creativecommons.org/ns#",
+    "http://purl.org/dc/elements/1.1/",
+    "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+)
+# attributes holding numbers whose precision can be reduced
+NUMERIC_ATTRS = ("d", "transform", "points", "x", "y", "x1", "y1", "x2", "y2",
+                 "cx", "cy", "r", "rx", "ry", "width", "height")
+# files that get precompressed (svg files are minified first)
+COMPRESS_SUFFIXES = (".svg", ".css", ".js")
+# sprite sheets below the static directory
+SPRITE_DIR = "sprites"
+# minified and compressed variants of static files below the static directory
+BUILD_DIR = "build"
+SPRITE_MANIFEST = "manifest.json"
+
+_number = re.compile(r"-?(?:\d+\.\d*|\.\d+)(?:[eE][-+]?\d+)?")
+# references to ids: url(#id) in any attribute, "#id" in href attributes only
+# (elsewhere, "#..." is a colour)
+_idref = re.compile(r"url\(#([^)]+)\)")
+HREF_ATTRS = ("href", f"{{{XLINK_NS}}}href")
+# in <style> text: "#id" in selectors (outside of {...} blocks)
+_css_block = re.compile(r"(\{[^}]*\})")
+_css_id = re.compile(r"#(-?[_a-zA-Z][\w-]*)")
+# separators a path can do without: around commands and before a minus sign
+_path_cmd = re.compile(r"[\s,]*([a-zA-Z])[\s,]*")
+_path_minus = re.compile(r"[\s,]+(?=-)")
+
+ET.register_namespace("", SVG_NS)
+ET.register_namespace("xlink", XLINK_NS)
+
+
+def _round_numbers(value: str, precision: int) -> str:
+    def fmt(m: re.Match) -> str:
+        s = f"{float(m.group(0)):.{precision}f}".rstrip("0").rstrip(".")
+        return "0" if s in ("-0", "") else s
+    return _number.sub(fmt, value)
+
+
+def _compact_path(d: str) -> str:
+    return _path_minus.sub("", _path_cmd.sub(r"\1", d)).strip()
+
+
+def _is_editor(tag_or_attr: str) -> bool:
+    return tag_or_attr.startswith("{") and tag_or_attr[1:].split("}")[0] in EDITOR_NS
+
+
+def _minify(root: ET.Element, precision: int, prefix: str = "") -> None:
+    """Minify parsed SVG in place. Kept ids and generated classes get `prefix`."""
+    # ids referenced by url(#id), href="#id" or #id selectors of stylesheets must be kept
+    referenced = set()
+    for el in root.iter():
+        for name, value in el.attrib.items():
+            if name in HREF_ATTRS and value.startswith("#"):
+                referenced.add(value[1:])
+            referenced.update(_idref.findall(value))
+        if el.tag == f"{{{SVG_NS}}}style" and el.text:
+            referenced.update(_idref.findall(el.text))
+            referenced.update(_css_id.findall(_css_block.sub(" ", el.text)))
+
+    def prefixed(m: re.Match) -> str:
+        return f"url(#{prefix}{m.group(1)})"
+
+    def prefixed_selector(m: re.Match) -> str:
+        return f"#{prefix}{m.group(1)}"
+
+    def prefixed_css(text: str) -> str:
+        # selectors and blocks alternate
+        parts = _css_block.split(text)
+        for i, part in enumerate(parts):
+            parts[i] = _idref.sub(prefixed, part) if i % 2 else _css_id.sub(prefixed_selector, part)
+        return "".join(parts)
+
+    styles: Dict[str, List[ET.Element]] = {}
+
+    def clean(parent: ET.Element) -> None:
+        for child in list(parent):
+            if not isinstance(child.tag, str) or _is_editor(child.tag) \
+                    or child.tag == f"{{{SVG_NS}}}metadata":
+                parent.remove(child)
+                continue
+            clean(child)
+        if prefix and parent.tag == f"{{{SVG_NS}}}style" and parent.text:
+            parent.text = prefixed_css(parent.text)
+        for name in list(parent.attrib):
+            value = parent.attrib[name]
+            if _is_editor(name) or (name == "id" and value not in referenced):
+                del parent.attrib[name]
+                continue
+            if prefix:
+                if name == "id":
+                    value = parent.attrib[name] = f"{prefix}{value}"
+                elif name in HREF_ATTRS and value.startswith("#"):
+                    value = parent.attrib[name] = f"#{prefix}{value[1:]}"
+                else:
+                    value = parent.attrib[name] = _idref.sub(prefixed, value)
+            if name == "d":
+                parent.attrib[name] = _compact_path(_round_numbers(value, precision))
+            elif name in NUMERIC_ATTRS:
+                parent.attrib[name] = _round_numbers(value, precision)
+            elif name == "style":
+                style = ";".join(
+                    _round_numbers(decl.strip(), precision) for decl in value.split(";") if decl.strip()
+                )
+                parent.attrib[name] = style
+                styles.setdefault(style, []).append(parent)
+        # drop indentation whitespace
+        if parent.text is not None and not parent.text.strip():
+            parent.text = None
+        if parent.tail is not None and not parent.tail.strip():
+            parent.tail = None
+
+    clean(root)
+
+    # merge repeated inline styles into classes
+    rules = []
+    for n, (style, elements) in enumerate(s for s in styles.items() if len(s[1]) > 1):
+        name = f"{prefix}s{n}"
+        rules.append(f".{name}{{{style}}}")
+        for el in elements:
+            del el.attrib["style"]
+            el.set("class", f"{el.get('class')} {name}" if el.get("class") else name)
+    if rules:
+        style_el = ET.Element(f"{{{SVG_NS}}}style")
+        style_el.text = "".join(rules)
+        root.insert(0, style_el)
+
+    # drop now empty <defs/>
+    for el in list(root):
+        if el.tag == f"{{{SVG_NS}}}defs" and len(el) == 0:
+            root.remove(el)
+
+
+def minify_svg(text: str, precision: int = 3) -> str:
+    """
+    Return minified SVG: drop comments, metadata, editor-only elements and
+    attributes and unreferenced ids, round numbers to `precision` decimals
+    and turn styles used by several elements into shared CSS classes.
+    """
+    root = ET.fromstring(text)
+    _minify(root, precision)
+    return ET.tostring(root, encoding="unicode")
+
+
+def symbol_id(icon: str) -> str:
+    """Sprite symbol id of an icon path ("/aster-4.svg" -> "aster-4")."""
+    return os.path.splitext(os.path.basename(icon))[0]
+
+
+def icon_symbol(path: str, icon: str, precision: int) -> ET.Element:
+    """Parse an icon and turn it into a minified <symbol>."""
+    root = ET.parse(path).getroot()
+    sid = symbol_id(icon)
+    _minify(root, precision, prefix=f"{sid}-")
+    viewbox = root.get("viewBox") or f"0 0 {root.get('width', '100')} {root.get('height', '100')}"
+    symbol = ET.Element(f"{{{SVG_NS}}}symbol", {"id": sid, "viewBox": viewbox})
+    if root.get("preserveAspectRatio"):
+        symbol.set("preserveAspectRatio", root.get("preserveAspectRatio"))
+    symbol.extend(list(root))
+    return symbol
+
+
+def build_sprites(palette_path: str, directory: str, precision: int = 3) -> Dict[str, Dict]:
+    """
+    Pack each month's icons into a content-hashed sprite sheet below
+    directory/sprites, remove outdated sheets and write the manifest.
+    Return the manifest.
+    """
+    with open(palette_path, "r", encoding="utf-8") as f:
+        plantlist = json.load(f).get("plantlist", [])
+    months: Dict[str, set] = {}
+    for plant in plantlist:
+        icons = (plant.get("vegetation") or {}).get("icon") or {}
+        for month, icon in icons.items():
+            if icon:
+                months.setdefault(str(month), set()).add(icon)
+
+    out_dir = os.path.join(directory, SPRITE_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {}
+    for month, icons in sorted(months.items(), key=lambda m: int(m[0]) if m[0].isdigit() else 0):
+        sprite = ET.Element(f"{{{SVG_NS}}}svg")
+        packed = []
+        for icon in sorted(icons):
+            path = os.path.join(directory, icon.lstrip("/"))
+            try:
+                sprite.append(icon_symbol(path, icon, precision))
+            except (OSError, ET.ParseError) as e:
+                print(f"{path}: not added to sprite ({e})", file=sys.stderr)
+                continue
+            packed.append(icon)
+        data = ET.tostring(sprite, encoding="utf-8")
+        filename = f"month-{month}.{hashlib.sha256(data).hexdigest()[:12]}.svg"
+        path = os.path.join(out_dir, filename)
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(data)
+            compress(path)
+        manifest[month] = {"url": f"/{SPRITE_DIR}/{filename}", "icons": packed}
+        print(f"{path}: {len(packed)} icons, {len(data)} bytes")
+
+    # remove sheets no longer referenced
+    current = {os.path.basename(m["url"]) for m in manifest.values()}
+    for filename in os.listdir(out_dir):
+        if filename.startswith("month-") and filename.split(".svg")[0] + ".svg" not in current:
+            os.remove(os.path.join(out_dir, filename))
+
+    with open(os.path.join(out_dir, SPRITE_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+_manifest_cache: Dict[str, Tuple[float, Dict]] = {}
+
+
+def sprite_manifest(directory: str) -> Dict[str, Dict]:
+    """Return the sprite manifest of a static directory ({} if none), cached by mtime."""
+    path = os.path.join(directory, SPRITE_DIR, SPRITE_MANIFEST)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    cached = _manifest_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cached = (mtime, json.load(f))
+        except (OSError, json.JSONDecodeError):
+            return {}
+        _manifest_cache[path] = cached
+    return cached[1]
+
+
+def compress(path: str, target: Optional[str] = None) -> Dict[str, int]:
+    """
+    Write .gz (and .br) variants of a file next to `target` (default: the
+    file itself). Return size per written file.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    target = target or path
+    sizes = {}
+    variants = [(".gz", lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((".br", lambda d: brotli.compress(d, quality=11)))
+    for suffix, fn in variants:
+        out = fn(data)
+        with open(target + suffix, "wb") as f:
+            f.write(out)
+        sizes[target + suffix] = len(out)
+    return sizes
+
+
+def built_path(directory: str, filename: str) -> str:
+    """Path of the optimize() output for `filename` of the static `directory`."""
+    return os.path.join(directory, BUILD_DIR, filename)
+
+
+def optimize(directory: str, precision: int = 3, minify: bool = True) -> Tuple[int, int, int]:
+    """
+    Write minified and precompressed variants of all assets below directory
+    to directory/build (the assets themselves are left as they are).
+    Return (original bytes, minified bytes, smallest compressed bytes).
+    """
+    total_orig = total_min = total_comp = 0
+    for dirpath, dirnames, filenames in os.walk(directory):
+        # sprite sheets are built (and compressed) by build_sprites(), build/ is our output
+        if dirpath == directory:
+            dirnames[:] = [d for d in dirnames if d not in (SPRITE_DIR, BUILD_DIR)]
+        for filename in sorted(filenames):
+            if not filename.endswith(COMPRESS_SUFFIXES):
+                continue
+            path = os.path.join(dirpath, filename)
+            target = built_path(directory, os.path.relpath(path, directory))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            orig = size = os.path.getsize(path)
+            source = path
+            if minify and filename.endswith(".svg"):
+                with open(path, "r", encoding="utf-8") as f:
+                    text = f.read()
+                try:
+                    minified = minify_svg(text, precision)
+                except ET.ParseError as e:
+                    print(f"{path}: skipped ({e})", file=sys.stderr)
+                    continue
+                data = minified.encode("utf-8")
+                if len(data) < orig:
+                    with open(target, "wb") as f:
+                        f.write(data)
+                    source, size = target, len(data)
+            if source == path and os.path.exists(target):
+                # minified variant of an older version
+                os.remove(target)
+            comp = min(compress(source, target).values())
+            total_orig += orig
+            total_min += size
+            total_comp += comp
+            print(f"{path}: {orig} -> {size} ({comp} compressed)")
+    return total_orig, total_min, total_comp
+
+
+def precompressed(path: str, accept_encoding, built: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """
+    Return (path to serve, content encoding) for a static file, preferring
+    an up to date .br or .gz variant the client accepts, then an up to date
+    minified variant. Variants are looked up next to `built` (the
+    optimize() output path of the file, see built_path()) or else next to
+    the file itself.
+    """
+    base = built or path
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return path, None
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if not accept_encoding[encoding]:
+            continue
+        candidate = base + suffix
+        try:
+            if os.path.getmtime(candidate) >= mtime:
+                return candidate, encoding
+        except OSError:
+            continue
+    if built is not None:
+        try:
+            if os.path.getmtime(built) >= mtime:
+                return built, None
+        except OSError:
+            pass
+    return path, None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="minify and precompress gardenmap static assets")
+    parser.add_argument("directory", nargs="?", default=os.path.join(here, "static"))
+    parser.add_argument("--precision", type=int, default=3, help="decimals kept in svg numbers")
+    parser.add_argument("--no-minify", action="store_true", help="only write compressed variants")
+    parser.add_argument("--sprites", action="store_true", help="also build per-month sprite sheets")
+    parser.add_argument("--palette", default=os.path.join(here, "plants.json"), help="palette for --sprites")
+    args = parser.parse_args(argv)
+
+    if brotli is None:
+        print("brotli module not installed, writing gzip variants only", file=sys.stderr)
+    orig, minified, comp = optimize(args.directory, args.precision, not args.no_minify)
+    if orig:
+        print(
+            f"total: {orig} -> {minified} bytes minified ({100 * minified / orig:.1f}%), "
+            f"{comp} bytes compressed ({100 * comp / orig:.1f}%)"
+        )
+
+    if args.sprites:
+        build_sprites(args.palette, args.directory, args.precision)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Streaming bulk import of garden items.
+
+The request body is tokenized incrementally: only the current read buffer
+and one chunk of items are held in memory, whatever the size of the file
+(items larger than MAX_VALUE_SIZE are rejected, and so is malformed JSON
+as soon as it is read).
+Accepted documents are the ones the garden export/import understands:
+
+  [item, ...]
+  {"plantlist": [item, ...], ...}
+  {"id": ..., "plant_id": ..., ...}      (single item)
+"""
+
+import codecs
+import json
+import re
+from typing import IO, Any, Dict, Iterable, Iterator, List, Tuple
+
+from marshmallow import ValidationError
+
+from .schemas import load_garden_items
+
+
+# bytes read from the request stream at once
+READ_SIZE = 64 * 1024
+# items validated and stored together (one transaction/journal entry)
+CHUNK_SIZE = 1000
+# max. number of per-item errors reported
+MAX_ERRORS = 100
+# max. characters of one item (or other value outside the item list)
+MAX_VALUE_SIZE = 1024 * 1024
+# a value ending (or failing to decode) this close to the end of the buffer
+# may only be cut off by the read: "1.5e" + "3", "tru" + "e", "\u00" + "e9"
+_TAIL = 16
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class ImportFormatError(ValueError):
+    """Malformed import document."""
+
+
+class JSONItemReader:
+    """Yield the items of a JSON document read piecewise from a binary stream."""
+
+    def __init__(self, stream: IO[bytes], read_size: int = READ_SIZE, max_value: int = MAX_VALUE_SIZE) -> None:
+        self.stream = stream
+        self.read_size = read_size
+        self.max_value = max_value
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.json = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        # characters dropped from the front of buf
+        self.consumed = 0
+        self.eof = False
+
+    @property
+    def offset(self) -> int:
+        """Character offset of the read position in the document."""
+        return self.consumed + self.pos
+
+    def _fill(self) -> bool:
+        """Read more text into the buffer, return False at the end of the stream."""
+        if self.eof:
+            return False
+        raw = self.stream.read(self.read_size)
+        if not raw:
+            self.eof = True
+            text = self.decoder.decode(b"", final=True)
+        else:
+            text = self.decoder.decode(raw)
+        # drop what was consumed already
+        self.consumed += self.pos
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Return next non-whitespace character ("" at the end)."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, chars: str) -> str:
+        c = self._peek()
+        if c == "" or c not in chars:
+            raise ImportFormatError(f"expected one of {chars!r} at offset {self.offset}, got {c!r}")
+        self.pos += 1
+        return c
+
+    def _more(self) -> bool:
+        """Read more of the current value, return False at the end of the stream."""
+        if len(self.buf) - self.pos > self.max_value:
+            raise ImportFormatError(f"value at offset {self.offset} exceeds {self.max_value} characters")
+        return self._fill()
+
+    def _value(self) -> Any:
+        """Decode the next complete JSON value."""
+        self._peek()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                # only read on if the value may be cut off, not for errors within the buffer
+                cut_off = e.pos >= len(self.buf) - _TAIL or e.msg.startswith("Unterminated string")
+                if cut_off and self._more():
+                    continue
+                raise ImportFormatError(f"invalid JSON: {e.msg} at offset {self.consumed + e.pos}") from e
+            # a number at the end of the buffer might continue in the next read
+            if end >= len(self.buf) - _TAIL and not self.eof and self._more():
+                continue
+            self.pos = end
+            return value
+
+    def _array(self) -> Iterator[Any]:
+        """Yield the elements of an array whose "[" was consumed."""
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._expect(",]") == "]":
+                return
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._expect("[{") == "[":
+            yield from self._array()
+        else:
+            single: Dict[str, Any] = {}
+            found = False
+            if self._peek() == "}":
+                self.pos += 1
+            else:
+                while True:
+                    if self._peek() != '"':
+                        raise ImportFormatError(f"expected property name at offset {self.offset}")
+                    key = self._value()
+                    self._expect(":")
+                    if key == "plantlist" and not found and self._peek() == "[":
+                        self.pos += 1
+                        found = True
+                        yield from self._array()
+                    else:
+                        single[key] = self._value()
+                    if self._expect(",}") == "}":
+                        break
+            if not found:
+                yield single
+        if self._peek() != "":
+            raise ImportFormatError(f"unexpected data after document at offset {self.offset}")
+
+
+def chunked(items: Iterable[Any], size: int = CHUNK_SIZE) -> Iterator[List[Any]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def validate_chunk(chunk: List[Any], offset: int) -> Tuple[List[Dict], Dict[int, Any]]:
+    """Return (valid items, {index in document: error messages}) of a chunk."""
+    indexes = range(len(chunk))
+    try:
+        items = load_garden_items(chunk)
+        errors: Dict[int, Any] = {}
+    except ValidationError as e:
+        if not isinstance(e.messages, dict) or "_schema" in e.messages:
+            return [], {offset: e.messages}
+        indexes = [i for i in indexes if i not in e.messages]
+        errors = {offset + i: msg for i, msg in e.messages.items()}
+        items = load_garden_items([chunk[i] for i in indexes])
+    # like POST /garden: new items need a plant_id
+    valid = []
+    for i, p in zip(indexes, items):
+        if p["plant_id"]:
+            valid.append(p)
+        else:
+            errors[offset + i] = {"plant_id": ["plant_id required for new garden items"]}
+    return valid, errors
@@ -0,0 +1,392 @@
+"""
+Performance instrumentation, served at /metrics in the Prometheus text
+format:
+
+  gardenmap_request_duration_seconds{endpoint,method,status}   histogram
+  gardenmap_response_size_bytes{endpoint}                      histogram
+  gardenmap_storage_duration_seconds{backend,storage,operation} histogram
+  gardenmap_storage_errors_total{backend,storage,operation}     counter
+  gardenmap_lock_wait_seconds{backend,storage}                  histogram
+  gardenmap_lock_timeouts_total{backend,storage}                counter
+  gardenmap_validation_duration_seconds{schema}                 histogram
+  gardenmap_slow_requests_total{endpoint}                       counter
+
+Request durations end when the view returns (for streamed responses the
+body is measured by size only). Storage operations are the public
+StorageBase methods plus the backend internals listed in its
+TIMED_METHODS; iter_json() is timed until the iterator is returned.
+
+Instrumentation is opt-in: a disabled Metrics object wraps nothing, and
+timed() returns a shared no-op context manager. Metrics are kept per
+process, so every worker reports its own.
+
+SlowRequestProfiler samples the stacks of the threads serving requests
+and logs the collapsed stacks (flame graph input) of requests slower
+than a threshold.
+"""
+
+from collections import Counter as StackCounter
+from contextlib import contextmanager, nullcontext
+import functools
+import inspect
+import logging
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from filelock import BaseFileLock
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# upper bounds of histogram buckets (seconds / bytes)
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+# StorageBase methods timed as operations (those a backend has)
+STORAGE_METHODS = (
+    "get_all", "append", "update_one", "update_many", "delete_by_ids", "bulk_append", "apply_batch",
+    "version", "last_modified", "snapshot", "changes_since", "get_bbox", "iter_json",
+    "get_columns", "get_wrapped",
+)
+# seconds between stack samples of the profiler
+SAMPLE_INTERVAL = 0.005
+# frames kept per sampled stack (innermost)
+SAMPLE_DEPTH = 40
+# collapsed stacks logged per slow request
+REPORT_STACKS = 20
+
+_NULL = nullcontext()
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels: Any, amount: float = 1.0) -> None:
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def lines(self) -> Iterator[str]:
+        with self.lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(value)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DURATION_BUCKETS
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # labels -> [count per bucket (not cumulative)..., count above all buckets, sum]
+        self.values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, *labels: Any) -> None:
+        # first bucket whose bound is >= value
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def lines(self) -> Iterator[str]:
+        with self.lock:
+            values = sorted((labels, list(counts)) for labels, counts in self.values.items())
+        for labels, counts in values:
+            total = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                total += count
+                le = 'le="%s"' % (bound if bound == "+Inf" else _number(bound))
+                yield f"{self.name}_bucket{_labels(self.labels, labels, le)} {total}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {_number(counts[-1])}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {total}"
+
+
+class TimedLock:
+    """Wrap a (file) lock, report how long acquiring it took and whether it timed out."""
+
+    def __init__(self, lock: Any, observe: Callable[[float, bool], None]) -> None:
+        self.lock = lock
+        self.observe = observe
+        # nested acquisitions by the holder don't wait, leave them out
+        self._local = threading.local()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.lock, name)
+
+    def __enter__(self) -> "TimedLock":
+        depth = getattr(self._local, "depth", 0)
+        if depth:
+            self.lock.acquire()
+        else:
+            start = time.perf_counter()
+            try:
+                self.lock.acquire()
+            except Exception:
+                self.observe(time.perf_counter() - start, True)
+                raise
+            self.observe(time.perf_counter() - start, False)
+        self._local.depth = depth + 1
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._local.depth -= 1
+        self.lock.release()
+
+
+class SlowRequestProfiler:
+    """
+    Sample the stacks of threads between begin() and end() every
+    `interval` seconds, log those of requests that took `threshold`
+    seconds or more. The sampling thread only runs while requests do.
+    """
+
+    def __init__(
+        self, threshold: float, interval: float = SAMPLE_INTERVAL, logger: Optional[logging.Logger] = None
+    ) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.busy = threading.Event()
+        # thread id -> samples of its stacks
+        self.active: Dict[int, StackCounter] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self) -> None:
+        with self.lock:
+            self.active[threading.get_ident()] = StackCounter()
+            self.busy.set()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="gardenmap-profiler", daemon=True)
+                self._thread.start()
+
+    def end(self, duration: float, what: str) -> bool:
+        """Stop sampling the calling thread; return True (and log) if the request was slow."""
+        with self.lock:
+            samples = self.active.pop(threading.get_ident(), None)
+            if not self.active:
+                self.busy.clear()
+        if samples is None or duration < self.threshold:
+            return False
+        stacks = "\n".join(f"{stack} {count}" for stack, count in samples.most_common(REPORT_STACKS))
+        self.logger.warning("slow request %s took %.3fs, %d samples:\n%s", what, duration, sum(samples.values()), stacks)
+        return True
+
+    @staticmethod
+    def _collapse(frame: Any) -> str:
+        names = []
+        while frame is not None and len(names) < SAMPLE_DEPTH:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self) -> None:
+        while True:
+            self.busy.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                for ident, samples in self.active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[self._collapse(frame)] += 1
+            del frames
+
+
+class Metrics:
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.request_duration = Histogram(
+            "gardenmap_request_duration_seconds", "Time spent in request handlers.",
+            ("endpoint", "method", "status")
+        )
+        self.response_size = Histogram(
+            "gardenmap_response_size_bytes", "Size of response bodies.", ("endpoint",), SIZE_BUCKETS
+        )
+        self.storage_duration = Histogram(
+            "gardenmap_storage_duration_seconds", "Time spent in storage operations.",
+            ("backend", "storage", "operation")
+        )
+        self.storage_errors = Counter(
+            "gardenmap_storage_errors_total", "Storage operations that raised.", ("backend", "storage", "operation")
+        )
+        self.lock_wait = Histogram(
+            "gardenmap_lock_wait_seconds", "Time spent waiting for the storage write lock.", ("backend", "storage")
+        )
+        self.lock_timeouts = Counter(
+            "gardenmap_lock_timeouts_total", "Storage lock acquisitions that failed.", ("backend", "storage")
+        )
+        self.validation_duration = Histogram(
+            "gardenmap_validation_duration_seconds", "Time spent validating request data.", ("schema",)
+        )
+        self.slow_requests = Counter(
+            "gardenmap_slow_requests_total", "Requests profiled for being slow.", ("endpoint",)
+        )
+        self.metrics = (
+            self.request_duration, self.response_size, self.storage_duration, self.storage_errors,
+            self.lock_wait, self.lock_timeouts, self.validation_duration, self.slow_requests,
+        )
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.lines())
+        return "\n".join(lines) + "\n"
+
+    def timed(self, histogram: Histogram, *labels: Any):
+        """Context manager observing its duration in histogram (no-op if disabled)."""
+        if not self.enabled:
+            return _NULL
+        return self._timed(histogram, labels)
+
+    @contextmanager
+    def _timed(self, histogram: Histogram, labels: Tuple) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - start, *labels)
+
+    def validation(self, schema: str):
+        return self.timed(self.validation_duration, schema)
+
+    def _wrap(self, method: Callable, labels: Tuple) -> Callable:
+        duration, errors = self.storage_duration, self.storage_errors
+
+        if inspect.isgeneratorfunction(method):
+            # e.g. bulk_append(): time until exhausted
+            @functools.wraps(method)
+            def timed_generator(*args: Any, **kwargs: Any) -> Iterator:
+                start = time.perf_counter()
+                try:
+                    yield from method(*args, **kwargs)
+                except Exception:
+                    errors.inc(*labels)
+                    raise
+                finally:
+                    duration.observe(time.perf_counter() - start, *labels)
+            return timed_generator
+
+        @functools.wraps(method)
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            except Exception:
+                errors.inc(*labels)
+                raise
+            finally:
+                duration.observe(time.perf_counter() - start, *labels)
+        return timed
+
+    def instrument_storage(self, storage: Any, backend: str, name: str) -> None:
+        """Time the operations and lock waits of one storage instance (if enabled)."""
+        if not self.enabled:
+            return
+        for method in (*STORAGE_METHODS, *getattr(storage, "TIMED_METHODS", ())):
+            if hasattr(storage, method):
+                setattr(storage, method, self._wrap(getattr(storage, method), (backend, name, method)))
+
+        def observe_lock(seconds: float, failed: bool) -> None:
+            self.lock_wait.observe(seconds, backend, name)
+            if failed:
+                self.lock_timeouts.inc(backend, name)
+
+        if isinstance(getattr(storage, "lock", None), BaseFileLock):
+            storage.lock = TimedLock(storage.lock, observe_lock)
+        lock_method = getattr(storage, "LOCK_METHOD", None)
+        if lock_method:
+            acquire = getattr(storage, lock_method)
+
+            @functools.wraps(acquire)
+            def timed_acquire(*args: Any, **kwargs: Any) -> Any:
+                start = time.perf_counter()
+                try:
+                    result = acquire(*args, **kwargs)
+                except Exception:
+                    observe_lock(time.perf_counter() - start, True)
+                    raise
+                observe_lock(time.perf_counter() - start, False)
+                return result
+            setattr(storage, lock_method, timed_acquire)
+
+    def instrument_app(self, app: Any, profiler: Optional[SlowRequestProfiler] = None) -> None:
+        """Time the requests of a Flask app (if enabled), profile slow ones."""
+        if not self.enabled:
+            return
+        from flask import g, request
+
+        def endpoint() -> str:
+            # the route, not the path: keeps the number of label values small
+            return request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+
+        @app.before_request
+        def start_timer() -> None:
+            g.metrics_start = time.perf_counter()
+            if profiler is not None:
+                profiler.begin()
+
+        @app.after_request
+        def observe_request(response: Any) -> Any:
+            start = g.pop("metrics_start", None)
+            if start is None:
+                return response
+            duration = time.perf_counter() - start
+            route = endpoint()
+            self.request_duration.observe(duration, route, request.method, response.status_code)
+            if profiler is not None and profiler.end(duration, f"{request.method} {request.full_path}"):
+                self.slow_requests.inc(route)
+            if response.content_length is not None:
+                self.response_size.observe(response.content_length, route)
+            elif response.is_streamed:
+                response.response = self._count_bytes(response.response, route)
+            return response
+
+    def _count_bytes(self, body: Iterable, route: str) -> Iterator:
+        size = 0
+        try:
+            for chunk in body:
+                size += len(chunk) if isinstance(chunk, bytes) else len(chunk.encode())
+                yield chunk
+        finally:
+            self.response_size.observe(size, route)
+            close = getattr(body, "close", None)
+            if close is not None:
+                close()
@@ -0,0 +1,73 @@
+"""
+Rendered pages served from memory.
+
+index.html inlines main.js and map.svg, which makes it the largest
+response and too costly to render per request. CachedPage renders it
+once per state of the template folder and keeps the result with gzip
+(and brotli, if the optional module is installed) variants and ETags.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import Request, Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class CachedPage:
+    def __init__(self, template_dir: str) -> None:
+        self.template_dir = template_dir
+        self.lock = threading.Lock()
+        # (template folder stamp, {encoding: (etag, body)})
+        self._cache: Optional[Tuple[Tuple, Dict[str, Tuple[str, bytes]]]] = None
+
+    def _stamp(self) -> Tuple:
+        """Names and mtimes of the templates (any of them may be included)."""
+        with os.scandir(self.template_dir) as entries:
+            return tuple(sorted((e.name, e.stat().st_mtime_ns) for e in entries if e.is_file()))
+
+    def _variants(self, render: Callable[[], str]) -> Dict[str, Tuple[str, bytes]]:
+        stamp = self._stamp()
+        cache = self._cache
+        if cache is not None and cache[0] == stamp:
+            return cache[1]
+        with self.lock:
+            cache = self._cache
+            if cache is not None and cache[0] == stamp:
+                return cache[1]
+            body = render().encode()
+            tag = hashlib.sha1(body).hexdigest()[:16]
+            variants = {
+                "identity": (tag, body),
+                "gzip": (f"{tag}-gz", gzip.compress(body, compresslevel=9, mtime=0)),
+            }
+            if brotli is not None:
+                variants["br"] = (f"{tag}-br", brotli.compress(body, quality=11))
+            self._cache = (stamp, variants)
+            return variants
+
+    def response(self, request: Request, render: Callable[[], str], mimetype: str = "text/html") -> Response:
+        """Respond with the best variant the client accepts, 304 if it has it already."""
+        variants = self._variants(render)
+        encoding = next(
+            (e for e in ("br", "gzip") if e in variants and request.accept_encodings[e]), "identity"
+        )
+        etag, body = variants[encoding]
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype=mimetype)
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        # always revalidate, the ETag makes that cheap
+        response.cache_control.no_cache = True
+        response.vary.add("Accept-Encoding")
+        return response
@@ -0,0 +1,63 @@
+"""
+Field projection and per-month slicing of the plant palette.
+
+Map-only clients need a few fields of every plant and only the selected
+month of vegetation.icon/vegetation.height. Projections are cached per
+palette version, so they are computed once per change of the palette,
+not once per request.
+"""
+
+from collections import OrderedDict
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .schemas import PlantSchema
+from .storage import StorageBase
+
+
+# fields that can be requested
+PLANT_FIELDS = tuple(PlantSchema().fields)
+# number of (version, fields, month) projections kept
+CACHE_SIZE = 32
+
+
+def project(plant: Dict, fields: Optional[Tuple[str, ...]], month: Optional[int]) -> Dict:
+    """Return plant reduced to fields (all if None) and vegetation reduced to month (all if None)."""
+    result = {k: v for k, v in plant.items() if fields is None or k in fields}
+    vegetation = result.get("vegetation")
+    if month is not None and isinstance(vegetation, dict):
+        key = str(month)
+        result["vegetation"] = {
+            name: ({key: values[key]} if key in values else {}) if isinstance(values, dict) else values
+            for name, values in vegetation.items()
+        }
+    return result
+
+
+class PaletteProjection:
+    def __init__(self, size: int = CACHE_SIZE) -> None:
+        self.size = size
+        self.lock = threading.Lock()
+        # (version, fields, month) -> (list, {id: plant})
+        self._cache: OrderedDict = OrderedDict()
+
+    def get(
+        self, storage: StorageBase, fields: Optional[Tuple[str, ...]], month: Optional[int]
+    ) -> Tuple[List[Dict], Dict[str, Dict]]:
+        """Return projected palette as list and as dict by id."""
+        version = storage.version()
+        key = (version, fields, month)
+        if version is not None:
+            with self.lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    return cached
+        plantlist = [project(p, fields, month) for p in storage.get_all()]
+        result = (plantlist, {p.get("id"): p for p in plantlist})
+        if version is not None:
+            with self.lock:
+                self._cache[key] = result
+                while len(self._cache) > self.size:
+                    self._cache.popitem(last=False)
+        return result
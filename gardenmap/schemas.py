@@ -1,4 +1,6 @@
 
+import math
+
 from marshmallow import EXCLUDE, fields, Schema
 
 
@@ -91,3 +93,46 @@ class GardenItemSchema(Schema):
 
     class Meta:
         unknown = EXCLUDE
+
+
+# fallback schemas of load_garden_items()
+_garden_item_schema = GardenItemSchema()
+_garden_items_schema = GardenItemSchema(many=True)
+
+
+def load_garden_items(raw, many=True):
+    """
+    Same result as GardenItemSchema(many=many).load(raw), but items of the
+    usual shape (dict with id, str plant_id, int/float x and y) are checked
+    and coerced in one tight loop instead of field by field. As soon as an
+    item doesn't fit, the whole input goes through marshmallow, so coercion
+    of other types and all error messages stay exactly the same.
+    """
+    items = raw if many else [raw]
+    result = []
+    if type(items) is list:
+        append = result.append
+        isfinite = math.isfinite
+        for item in items:
+            if type(item) is not dict:
+                break
+            pid = item.get("id")
+            plant_id = item.get("plant_id")
+            x = item.get("x")
+            y = item.get("y")
+            if pid is None or type(plant_id) is not str:
+                break
+            # ints are converted, anything else (str, bool, None, ...) is left to marshmallow
+            try:
+                if type(x) is int:
+                    x = float(x)
+                if type(y) is int:
+                    y = float(y)
+            except OverflowError:
+                break
+            if type(x) is not float or type(y) is not float or not (isfinite(x) and isfinite(y)):
+                break
+            append({"id": pid, "plant_id": plant_id, "x": x, "y": y})
+        else:
+            return result if many else result[0]
+    return (_garden_items_schema if many else _garden_item_schema).load(raw)
@@ -0,0 +1,264 @@
+"""
+In-memory search index over the plant palette.
+
+Every palette entry is a document number; sets of documents are Python
+ints used as bitsets, so filters are combined with & and |:
+
+  - text: normalized (case folded, accents removed) tokens of name,
+    trivname and notes mapped to the documents containing them, per
+    field. The tokens of a field are also kept sorted, so the tokens
+    starting with a prefix are a contiguous range found by bisection
+  - facets: location/location_ideal, soil/soil_ideal, snails, type,
+    lifetime (annual: max_lifetime <= 1, perennial) and the months in
+    bloom (bloom_start..bloom_end, wrapping over new year)
+
+Query tokens must all match (as a prefix of a token). Results are ranked
+by where they matched: exact tokens before prefixes, name and trivname
+before notes. The index is built once and then updated by listening to
+palette mutations.
+"""
+
+import bisect
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+TEXT_FIELDS = ("name", "trivname", "notes")
+# score of a query token that matches a token of a field exactly / as prefix
+WEIGHTS = {"name": (4.0, 2.0), "trivname": (4.0, 2.0), "notes": (1.0, 0.5)}
+# facet -> palette fields whose values are indexed under it
+FACETS = {
+    "location": ("location", "location_ideal"),
+    "soil": ("soil", "soil_ideal"),
+    "snails": ("snails",),
+    "type": ("type",),
+}
+
+_token = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """Case fold and strip accents ("Gänseblümchen" -> "ganseblumchen")."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokens(text: Any) -> Set[str]:
+    if not isinstance(text, str):
+        return set()
+    return set(_token.findall(normalize(text)))
+
+
+def bits(value: int) -> Iterator[int]:
+    """Yield the numbers of the set bits."""
+    while value:
+        low = value & -value
+        yield low.bit_length() - 1
+        value ^= low
+
+
+def bitset(docs: Iterable[int]) -> int:
+    """Return the bitset of the given numbers (faster than or-ing them one by one)."""
+    docs = list(docs)
+    if not docs:
+        return 0
+    raw = bytearray(max(docs) // 8 + 1)
+    for doc in docs:
+        raw[doc >> 3] |= 1 << (doc & 7)
+    return int.from_bytes(raw, "little")
+
+
+def bloom_months(plant: Dict) -> Set[int]:
+    start, end = plant.get("bloom_start"), plant.get("bloom_end")
+    if not isinstance(start, int) or not isinstance(end, int) or not (1 <= start <= 12 and 1 <= end <= 12):
+        return set()
+    if start <= end:
+        return set(range(start, end + 1))
+    return set(range(start, 13)) | set(range(1, end + 1))
+
+
+class PaletteIndex:
+    def __init__(self) -> None:
+        self.lock = threading.RLock()
+        self.built = False
+        # storage version the index reflects (maintained by the caller)
+        self.version: Optional[str] = None
+        # doc -> plant (None if deleted), id -> doc
+        self.docs: List[Optional[Dict]] = []
+        self.doc_of: Dict[Any, int] = {}
+        self.live = 0
+        # doc -> key to order equally ranked results by
+        self.order: Dict[int, str] = {}
+        # (field, token) -> docs with that token, field -> its tokens sorted
+        self.exact: Dict[Tuple[str, str], int] = {}
+        self.vocab: Dict[str, List[str]] = {field: [] for field in TEXT_FIELDS}
+        # (facet, value) -> docs, month -> docs
+        self.facets: Dict[Tuple[str, str], int] = {}
+        self.bloom: Dict[int, int] = {}
+        # doc -> keys it was added under, for removal
+        self._keys: Dict[int, List[Tuple[Dict, Any]]] = {}
+        # while rebuilding: (table, key) -> docs, turned into bitsets at the end
+        self._pending: Optional[Dict[Tuple[int, Any], List[int]]] = None
+
+    def _set(self, table: Dict, key: Any, doc: int) -> None:
+        if self._pending is not None:
+            self._pending.setdefault((id(table), key), []).append(doc)
+        else:
+            value = table.get(key, 0)
+            if not value and table is self.exact:
+                bisect.insort(self.vocab[key[0]], key[1])
+            table[key] = value | (1 << doc)
+        self._keys[doc].append((table, key))
+
+    def _index(self, doc: int, plant: Dict) -> None:
+        self.docs[doc] = plant
+        self.live |= 1 << doc
+        self.order[doc] = normalize(str(plant.get("name") or ""))
+        self._keys[doc] = []
+        for field in TEXT_FIELDS:
+            for token in tokens(plant.get(field)):
+                self._set(self.exact, (field, token), doc)
+        for facet, fields in FACETS.items():
+            values = set()
+            for field in fields:
+                value = plant.get(field)
+                values.update(value if isinstance(value, list) else [value])
+            for value in values:
+                if isinstance(value, str) and value:
+                    self._set(self.facets, (facet, value), doc)
+        lifetime = plant.get("max_lifetime")
+        if isinstance(lifetime, int):
+            self._set(self.facets, ("lifetime", "annual" if lifetime <= 1 else "perennial"), doc)
+        for month in bloom_months(plant):
+            self._set(self.bloom, month, doc)
+
+    def _unindex(self, doc: int) -> None:
+        mask = ~(1 << doc)
+        for table, key in self._keys.pop(doc, ()):
+            value = table[key] & mask
+            if value:
+                table[key] = value
+            else:
+                del table[key]
+                if table is self.exact:
+                    vocab = self.vocab[key[0]]
+                    del vocab[bisect.bisect_left(vocab, key[1])]
+        self.live &= mask
+        self.docs[doc] = None
+        self.order.pop(doc, None)
+
+    def _put(self, plant: Dict, merge: bool = False) -> None:
+        pid = plant.get("id")
+        doc = self.doc_of.get(pid)
+        if doc is None:
+            doc = self.doc_of[pid] = len(self.docs)
+            self.docs.append(None)
+        else:
+            if merge and self.docs[doc] is not None:
+                plant = {**self.docs[doc], **plant}
+            self._unindex(doc)
+        self._index(doc, plant)
+
+    def rebuild(self, plants: Iterable[Dict]) -> None:
+        with self.lock:
+            self.docs, self.doc_of, self.live, self.order = [], {}, 0, {}
+            self.exact, self.facets, self.bloom, self._keys = {}, {}, {}, {}
+            self._pending = {}
+            for p in plants:
+                # like update_one, the first plant of an id counts
+                if p.get("id") not in self.doc_of:
+                    self._put(p)
+            tables = {id(t): t for t in (self.exact, self.facets, self.bloom)}
+            for (table, key), docs in self._pending.items():
+                tables[table][key] = bitset(docs)
+            self.vocab = {field: [] for field in TEXT_FIELDS}
+            for field, token in self.exact:
+                self.vocab[field].append(token)
+            for vocab in self.vocab.values():
+                vocab.sort()
+            self.live = bitset(range(len(self.docs)))
+            self._pending = None
+            self.built = True
+
+    def apply(self, op: str, arg: Any) -> None:
+        """Storage listener: apply one mutation."""
+        with self.lock:
+            if not self.built:
+                return
+            match op:
+                case "append":
+                    for p in arg:
+                        # the first plant of an id counts (like update_one)
+                        if p.get("id") not in self.doc_of:
+                            self._put(p)
+                case "update":
+                    self._put(arg)
+                case "merge":
+                    for p in arg:
+                        self._put(p, merge=True)
+                case "delete":
+                    for pid in arg:
+                        doc = self.doc_of.pop(pid, None)
+                        if doc is not None:
+                            self._unindex(doc)
+
+    def _prefixed(self, field: str, prefix: str) -> int:
+        """Docs with a token of field starting with prefix."""
+        vocab = self.vocab[field]
+        result = 0
+        for i in range(bisect.bisect_left(vocab, prefix), len(vocab)):
+            if not vocab[i].startswith(prefix):
+                break
+            result |= self.exact[(field, vocab[i])]
+        return result
+
+    def search(
+        self,
+        text: str = "",
+        facets: Optional[Dict[str, List[str]]] = None,
+        months: Optional[Iterable[int]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Any]:
+        """
+        Return ids of matching plants, best first. Values of one facet
+        are alternatives (or), facets, months and text tokens must all
+        match (and). `months` matches plants in bloom in any of them.
+        """
+        with self.lock:
+            result = self.live
+            for facet, values in (facets or {}).items():
+                any_of = 0
+                for value in values:
+                    any_of |= self.facets.get((facet, value), 0)
+                result &= any_of
+            if months is not None:
+                any_of = 0
+                for month in months:
+                    any_of |= self.bloom.get(month, 0)
+                result &= any_of
+            needles = sorted(tokens(text))
+            # needle -> field -> docs matching it as a prefix
+            prefixed: Dict[str, Dict[str, int]] = {}
+            for needle in needles:
+                prefixed[needle] = {field: self._prefixed(field, needle) for field in TEXT_FIELDS}
+                any_field = 0
+                for docs in prefixed[needle].values():
+                    any_field |= docs
+                result &= any_field
+                if not result:
+                    return []
+
+            ranked = []
+            for doc in bits(result):
+                score = 0.0
+                for needle in needles:
+                    for field in TEXT_FIELDS:
+                        if self.exact.get((field, needle), 0) >> doc & 1:
+                            score += WEIGHTS[field][0]
+                        elif prefixed[needle][field] >> doc & 1:
+                            score += WEIGHTS[field][1]
+                ranked.append((-score, self.order[doc], self.docs[doc].get("id")))
+            ranked.sort(key=lambda r: r[:2])
+            return [r[2] for r in ranked[:limit]]
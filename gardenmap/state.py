@@ -0,0 +1,361 @@
+"""
+Per-app state: storage backends and the in-memory state derived from them.
+
+Nothing is opened when the app is created. The backends are set up on
+first use in each process, so importing gardenmap or calling create_app()
+has no side effects, and a worker forked from a preloaded master (gunicorn
+--preload) sets up its own instead of sharing connections, file locks and
+threads with its parent.
+
+With GARDENMAP_GARDENS_DIR set, every garden of the /g/<garden_id>/ routes
+has its own storage in a subdirectory of it (garden.json and plants.json,
+or gardenmap.db). A garden is created by the first request writing to
+it; until then, reads see an empty garden planted from the default
+palette. Gardens are opened on first use and kept in a GardenCache, which
+closes them again when too many are open or they were not used for a
+while.
+"""
+
+import collections
+import functools
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Mapping, Optional, Tuple
+
+from filelock import FileLock, Timeout
+
+from .conflicts import ConflictIndex
+from .events import ChangeNotifier
+from .export import SVGExporter
+from .grid import GridIndex
+from .metrics import Metrics
+from .pages import CachedPage
+from .projection import PaletteProjection
+from .search import PaletteIndex
+from .storage import StorageBase, StorageError
+from .storage.batch import BatchedStorage
+
+
+# valid /g/<garden_id>/ (also the name of the garden's directory)
+GARDEN_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+# directory (in GARDENMAP_GARDENS_DIR) of the empty garden read by requests to gardens not created yet
+NEW_GARDEN = ".new"
+# file in a garden's directory once its own palette was copied from the default palette
+PALETTE_SEEDED = ".palette-seeded"
+
+
+class PaletteState:
+    """A palette storage and the in-memory state derived from it."""
+
+    def __init__(self, storage: StorageBase) -> None:
+        self.palette_storage = storage
+
+        # cached ?fields=/?month= views of the palette
+        self.palette_projection = PaletteProjection()
+
+        # /plants/search index (built on first use, then kept up to date)
+        self.palette_index = PaletteIndex()
+        self.palette_storage.add_listener(self._palette_index_update)
+
+    def close(self) -> None:
+        """Release the storage handle and remove the index listener (see GardenState.close)."""
+        self.palette_storage.remove_listener(self._palette_index_update)
+        self.palette_storage.close()
+
+    def _palette_index_update(self, op: str, arg: Any) -> None:
+        self.palette_index.apply(op, arg)
+        self.palette_index.version = self.palette_storage.version()
+
+
+class GardenState:
+    """A garden storage, the palette it is planted from and the in-memory state derived from them."""
+
+    def __init__(
+        self, palette: PaletteState, storage: StorageBase, config: Mapping[str, Any], template_dir: str,
+        static_dir: str, own_palette: bool = False
+    ) -> None:
+        self.palette = palette
+        # close() closes the palette, too (not shared with other gardens)
+        self.own_palette = own_palette
+        self.garden_storage = storage
+
+        # level-of-detail index of placed plants (built on first use, then kept up to date)
+        self.garden_grid = GridIndex()
+        self.garden_storage.add_listener(self._garden_grid_update)
+
+        # placements crowding each other (built on first use, then kept up to date)
+        self.conflict_index = ConflictIndex(config["GARDENMAP_CM_PER_UNIT"])
+        self.garden_storage.add_listener(self._conflict_index_update)
+
+        # wakes up /garden/events streams on changes made by this process
+        self.garden_notifier = ChangeNotifier()
+        self.garden_storage.add_listener(self.garden_notifier)
+
+        # cached server-side SVG exports
+        self.svg_exporter = SVGExporter(os.path.join(template_dir, "map.svg"), static_dir)
+
+    @property
+    def palette_storage(self) -> StorageBase:
+        return self.palette.palette_storage
+
+    @property
+    def palette_projection(self) -> PaletteProjection:
+        return self.palette.palette_projection
+
+    @property
+    def palette_index(self) -> PaletteIndex:
+        return self.palette.palette_index
+
+    def close(self) -> None:
+        """
+        Release the storage handles of the garden (and of its palette, unless
+        that is shared). The listeners are removed as well: they refer back
+        to this state, which could then only be freed by the cyclic GC.
+        """
+        for listener in (self._garden_grid_update, self._conflict_index_update, self.garden_notifier):
+            self.garden_storage.remove_listener(listener)
+        self.garden_storage.close()
+        if self.own_palette:
+            self.palette.close()
+
+    def _garden_grid_update(self, op: str, arg: Any) -> None:
+        self.garden_grid.apply(op, arg)
+        self.garden_grid.version = self.garden_storage.version()
+
+    def _conflict_index_update(self, op: str, arg: Any) -> None:
+        self.conflict_index.apply(op, arg)
+        self.conflict_index.version = self.garden_storage.version()
+
+
+class GardenCache:
+    """
+    Open gardens by id, at most `size` of them. Looking up a garden that
+    is not open opens it and closes the least recently used one if there
+    are too many. Gardens not used for `idle` seconds are closed on the
+    next lookup. Requests still using a closed garden keep working, its
+    storage handles reconnect when needed.
+    """
+
+    def __init__(self, open_garden: Callable[[str], GardenState], size: int = 128, idle: float = 600.0) -> None:
+        self.open_garden = open_garden
+        self.size = max(1, size)
+        self.idle = idle
+        # garden id -> (state, last use), least recently used first
+        self.gardens: "collections.OrderedDict[str, Tuple[GardenState, float]]" = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.gardens)
+
+    def __contains__(self, garden_id: str) -> bool:
+        return garden_id in self.gardens
+
+    def get(self, garden_id: str) -> GardenState:
+        """Return the open garden `garden_id`, open it if needed."""
+        with self.lock:
+            entry = self.gardens.get(garden_id)
+            if entry is not None:
+                self.gardens[garden_id] = (entry[0], time.monotonic())
+                self.gardens.move_to_end(garden_id)
+                closed = self._evict()
+                state = entry[0]
+        if entry is None:
+            # outside the lock: opening one garden doesn't block requests to others
+            opened = self.open_garden(garden_id)
+            with self.lock:
+                entry = self.gardens.get(garden_id)
+                # opened by another thread meanwhile
+                state = opened if entry is None else entry[0]
+                self.gardens[garden_id] = (state, time.monotonic())
+                self.gardens.move_to_end(garden_id)
+                closed = self._evict()
+            if state is not opened:
+                closed.append(opened)
+        for old in closed:
+            old.close()
+        return state
+
+    def _evict(self) -> list:
+        """Remove gardens over size or idle for too long (with lock held), return them."""
+        closed = []
+        expired = time.monotonic() - self.idle
+        while self.gardens:
+            garden_id, (state, used) = next(iter(self.gardens.items()))
+            if len(self.gardens) <= self.size and used >= expired:
+                break
+            del self.gardens[garden_id]
+            closed.append(state)
+        return closed
+
+    def clear(self) -> None:
+        """Close all gardens."""
+        with self.lock:
+            closed = [state for state, _ in self.gardens.values()]
+            self.gardens.clear()
+        for state in closed:
+            state.close()
+
+
+class AppState:
+    def __init__(self, config: Mapping[str, Any], template_dir: str, static_dir: str) -> None:
+        self.config = config
+        self.template_dir = template_dir
+        self.static_dir = static_dir
+        # index.html, rendered once per template change
+        self.index_page = CachedPage(template_dir)
+        # request/storage timings (nothing is wrapped unless enabled)
+        self.metrics = Metrics(config["GARDENMAP_METRICS"])
+        self.lock = threading.Lock()
+        # process that set up the backends
+        self.pid: Optional[int] = None
+
+    def load(self) -> "AppState":
+        """Set up backends and indexes if this process didn't yet, return self."""
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self._setup()
+                    self.pid = os.getpid()
+        return self
+
+    def garden(self, garden_id: Optional[str] = None, create: bool = True) -> GardenState:
+        """
+        The garden `garden_id` of GARDENMAP_GARDENS_DIR, or the default garden.
+        Unless `create`, a garden that doesn't exist yet is not created, the
+        (shared, never written) empty garden is returned instead.
+        """
+        if garden_id is None:
+            return self.default
+        if self.gardens is None or not GARDEN_ID.fullmatch(garden_id):
+            raise KeyError(garden_id)
+        if not create and not self.garden_exists(garden_id):
+            return self.new_garden
+        return self.gardens.get(garden_id)
+
+    def until_created(self, garden_id: Optional[str], state: GardenState) -> Optional[Callable[[], bool]]:
+        """
+        For `state` = garden(garden_id, create=False) of a garden not created
+        yet: a function returning True once it was created, so event streams
+        of the empty garden can end (the client then reconnects to the garden
+        itself). None for any other garden.
+        """
+        if garden_id is None or state is not self.new_garden:
+            return None
+        return functools.partial(self.garden_exists, garden_id)
+
+    def garden_exists(self, garden_id: str) -> bool:
+        """Whether the garden `garden_id` of GARDENMAP_GARDENS_DIR was created (by any process)."""
+        return garden_id in self.gardens \
+            or os.path.isdir(os.path.join(self.config["GARDENMAP_GARDENS_DIR"], garden_id))
+
+    def _backend(self) -> str:
+        backend = self.config["GARDENMAP_STORAGE"].lower()
+        if backend not in ("json", "sqlite"):
+            raise ValueError(f"invalid value \"{backend}\" for GARDENMAP_STORAGE")
+        return backend
+
+    def open_palette(self, directory: Optional[str] = None) -> StorageBase:
+        """Return a new palette storage handle as configured, or that of the garden in `directory`."""
+        backend = self._backend()
+        match backend:
+
+            case "json":
+                from .storage.json import JSONFileStorage
+                path = os.path.join(directory, "plants.json") if directory else self.config["GARDENMAP_PALETTE_PATH"]
+                palette = JSONFileStorage(path, changes_limit=0)
+
+            case "sqlite":
+                from .storage.sqlite import SQLiteStorage
+                path = os.path.join(directory, "gardenmap.db") if directory else self.config["GARDENMAP_DB_PATH"]
+                palette = SQLiteStorage(path, table="palette", changes_limit=0)
+
+        self.metrics.instrument_storage(palette, backend, "palette")
+        return palette
+
+    def open_garden(self, directory: Optional[str] = None) -> StorageBase:
+        """Return a new garden storage handle as configured, or that of the garden in `directory`."""
+        backend = self._backend()
+        match backend:
+
+            case "json":
+                from .storage.json import JSONFileStorage
+                path = os.path.join(directory, "garden.json") if directory else self.config["GARDENMAP_DATA_PATH"]
+                garden = JSONFileStorage(path, journal=self.config["GARDENMAP_JSON_JOURNAL"])
+
+            case "sqlite":
+                from .storage.sqlite import SQLiteGardenStorage
+                path = os.path.join(directory, "gardenmap.db") if directory else self.config["GARDENMAP_DB_PATH"]
+                garden = SQLiteGardenStorage(path, table="garden")
+
+        self.metrics.instrument_storage(garden, backend, "garden")
+        if self.config["GARDENMAP_GROUP_COMMIT"]:
+            garden = BatchedStorage(
+                garden, self.config["GARDENMAP_GROUP_COMMIT_WINDOW"], self.config["GARDENMAP_GROUP_COMMIT_MAX"]
+            )
+        return garden
+
+    def open_storage(self) -> Tuple[StorageBase, StorageBase]:
+        """Return new (palette, garden) storage handles as configured."""
+        return self.open_palette(), self.open_garden()
+
+    def _setup(self) -> None:
+        palette_storage, garden_storage = self.open_storage()
+        self.default = GardenState(
+            PaletteState(palette_storage), garden_storage, self.config, self.template_dir, self.static_dir
+        )
+        self.gardens: Optional[GardenCache] = None
+        if self.config["GARDENMAP_GARDENS_PALETTE"] not in ("shared", "own"):
+            raise ValueError(f"invalid value \"{self.config['GARDENMAP_GARDENS_PALETTE']}\" for GARDENMAP_GARDENS_PALETTE")
+        if self.config["GARDENMAP_GARDENS_DIR"]:
+            self.gardens = GardenCache(
+                self._open_shard, self.config["GARDENMAP_GARDENS_MAX_OPEN"], self.config["GARDENMAP_GARDENS_IDLE"]
+            )
+            self.new_garden = GardenState(
+                self.default.palette, self.open_garden(self._garden_dir(NEW_GARDEN)), self.config,
+                self.template_dir, self.static_dir
+            )
+
+    def _garden_dir(self, name: str) -> str:
+        directory = os.path.join(self.config["GARDENMAP_GARDENS_DIR"], name)
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            raise StorageError(f"could not create garden directory {directory}: {e}") from e
+        return directory
+
+    def _open_shard(self, garden_id: str) -> GardenState:
+        directory = self._garden_dir(garden_id)
+        if self.config["GARDENMAP_GARDENS_PALETTE"] != "own":
+            return GardenState(self.default.palette, self.open_garden(directory), self.config,
+                               self.template_dir, self.static_dir)
+
+        palette_storage = self.open_palette(directory)
+        self._seed_palette(directory, palette_storage)
+        return GardenState(PaletteState(palette_storage), self.open_garden(directory), self.config,
+                           self.template_dir, self.static_dir, own_palette=True)
+
+    def _seed_palette(self, directory: str, palette_storage: StorageBase) -> None:
+        """
+        Copy the default palette into a garden's own palette, once: a
+        marker file records that it was done, so a palette emptied later
+        stays empty, and a copy that failed (or was interrupted) is
+        retried on the next open.
+        """
+        marker = os.path.join(directory, PALETTE_SEEDED)
+        if os.path.exists(marker):
+            return
+        try:
+            with FileLock(f"{marker}.lock", timeout=5):
+                if os.path.exists(marker):
+                    return
+                # not empty: copied before, but the marker wasn't written
+                if not palette_storage.get_all():
+                    palette_storage.append(self.default.palette_storage.get_all())
+                with open(marker, "w", encoding="utf-8"):
+                    pass
+        except Timeout as e:
+            raise StorageError(f"timed out copying the palette of {directory}") from e
+        except OSError as e:
+            raise StorageError(f"could not copy the palette of {directory}: {e}") from e
@@ -13,14 +13,45 @@ implementation while offering a safer, tested SQLite option.
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Iterable, List, Optional
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .columns import GardenColumns
 
 
 class StorageError(RuntimeError):
     pass
 
 
+def change_ids(op: str, arg: Any) -> List:
+    """Return ids of the plants affected by a mutation (see StorageBase)."""
+    match op:
+        case "append" | "merge":
+            return [p.get("id") for p in arg]
+        case "update":
+            return [arg.get("id")]
+        case _:
+            return list(arg)
+
+
 class StorageBase(ABC):
+    """
+    Mutations notify listeners registered with add_listener() as
+    listener(op, arg) once they succeeded:
+
+      - ("append", [plant, ...])
+      - ("update", plant)          update_one (replace)
+      - ("merge", [plant, ...])    update_many (merge into existing)
+      - ("delete", [id, ...])
+
+    Backends that keep a change log return the same mutations from
+    changes_since() as {"version": token, "op": op, "ids": [...], "data": arg}.
+    """
+    # internals timed besides the public methods when metrics are enabled (see gardenmap.metrics)
+    TIMED_METHODS: Tuple[str, ...] = ()
+    # method waiting for the write lock, unless that is a FileLock in self.lock
+    LOCK_METHOD: Optional[str] = None
+
     @abstractmethod
     def get_all(self) -> List[Dict]:
         """Return the list of plant dicts (not wrapped)."""
@@ -46,6 +77,116 @@ class StorageBase(ABC):
         """Delete all plants whose id is in the provided iterable."""
         ...
 
+    def bulk_append(self, chunks: Iterable[List[Dict]]) -> Iterator[int]:
+        """
+        Append plants chunk by chunk (each chunk atomically) and yield the
+        number of plants stored so far after every chunk. Meant for imports:
+        backends may leave the chunks out of their change log (changes_since()
+        then asks for a snapshot) and defer expensive work to the end.
+        """
+        count = 0
+        for chunk in chunks:
+            self.append(chunk)
+            count += len(chunk)
+            yield count
+
+    def apply_batch(self, ops: Iterable[Tuple[str, Any]]) -> None:
+        """
+        Apply mutations (op, arg) as listed above, in order. Backends override
+        this to write all of them at once, under one lock and with one commit
+        (see gardenmap.storage.batch).
+        """
+        for op, arg in ops:
+            match op:
+                case "append":
+                    self.append(arg)
+                case "update":
+                    self.update_one(arg)
+                case "merge":
+                    self.update_many(arg)
+                case "delete":
+                    self.delete_by_ids(arg)
+                case _:
+                    raise StorageError(f"invalid operation \"{op}\"")
+
+    def add_listener(self, listener: Callable[[str, Any], None]) -> None:
+        """Call listener(op, arg) after every successful mutation in this process."""
+        self.__dict__.setdefault("_listeners", []).append(listener)
+
+    def remove_listener(self, listener: Callable[[str, Any], None]) -> None:
+        """Stop calling a listener added with add_listener()."""
+        # a new list: _notify() may be iterating the old one
+        self.__dict__["_listeners"] = [l for l in self.__dict__.get("_listeners", ()) if l != listener]
+
+    def _notify(self, op: str, arg: Any) -> None:
+        for listener in self.__dict__.get("_listeners", ()):
+            listener(op, arg)
+
+    def close(self) -> None:
+        """Release connections held by the handle (it stays usable and reconnects when needed)."""
+
+    def version(self) -> Optional[str]:
+        """
+        Return an opaque string that changes whenever the stored data changes
+        (also by other processes), or None if the backend can't tell.
+        Must be cheap: it is checked before data is read or serialized.
+        """
+        return None
+
+    def last_modified(self) -> Optional[float]:
+        """Return unix time of the last change, or None if unknown."""
+        return None
+
+    def snapshot(self) -> Tuple[str, List[Dict]]:
+        """Return (change token, all plants), consistent with each other."""
+        return self.version() or "", self.get_all()
+
+    def changes_since(self, token: str) -> Tuple[str, Optional[List[Dict]]]:
+        """
+        Return (current change token, changes made after `token`). The list is
+        None if the changes are not available (unknown or truncated token,
+        no change log), then the caller must fall back to snapshot().
+        """
+        return self.version() or "", None
+
+    def get_bbox(self, x0: float, y0: float, x1: float, y1: float) -> List[Dict]:
+        """
+        Return placed plants whose x/y position lies within the bounding box.
+        Default implementation: filter get_all().
+        """
+        result = []
+        for p in self.get_all():
+            x, y = p.get("x"), p.get("y")
+            if isinstance(x, (int, float)) and isinstance(y, (int, float)) \
+                    and x0 <= x <= x1 and y0 <= y <= y1:
+                result.append(p)
+        return result
+
+    def iter_json(self) -> Iterator[str]:
+        """
+        Return an iterator over all plants, each serialized as JSON text,
+        for responses that are streamed instead of built in memory.
+        Backends that can should read lazily (and fail early, on the call).
+        """
+        return (json.dumps(p, ensure_ascii=False) for p in self.get_all())
+
+    def get_columns(self) -> GardenColumns:
+        """
+        Return all plants as GardenColumns. The arrays are built once per
+        version() and shared by all callers, so they must not be modified.
+        """
+        version = self.version()
+        cached = self.__dict__.get("_columns")
+        if version is not None and cached is not None and cached[0] == version:
+            return cached[1]
+        columns = self._load_columns()
+        if version is not None:
+            self.__dict__["_columns"] = (version, columns)
+        return columns
+
+    def _load_columns(self) -> GardenColumns:
+        return GardenColumns.from_plants(self.get_all())
+
     def get_wrapped(self) -> Dict:
         """Return same structure as existing endpoints expect: {'plantlist': [...] }"""
         return {"plantlist": self.get_all()}
@@ -0,0 +1,161 @@
+"""
+Group commit of mutations.
+
+Concurrent writers of a threaded server each take the storage lock and
+write (and fsync) on their own, so a burst of writes queues up behind the
+lock one full write at a time. BatchedStorage queues the mutations of all
+threads of a process instead: one of the waiting threads, the leader,
+applies everything queued with a single apply_batch() call (one lock
+acquisition, one file write or transaction, one fsync) while the others
+wait for it. Writes arriving in the meantime form the next batch, which
+the next leader commits.
+
+A mutation returns once the batch it was in is durable. Batches are
+applied atomically, so if one fails, all of its mutations fail.
+"""
+
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import StorageBase, StorageError
+from .columns import GardenColumns
+
+
+class _Write:
+    __slots__ = ("op", "arg", "event", "committed", "error")
+
+    def __init__(self, op: str, arg: Any) -> None:
+        self.op = op
+        self.arg = arg
+        # set when committed, or when this write's thread has to lead the next batch
+        self.event = threading.Event()
+        self.committed = False
+        self.error: Optional[BaseException] = None
+
+
+class BatchedStorage(StorageBase):
+    """
+    Storage wrapper committing the mutations of concurrent threads
+    together. Reads go to the wrapped storage directly.
+
+    With `window` > 0, a leader waits up to that many seconds for more
+    writes (or until `max_ops` are queued) before it commits, which
+    collects batches even while the storage is idle, at the cost of
+    that much latency per write.
+    """
+
+    def __init__(self, storage: StorageBase, window: float = 0.0, max_ops: int = 256) -> None:
+        self.storage = storage
+        self.window = window
+        self.max_ops = max(1, max_ops)
+        self._queue: List[_Write] = []
+        self._queue_lock = threading.Lock()
+        # a thread is collecting or committing a batch
+        self._leading = False
+        self._full = threading.Event()
+
+    def _submit(self, op: str, arg: Any) -> None:
+        write = _Write(op, arg)
+        with self._queue_lock:
+            self._queue.append(write)
+            lead = not self._leading
+            self._leading = True
+            if len(self._queue) >= self.max_ops:
+                self._full.set()
+        if not lead:
+            write.event.wait()
+        if not write.committed:
+            self._lead()
+        if write.error is not None:
+            raise StorageError(str(write.error)) from write.error
+
+    def _lead(self) -> None:
+        """Commit the next batch (which starts with the caller's write), hand over to the next leader."""
+        if self.window > 0:
+            self._full.wait(self.window)
+        with self._queue_lock:
+            batch = self._queue[:self.max_ops]
+            del self._queue[:len(batch)]
+            self._full.clear()
+        try:
+            self.storage.apply_batch([(write.op, write.arg) for write in batch])
+        except Exception as e:
+            self._finish(batch, e)
+        except BaseException as e:
+            # (KeyboardInterrupt, SystemExit, ...) still fail the batch and
+            # hand over before this thread unwinds, or the queue would stall
+            self._finish(batch, e)
+            raise
+        else:
+            self._finish(batch, None)
+
+    def _finish(self, batch: List[_Write], error: Optional[BaseException]) -> None:
+        """Wake the writers of a batch and the next leader, if any."""
+        with self._queue_lock:
+            successor = self._queue[0] if self._queue else None
+            self._leading = successor is not None
+        for write in batch:
+            write.error = error
+            write.committed = True
+            write.event.set()
+        if successor is not None:
+            successor.event.set()
+
+    # mutations
+
+    def append(self, plants: Iterable[Dict]) -> None:
+        self._submit("append", list(plants))
+
+    def update_one(self, plant: Dict) -> None:
+        self._submit("update", plant)
+
+    def update_many(self, plants: Iterable[Dict]) -> None:
+        self._submit("merge", list(plants))
+
+    def delete_by_ids(self, ids: Iterable) -> None:
+        self._submit("delete", list(ids))
+
+    def apply_batch(self, ops: Iterable[Tuple[str, Any]]) -> None:
+        self.storage.apply_batch(ops)
+
+    def bulk_append(self, chunks: Iterable[List[Dict]]) -> Iterator[int]:
+        # imports write chunks of their own
+        return self.storage.bulk_append(chunks)
+
+    # everything else is the wrapped storage's
+
+    def add_listener(self, listener: Any) -> None:
+        self.storage.add_listener(listener)
+
+    def remove_listener(self, listener: Any) -> None:
+        self.storage.remove_listener(listener)
+
+    def close(self) -> None:
+        self.storage.close()
+
+    def get_all(self) -> List[Dict]:
+        return self.storage.get_all()
+
+    def version(self) -> Optional[str]:
+        return self.storage.version()
+
+    def last_modified(self) -> Optional[float]:
+        return self.storage.last_modified()
+
+    def snapshot(self) -> Tuple[str, List[Dict]]:
+        return self.storage.snapshot()
+
+    def changes_since(self, token: str) -> Tuple[str, Optional[List[Dict]]]:
+        return self.storage.changes_since(token)
+
+    def get_bbox(self, x0: float, y0: float, x1: float, y1: float) -> List[Dict]:
+        return self.storage.get_bbox(x0, y0, x1, y1)
+
+    def iter_json(self) -> Iterator[str]:
+        return self.storage.iter_json()
+
+    def get_columns(self) -> GardenColumns:
+        return self.storage.get_columns()
+
+    def get_wrapped(self) -> Dict:
+        return self.storage.get_wrapped()
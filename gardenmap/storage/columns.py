@@ -0,0 +1,188 @@
+"""
+Columnar (struct-of-arrays) representation of placed plants.
+
+Instead of one dict per plant, GardenColumns keeps one typed array per
+field: int64 ids, float32 positions and an index into a dictionary of
+plant_ids. The same arrays are the payload of the binary wire format
+(application/vnd.gardenmap.columnar), all little-endian:
+
+  offset  size        content
+  0       4           magic b"GMC1"
+  4       4           uint32 length H of the header (includes padding)
+  8       H           UTF-8 JSON header, padded with spaces to a multiple of 8:
+                        {"count": n, "plant_ids": [...], "ids": {"row": id, ...}, ...}
+  8+H     8n          int64   id
+          4n          float32 x
+          4n          float32 y
+          4n          uint32  index into plant_ids (0xffffffff: no plant_id)
+          n           uint8   kind of id
+
+Every array starts at an offset aligned to its item size, so a browser
+can wrap them in typed arrays (BigInt64Array, Float32Array, ...) of the
+response ArrayBuffer without copying. The kind of an id tells how to get
+the original id back:
+
+  0  the id is the integer in the id array
+  1  the id is the 12 digit hex string of the integer (see randomId() in main.js)
+  2  the id is header["ids"][str(row)] (any other id)
+
+Positions are float32, which is plenty for map coordinates but not a
+lossless round trip of the doubles in garden.json.
+"""
+
+from array import array
+import json
+import math
+import re
+import struct
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+
+MIME_TYPE = "application/vnd.gardenmap.columnar"
+MAGIC = b"GMC1"
+
+ID_INT = 0
+ID_HEX = 1
+ID_OTHER = 2
+NO_PLANT = 0xFFFFFFFF
+
+_HEX_ID = re.compile(r"[0-9a-f]{12}")
+_INT64 = (-(1 << 63), (1 << 63) - 1)
+_HEAD = struct.Struct("<4sI")
+
+
+class ColumnarError(ValueError):
+    pass
+
+
+class GardenColumns:
+    # (attribute, array typecode) in wire order
+    ARRAYS = (("id", "q"), ("x", "f"), ("y", "f"), ("plant", "I"), ("kind", "B"))
+
+    def __init__(self) -> None:
+        self.id = array("q")
+        self.x = array("f")
+        self.y = array("f")
+        self.plant = array("I")
+        self.kind = array("B")
+        self.plant_ids: List[str] = []
+        # row -> id of rows with kind ID_OTHER
+        self.other_ids: Dict[int, Any] = {}
+        self._plant_index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    def add(self, pid: Any, plant_id: Optional[str], x: Optional[float], y: Optional[float]) -> None:
+        """Append one plant."""
+        row = len(self.id)
+        if isinstance(pid, int) and not isinstance(pid, bool) and _INT64[0] <= pid <= _INT64[1]:
+            self.id.append(pid)
+            self.kind.append(ID_INT)
+        elif isinstance(pid, str) and _HEX_ID.fullmatch(pid):
+            self.id.append(int(pid, 16))
+            self.kind.append(ID_HEX)
+        else:
+            self.id.append(0)
+            self.kind.append(ID_OTHER)
+            self.other_ids[row] = pid
+        self.x.append(math.nan if x is None else x)
+        self.y.append(math.nan if y is None else y)
+        if plant_id is None:
+            self.plant.append(NO_PLANT)
+        else:
+            index = self._plant_index.get(plant_id)
+            if index is None:
+                index = self._plant_index[plant_id] = len(self.plant_ids)
+                self.plant_ids.append(plant_id)
+            self.plant.append(index)
+
+    @classmethod
+    def from_plants(cls, plants: Iterable[Dict]) -> "GardenColumns":
+        columns = cls()
+        for p in plants:
+            columns.add(p.get("id"), p.get("plant_id"), p.get("x"), p.get("y"))
+        return columns
+
+    def get_id(self, row: int) -> Any:
+        kind = self.kind[row]
+        if kind == ID_INT:
+            return self.id[row]
+        if kind == ID_HEX:
+            return f"{self.id[row]:012x}"
+        return self.other_ids.get(row)
+
+    def plants(self) -> Iterator[Dict]:
+        """Yield the plants as dicts (fields that were None are left out)."""
+        for row in range(len(self.id)):
+            plant = {"id": self.get_id(row)}
+            if self.plant[row] != NO_PLANT:
+                plant["plant_id"] = self.plant_ids[self.plant[row]]
+            if not math.isnan(self.x[row]):
+                plant["x"] = self.x[row]
+            if not math.isnan(self.y[row]):
+                plant["y"] = self.y[row]
+            yield plant
+
+    def encode(self, **header: Any) -> bytes:
+        """Return the wire format, with extra header entries (e.g. version)."""
+        header.update({
+            "count": len(self.id),
+            "plant_ids": self.plant_ids,
+            "ids": {str(row): pid for row, pid in self.other_ids.items()},
+        })
+        raw = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode()
+        raw += b" " * (-(_HEAD.size + len(raw)) % 8)
+        parts = [_HEAD.pack(MAGIC, len(raw)), raw]
+        for name, _ in self.ARRAYS:
+            values = getattr(self, name)
+            if sys.byteorder == "big":
+                values = array(values.typecode, values)
+                values.byteswap()
+            parts.append(values.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def decode(cls, blob: bytes) -> "GardenColumns":
+        """Parse the wire format, raise ColumnarError if it is malformed."""
+        try:
+            magic, size = _HEAD.unpack_from(blob)
+        except struct.error as e:
+            raise ColumnarError("truncated header") from e
+        if magic != MAGIC:
+            raise ColumnarError("not a gardenmap columnar blob")
+        try:
+            header = json.loads(blob[_HEAD.size:_HEAD.size + size])
+            count = int(header["count"])
+            plant_ids = [str(p) for p in header.get("plant_ids", [])]
+            other_ids = {int(row): pid for row, pid in header.get("ids", {}).items()}
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            raise ColumnarError("invalid header") from e
+
+        columns = cls()
+        offset = _HEAD.size + size
+        for name, typecode in cls.ARRAYS:
+            values = array(typecode)
+            end = offset + count * values.itemsize
+            if count < 0 or end > len(blob):
+                raise ColumnarError(f"truncated {name} array")
+            values.frombytes(blob[offset:end])
+            if sys.byteorder == "big":
+                values.byteswap()
+            setattr(columns, name, values)
+            offset = end
+        if any(i != NO_PLANT and i >= len(plant_ids) for i in columns.plant):
+            raise ColumnarError("plant index out of range")
+        if any(k > ID_OTHER for k in columns.kind):
+            raise ColumnarError("invalid id kind")
+        for row, kind in enumerate(columns.kind):
+            if kind == ID_OTHER and not isinstance(other_ids.get(row), (str, int, float)):
+                raise ColumnarError(f"missing or invalid id of row {row}")
+        # NaN stands for a missing position, infinity for nothing
+        if any(math.isinf(v) for v in columns.x) or any(math.isinf(v) for v in columns.y):
+            raise ColumnarError("infinite position")
+        columns.plant_ids = plant_ids
+        columns._plant_index = {p: i for i, p in enumerate(plant_ids)}
+        columns.other_ids = other_ids
+        return columns
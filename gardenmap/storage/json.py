@@ -2,16 +2,223 @@
 import json
 import os
 import tempfile
+import threading
+import time
 
 from filelock import FileLock, Timeout
-from typing import Dict, Iterable, List
-from . import StorageBase, StorageError
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from . import StorageBase, StorageError, change_ids
+
+
+# (inode, mtime_ns, size) of a storage file
+Stamp = Tuple[int, int, int]
+
+
+def _stamp(st: os.stat_result) -> Stamp:
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _apply(data: Dict, op: str, arg: Any) -> None:
+    """Apply one mutation to a parsed document (shared by direct writes and journal replay)."""
+    plantlist = data["plantlist"]
+    match op:
+        case "append":
+            plantlist += arg
+
+        case "update":
+            for i, p in enumerate(plantlist):
+                if p.get("id") == arg.get("id"):
+                    plantlist[i] = arg
+                    break
+            else:
+                # match JSON behavior: if no match, append
+                plantlist.append(arg)
+
+        case "merge":
+            index = {}
+            for i, p in enumerate(plantlist):
+                index.setdefault(p.get("id"), i)
+            for upd in arg:
+                pid = upd.get("id")
+                i = index.get(pid)
+                if i is not None:
+                    plantlist[i] = {**plantlist[i], **upd}
+                else:
+                    index[pid] = len(plantlist)
+                    plantlist.append(upd)
+
+        case "delete":
+            ids_set = set(arg)
+            data["plantlist"] = [p for p in plantlist if p.get("id") not in ids_set]
+
+        case _:
+            raise StorageError(f"invalid journal operation \"{op}\"")
+
+
+class ChangeLog:
+    """
+    Bounded change log of a JSON storage file, kept as JSON lines in
+    "<path>.changes":
+
+      {"epoch": "<random hex>"}
+      {"v": 1, "op": "append", "ids": [...], "data": [...]}
+      ...
+
+    Change tokens are "<epoch>.<v>". Once the log holds twice `limit`
+    entries it is rewritten with the newest `limit` entries (same epoch).
+    Writers must hold the storage lock.
+    """
+    def __init__(self, path: str, limit: int) -> None:
+        self.path = path
+        self.limit = limit
+        # (inode, parsed bytes, epoch, entries)
+        self._cache: Optional[Tuple[int, int, str, List[Dict]]] = None
+
+    def _load(self) -> Optional[Tuple[str, List[Dict]]]:
+        """Return (epoch, entries) or None if there is no log yet."""
+        try:
+            with open(self.path, "rb") as f:
+                ino = os.fstat(f.fileno()).st_ino
+                cache = self._cache
+                if cache is not None and cache[0] == ino:
+                    offset, epoch, entries = cache[1], cache[2], list(cache[3])
+                    f.seek(offset)
+                else:
+                    offset, epoch, entries = 0, None, []
+                chunk = f.read()
+        except FileNotFoundError:
+            self._cache = None
+            return None
+        # ignore a partially written last line
+        end = chunk.rfind(b"\n") + 1
+        try:
+            for line in chunk[:end].splitlines():
+                entry = json.loads(line)
+                if epoch is None:
+                    epoch = entry["epoch"]
+                else:
+                    entries.append(entry)
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            raise StorageError("corrupt storage change log") from e
+        if epoch is None:
+            return None
+        self._cache = (ino, offset + end, epoch, entries)
+        return epoch, entries
+
+    def _create(self) -> Tuple[str, List[Dict]]:
+        epoch = os.urandom(4).hex()
+        self._rewrite(epoch, [])
+        return epoch, []
+
+    def _rewrite(self, epoch: str, entries: List[Dict]) -> None:
+        dirpath = os.path.dirname(self.path) or "."
+        fd, tmp = tempfile.mkstemp(dir=dirpath)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"epoch": epoch}) + "\n")
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def token(self) -> str:
+        """Current change token (creates the log if missing)."""
+        log = self._load() or self._create()
+        epoch, entries = log
+        return f"{epoch}.{entries[-1]['v'] if entries else 0}"
+
+    def reset(self) -> None:
+        """Start a new epoch, so all tokens handed out so far are unknown."""
+        self._create()
+
+    def record(self, ops: List[Tuple[str, Any]]) -> None:
+        """Append one entry per (op, arg), with one fsync."""
+        epoch, entries = self._load() or self._create()
+        first = entries[-1]["v"] + 1 if entries else 1
+        new = [
+            {"v": v, "op": op, "ids": change_ids(op, arg), "data": arg}
+            for v, (op, arg) in enumerate(ops, first)
+        ]
+        if len(entries) + len(new) >= 2 * self.limit:
+            self._rewrite(epoch, (entries + new)[-self.limit:])
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n" for entry in new))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def since(self, token: str) -> Tuple[str, Optional[List[Dict]]]:
+        log = self._load()
+        if log is None:
+            return "", None
+        epoch, entries = log
+        current = f"{epoch}.{entries[-1]['v'] if entries else 0}"
+        tok_epoch, _, tok_v = (token or "").partition(".")
+        if tok_epoch != epoch or not tok_v.isdigit():
+            return current, None
+        v = int(tok_v)
+        last = entries[-1]["v"] if entries else 0
+        first = entries[0]["v"] if entries else 1
+        if v > last or v < first - 1:
+            # unknown or truncated
+            return current, None
+        return current, [
+            {"version": f"{epoch}.{e['v']}", "op": e["op"], "ids": e["ids"], "data": e["data"]}
+            for e in entries if e["v"] > v
+        ]
 
 
 class JSONFileStorage(StorageBase):
-    def __init__(self, path: str, lock_timeout: float = 5.0) -> None:
+    """
+    JSON file storage.
+
+    The parsed document is cached in memory together with the file's
+    (inode, mtime_ns, size) stamp. Reads only re-parse (and only take the
+    file lock) when another process or worker replaced the file since.
+
+    In journal mode, mutations are appended as compact JSON lines to
+    "<path>.log" instead of rewriting the whole file:
+
+      {"base": [inode, mtime_ns, size], "created": <unix time>}
+      {"op": "append", "arg": [...]}
+      {"op": "update", "arg": {...}}
+      {"op": "merge", "arg": [...]}
+      {"op": "delete", "arg": [...]}
+
+    Reads replay the log on top of the snapshot. The header line names the
+    snapshot the log applies to, so a log left behind by an interrupted
+    compaction is ignored. Once the log exceeds `compact_bytes` or is older
+    than `compact_interval` seconds, a background thread folds it back into
+    the snapshot, which stays the canonical on-disk format.
+
+    Unless `changes_limit` is 0, the last mutations are also kept in a
+    ChangeLog ("<path>.changes") for changes_since().
+    """
+    TIMED_METHODS = ("_read_snapshot", "_replay", "_write", "_journal_write", "compact")
+
+    def __init__(
+        self,
+        path: str,
+        lock_timeout: float = 5.0,
+        journal: bool = False,
+        compact_bytes: int = 1024 * 1024,
+        compact_interval: float = 300.0,
+        changes_limit: int = 1000,
+    ) -> None:
         self.path = os.fspath(path)
+        self.log_path = f"{self.path}.log"
         self.lock = FileLock(f"{self.path}.lock", timeout=lock_timeout)
+        self.journal = journal
+        self.compact_bytes = compact_bytes
+        self.compact_interval = compact_interval
+        # (snapshot stamp, (log inode, replayed bytes) or None, parsed document) of last read/write
+        self._cache: Optional[Tuple[Stamp, Optional[Tuple[int, int]], Dict]] = None
+        self._compactor: Optional[threading.Thread] = None
+        self.changes = ChangeLog(f"{self.path}.changes", changes_limit) if changes_limit else None
 
         # Ensure file exists
         if not os.path.exists(self.path):
@@ -22,21 +229,110 @@ class JSONFileStorage(StorageBase):
                 # Defer error until first operation
                 raise StorageError(f"could not create storage file {self.path}: {e}") from e
 
-    def _read(self) -> Dict:
+    @staticmethod
+    def _copy(data: Dict) -> Dict:
+        # shallow copy so callers can modify the list without touching the cache
+        # (items themselves are replaced, never modified in place)
+        return {**data, "plantlist": list(data["plantlist"])}
+
+    def _log_stat(self) -> Optional[os.stat_result]:
+        try:
+            return os.stat(self.log_path)
+        except FileNotFoundError:
+            return None
+
+    def _is_fresh(self) -> bool:
+        """True if neither snapshot nor log changed since they were cached."""
+        cache = self._cache
+        if cache is None:
+            return False
+        try:
+            if _stamp(os.stat(self.path)) != cache[0]:
+                return False
+        except OSError:
+            return False
+        log_st = self._log_stat()
+        if log_st is None:
+            return cache[1] is None
+        return cache[1] == (log_st.st_ino, log_st.st_size)
+
+    def _read_snapshot(self) -> Tuple[Optional[Stamp], Dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stamp = _stamp(os.fstat(f.fileno()))
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            # Return safe default if file missing or invalid
+            return None, {"plantlist": []}
+        if not isinstance(data, dict) or "plantlist" not in data:
+            data = {"plantlist": []}
+        if not isinstance(data["plantlist"], list):
+            data["plantlist"] = []
+        return stamp, data
+
+    def _replay(self, stamp: Stamp, data: Dict, offset: int) -> Optional[Tuple[int, int]]:
+        """
+        Apply log entries from byte `offset` on to `data`.
+        Return (log inode, end offset) or None if there is no log for this snapshot.
+        """
+        try:
+            with open(self.log_path, "rb") as f:
+                ino = os.fstat(f.fileno()).st_ino
+                f.seek(offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return None
+        # ignore a partially written last line
+        end = chunk.rfind(b"\n") + 1
+        lines = chunk[:end].splitlines()
+        try:
+            if offset == 0:
+                if not lines:
+                    return None
+                header = json.loads(lines.pop(0))
+                if tuple(header.get("base", ())) != stamp:
+                    # stale log of an earlier snapshot
+                    return None
+            for line in lines:
+                entry = json.loads(line)
+                _apply(data, entry["op"], entry["arg"])
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+            raise StorageError("corrupt storage journal") from e
+        return ino, offset + end
+
+    def _load(self) -> Dict:
+        """Return cached document, re-parse snapshot or replay new log entries if changed."""
+        if self._is_fresh():
+            return self._cache[2]
         try:
             with self.lock:
-                with open(self.path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    if not isinstance(data, dict) or "plantlist" not in data:
-                        return {"plantlist": []}
-                    if not isinstance(data["plantlist"], list):
-                        data["plantlist"] = []
-                    return data
+                cache = self._cache
+                try:
+                    snap_stamp = _stamp(os.stat(self.path))
+                except OSError:
+                    snap_stamp = None
+                log_st = self._log_stat()
+                if (
+                    cache is not None and snap_stamp == cache[0] and cache[1] is not None
+                    and log_st is not None and log_st.st_ino == cache[1][0]
+                    and log_st.st_size >= cache[1][1]
+                ):
+                    # only new log entries: apply them to the cached document
+                    stamp, data, offset = cache[0], self._copy(cache[2]), cache[1][1]
+                else:
+                    stamp, data = self._read_snapshot()
+                    offset = 0
+                    if stamp is None:
+                        self._cache = None
+                        return data
+                log_state = self._replay(stamp, data, offset) if log_st is not None else None
+                self._cache = (stamp, log_state, data)
+                return data
         except Timeout as e:
             raise StorageError("resource busy (file lock)") from e
-        except (FileNotFoundError, json.JSONDecodeError):
-            # Return safe default if file missing or invalid
-            return {"plantlist": []}
+
+    def _read(self) -> Dict:
+        return self._copy(self._load())
 
     def _write(self, data: Dict) -> None:
         # Write atomically by writing to a temp file then renaming.
@@ -50,7 +346,12 @@ class JSONFileStorage(StorageBase):
                         json.dump(data, f, indent=2, ensure_ascii=False)
                         f.flush()
                         os.fsync(f.fileno())
+                        stamp = _stamp(os.fstat(f.fileno()))
                     os.replace(tmp, self.path)
+                    # the snapshot now contains all journaled changes
+                    if os.path.exists(self.log_path):
+                        os.remove(self.log_path)
+                    self._cache = (stamp, None, self._copy(data))
                 finally:
                     # If replace failed, ensure tmp removed
                     if os.path.exists(tmp):
@@ -63,29 +364,201 @@ class JSONFileStorage(StorageBase):
         except OSError as e:
             raise StorageError("failed to write storage file") from e
 
+    def _journal_write(self, ops: List[Tuple[str, Any]], compact: bool = True) -> None:
+        lines = "".join(
+            json.dumps({"op": op, "arg": arg}, ensure_ascii=False, separators=(",", ":")) + "\n" for op, arg in ops
+        )
+        try:
+            with self.lock:
+                log_st = self._log_stat()
+                snap_stamp = _stamp(os.stat(self.path))
+                header = None
+                if log_st is None or log_st.st_size == 0 or self._log_base() != snap_stamp:
+                    header = json.dumps({"base": snap_stamp, "created": time.time()})
+                # write header (if needed) and entry in one go
+                mode = "w" if header else "a"
+                with open(self.log_path, mode, encoding="utf-8") as f:
+                    f.write(f"{header}\n{lines}" if header else lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    size = os.fstat(f.fileno()).st_size
+        except Timeout as e:
+            raise StorageError("resource busy (file lock)") from e
+        except OSError as e:
+            raise StorageError("failed to write storage journal") from e
+        if compact and (size >= self.compact_bytes or self._log_age() >= self.compact_interval):
+            self._compact_background()
+
+    def _log_base(self) -> Optional[Stamp]:
+        try:
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                return tuple(json.loads(f.readline()).get("base", ()))
+        except (OSError, json.JSONDecodeError, AttributeError):
+            return None
+
+    def _log_age(self) -> float:
+        try:
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                created = json.loads(f.readline()).get("created", time.time())
+        except (OSError, json.JSONDecodeError, AttributeError):
+            return 0.0
+        return time.time() - created
+
+    def _compact_background(self) -> None:
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self._compact_quietly, daemon=True)
+        self._compactor.start()
+
+    def _compact_quietly(self) -> None:
+        try:
+            self.compact()
+        except StorageError:
+            # retried after the next mutation
+            pass
+
+    def compact(self) -> None:
+        """Fold the journal into the snapshot file."""
+        try:
+            with self.lock:
+                if self._log_stat() is None:
+                    return
+                self._write(self._read())
+        except Timeout as e:
+            raise StorageError("resource busy (file lock)") from e
+
+    def _mutate(self, ops: List[Tuple[str, Any]], bulk: bool = False) -> None:
+        """
+        Apply and record mutations (op, arg), with one read and one write
+        (or journal append) for all of them. `bulk` mutations are always
+        journaled (compaction is left to the caller) and restart the change
+        log instead of being recorded in it.
+        """
+        # hold the lock from read to write so concurrent mutations can't get lost
+        try:
+            with self.lock:
+                if self.journal or bulk:
+                    self._journal_write(ops, compact=not bulk)
+                else:
+                    data = self._read()
+                    for op, arg in ops:
+                        _apply(data, op, arg)
+                    self._write(data)
+                # the data is written: from here on, nothing may fail the mutation
+                if self.changes is not None:
+                    try:
+                        if bulk:
+                            self.changes.reset()
+                        else:
+                            self.changes.record(ops)
+                    except (OSError, StorageError):
+                        self._forget_changes()
+        except Timeout as e:
+            raise StorageError("resource busy (file lock)") from e
+        for op, arg in ops:
+            self._notify(op, arg)
+
+    def _forget_changes(self) -> None:
+        """
+        Make all change tokens handed out so far unknown, so clients fall
+        back to a snapshot instead of missing a change that could not be
+        recorded. If not even a new log can be written, remove the old one.
+        """
+        try:
+            self.changes.reset()
+        except OSError:
+            try:
+                os.remove(self.changes.path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # nothing left to try, the change itself is stored
+                pass
+
+    def apply_batch(self, ops: Iterable[Tuple[str, Any]]) -> None:
+        """One read and one write (or journal append) for all mutations."""
+        ops = [(op, list(arg) if op != "update" else arg) for op, arg in ops]
+        for op, _ in ops:
+            if op not in ("append", "update", "merge", "delete"):
+                raise StorageError(f"invalid operation \"{op}\"")
+        self._mutate(ops)
+
+    def snapshot(self) -> Tuple[str, List[Dict]]:
+        if self.changes is None:
+            return super().snapshot()
+        try:
+            with self.lock:
+                return self.changes.token(), self.get_all()
+        except Timeout as e:
+            raise StorageError("resource busy (file lock)") from e
+        except OSError as e:
+            raise StorageError("failed to create storage change log") from e
+
+    def changes_since(self, token: str) -> Tuple[str, Optional[List[Dict]]]:
+        if self.changes is None:
+            return super().changes_since(token)
+        if not os.path.exists(self.changes.path):
+            # start the log, so there is a token to return
+            try:
+                with self.lock:
+                    self.changes.token()
+            except Timeout as e:
+                raise StorageError("resource busy (file lock)") from e
+            except OSError as e:
+                raise StorageError("failed to create storage change log") from e
+        return self.changes.since(token)
+
+    def _stats(self) -> Tuple[Optional[os.stat_result], Optional[os.stat_result]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            st = None
+        return st, self._log_stat()
+
+    def version(self) -> str:
+        """Derived from the stamps of snapshot and journal (no parsing, no lock)."""
+        st, log_st = self._stats()
+        version = "-".join(f"{v:x}" for v in _stamp(st)) if st else "0"
+        if log_st is not None:
+            version += f"-{log_st.st_ino:x}-{log_st.st_size:x}"
+        return version
+
+    def last_modified(self) -> Optional[float]:
+        mtimes = [st.st_mtime for st in self._stats() if st is not None]
+        return max(mtimes) if mtimes else None
+
     def get_all(self) -> List[Dict]:
-        return self._read().get("plantlist", [])
+        return list(self._load()["plantlist"])
+
+    def iter_json(self) -> Iterator[str]:
+        # the cached list is replaced, never modified, so it needs no copy
+        return (json.dumps(p, ensure_ascii=False) for p in self._load()["plantlist"])
 
     def append(self, plants: Iterable[Dict]) -> None:
-        data = self._read()
-        data["plantlist"] += list(plants)
-        self._write(data)
+        self._mutate([("append", list(plants))])
+
+    def bulk_append(self, chunks: Iterable[List[Dict]]) -> Iterator[int]:
+        """
+        Journal every chunk (also outside journal mode), then fold the
+        journal into the snapshot once, instead of rewriting the file per chunk.
+        """
+        count = 0
+        for chunk in chunks:
+            self._mutate([("append", chunk)], bulk=True)
+            count += len(chunk)
+            yield count
+        self.compact()
 
     def update_one(self, plant: Dict) -> None:
-        data = self._read()
-        updated = False
-        for i, p in enumerate(data["plantlist"]):
-            if p.get("id") == plant.get("id"):
-                data["plantlist"][i] = plant
-                updated = True
-                break
-        if not updated:
-            # match JSON behavior: if no match, append
-            data["plantlist"].append(plant)
-        self._write(data)
+        self._mutate([("update", plant)])
+
+    def update_many(self, plants: Iterable[Dict]) -> None:
+        """
+        Merge each update into the first plant with matching id
+        (existing | updated, like SQLiteStorage) or append it if not found.
+        One read and one write for the whole batch.
+        """
+        self._mutate([("merge", list(plants))])
 
     def delete_by_ids(self, ids: Iterable) -> None:
-        ids_set = set(ids)
-        data = self._read()
-        data["plantlist"] = [p for p in data.get("plantlist", []) if p.get("id") not in ids_set]
-        self._write(data)
+        self._mutate([("delete", list(ids))])
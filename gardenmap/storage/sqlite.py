@@ -1,13 +1,53 @@
-
-from contextlib import closing
+from contextlib import contextmanager
 import json
 import os
-from typing import Dict, Iterable, List
+import threading
+import time
+import weakref
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 import sqlite3
 
-from . import StorageBase, StorageError
+from . import StorageBase, StorageError, change_ids
+from .columns import GardenColumns
+
+
+# connection settings, applied once per pooled connection
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA mmap_size = 268435456;",
+    "PRAGMA cache_size = -16000;",
+)
+# per-table change counters shared by all tables of a database
+VERSION_TABLE = "gardenmap_version"
+# per-table change logs (see StorageBase.changes_since)
+CHANGES_TABLE = "gardenmap_changes"
+# rows fetched at once by iter_json()
+ITER_BATCH = 500
+
+# the calling thread's connections of all handles, {id(handle): (weakref to handle, connection, pid)},
+# so that threads can drop the connections of handles closed by other threads
+_connections = threading.local()
+# close() calls in this process; a thread looks for connections to drop when it changed
+_closes = 0
+_closes_lock = threading.Lock()
 
 
+def _drop_closed() -> None:
+    """Close the calling thread's connections of closed (or no longer used) handles."""
+    _connections.closes = _closes
+    handles = _connections.__dict__.setdefault("handles", {})
+    for key, (ref, conn, pid) in list(handles.items()):
+        handle = ref()
+        if handle is not None and not handle._closed:
+            continue
+        del handles[key]
+        # connections inherited from a parent process are not ours to close
+        if pid == os.getpid():
+            conn.close()
+            if handle is not None and getattr(handle._local, "conn", None) is conn:
+                handle._local.conn = None
+
 
 class SQLiteStorage(StorageBase):
     """
@@ -19,18 +59,65 @@ class SQLiteStorage(StorageBase):
         id TEXT,
         data TEXT NOT NULL
       );
+      CREATE INDEX IF NOT EXISTS <table>_id ON <table> (id);
 
     - We deliberately do NOT enforce a UNIQUE constraint on id to mirror the JSON
       backend semantics where duplicates are possible.
     - For update_one we update the first row (ORDER BY rowid) that matches the id.
     - For delete_by_ids we delete all rows with matching id (mirrors JSON filter behavior).
+    - Connections are pooled per thread (and per process, so forked workers
+      never share one) and configured once. close() closes them all: the
+      calling thread's right away, those of other threads on their next
+      use of any SQLiteStorage.
+    - Every mutation increments the table's counter in the gardenmap_version
+      table in the same transaction; version() combines it with the
+      database file's inode.
+    - Unless changes_limit is 0, the last mutations are kept in the
+      gardenmap_changes table, keyed by the version they created. Change
+      tokens are version() strings.
+    - Subclasses change the table layout by overriding COLUMNS, _encode(),
+      _decode(), _json() and _ensure_table().
     """
-    def __init__(self, db_path: str, table: str = "plants") -> None:
+    # stored columns besides rowid, in the order _encode() returns them
+    COLUMNS = ("id", "data")
+    TIMED_METHODS = ("_query", "_decode_rows")
+    LOCK_METHOD = "_begin"
+
+    def __init__(self, db_path: str, table: str = "plants", changes_limit: int = 1000) -> None:
         self.db_path = os.fspath(db_path)
         # allow table name safe usage (basic check)
         if not table.isidentifier():
             raise StorageError("invalid table/namespace name")
         self.table = table
+        self.changes_limit = changes_limit
+        self._local = threading.local()
+        self._closed = False
+        # statements are prepared once per connection by sqlite3's statement cache
+        columns = ", ".join(self.COLUMNS)
+        self._all_sql = f'SELECT {columns} FROM "{self.table}" ORDER BY rowid ASC;'
+        self._select_sql = f'SELECT rowid, {columns} FROM "{self.table}" WHERE id = ? ORDER BY rowid ASC LIMIT 1;'
+        self._update_sql = (
+            f'UPDATE "{self.table}" SET {", ".join(f"{c} = ?" for c in self.COLUMNS)} WHERE rowid = ?;'
+        )
+        self._insert_sql = (
+            f'INSERT INTO "{self.table}" ({columns}) VALUES ({", ".join("?" for _ in self.COLUMNS)});'
+        )
+        self._bump_sql = f'UPDATE {VERSION_TABLE} SET version = version + 1, modified = ? WHERE name = ?;'
+        self._version_sql = f'SELECT version, modified FROM {VERSION_TABLE} WHERE name = ?;'
+        self._record_sql = (
+            f'INSERT INTO {CHANGES_TABLE} (name, version, op, ids, data) '
+            f'SELECT name, version, ?, ?, ? FROM {VERSION_TABLE} WHERE name = ?;'
+        )
+        self._trim_sql = (
+            f'DELETE FROM {CHANGES_TABLE} WHERE name = ? AND version <= '
+            f'(SELECT version FROM {VERSION_TABLE} WHERE name = ?) - ?;'
+        )
+        self._forget_sql = f'DELETE FROM {CHANGES_TABLE} WHERE name = ?;'
+        self._delete_sql = f'DELETE FROM "{self.table}" WHERE id = ?;'
+        self._changes_sql = (
+            f'SELECT version, op, ids, data FROM {CHANGES_TABLE} '
+            'WHERE name = ? AND version > ? ORDER BY version ASC;'
+        )
         # ensure directory exists
         db_dir = os.path.dirname(self.db_path)
         if db_dir and not os.path.exists(db_dir):
@@ -40,14 +127,49 @@ class SQLiteStorage(StorageBase):
                 raise StorageError("could not create db directory") from e
         # initialize DB
         self._ensure_table()
+        self._ensure_version()
 
     def _connect(self) -> sqlite3.Connection:
-        # Create a new connection per operation to avoid cross-thread issues
+        if getattr(_connections, "closes", 0) != _closes:
+            _drop_closed()
+        # One connection per thread and process to avoid cross-thread issues
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
         conn = sqlite3.connect(self.db_path, timeout=5, isolation_level="DEFERRED")
-        conn.execute("PRAGMA journal_mode = WAL;")
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
         conn.row_factory = lambda cursor, row: row
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        _connections.__dict__.setdefault("handles", {})[id(self)] = (weakref.ref(self), conn, os.getpid())
         return conn
 
+    def close(self) -> None:
+        """
+        Close the pooled connections of all threads: the calling thread's
+        now, the others' on their next _connect() (of any handle). The
+        handle stays usable, threads still using it reconnect and drop that
+        connection again after the next close() of any handle.
+        """
+        global _closes
+        self._closed = True
+        with _closes_lock:
+            _closes += 1
+        _drop_closed()
+
+    def _encode(self, plant: Dict) -> Tuple:
+        """Return column values (see COLUMNS) to store for a plant dict."""
+        return (plant.get("id"), json.dumps(plant, ensure_ascii=False))
+
+    def _decode(self, row: Tuple) -> Optional[Dict]:
+        """Return plant dict for stored column values or None if malformed."""
+        try:
+            obj = json.loads(row[1]) if row[1] else {}
+        except json.JSONDecodeError:
+            return None
+        return obj if isinstance(obj, dict) else None
+
     def _ensure_table(self) -> None:
         sql = f"""
         CREATE TABLE IF NOT EXISTS "{self.table}" (
@@ -56,104 +178,439 @@ class SQLiteStorage(StorageBase):
           data TEXT NOT NULL
         );
         """
+        # migration: tables created by earlier versions lack the id index
+        index_sql = f'CREATE INDEX IF NOT EXISTS "{self.table}_id" ON "{self.table}" (id);'
         try:
-            with closing(self._connect()) as conn:
+            with self._connect() as conn:
                 conn.execute(sql)
-                conn.commit()
+                conn.execute(index_sql)
         except sqlite3.Error as e:
             raise StorageError("failed to initialize sqlite storage") from e
 
-    def get_all(self) -> List[Dict]:
-        sql = f'SELECT data FROM "{self.table}" ORDER BY rowid ASC;'
+    def _ensure_version(self) -> None:
         try:
-            with closing(self._connect()) as conn:
-                cur = conn.execute(sql)
-                rows = cur.fetchall()
-                result = []
-                for (data_text,) in rows:
-                    try:
-                        obj = json.loads(data_text)
-                        if isinstance(obj, dict):
-                            result.append(obj)
-                    except json.JSONDecodeError:
-                        # skip malformed row but continue
-                        continue
-                return result
+            with self._connect() as conn:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} "
+                    "(name TEXT PRIMARY KEY, version INTEGER NOT NULL, modified REAL NOT NULL);"
+                )
+                conn.execute(
+                    f"INSERT OR IGNORE INTO {VERSION_TABLE} (name, version, modified) VALUES (?, 0, ?);",
+                    (self.table, time.time())
+                )
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} (name TEXT, version INTEGER, op TEXT, "
+                    "ids TEXT, data TEXT, PRIMARY KEY (name, version)) WITHOUT ROWID;"
+                )
+        except sqlite3.Error as e:
+            raise StorageError("failed to initialize sqlite storage") from e
+
+    @contextmanager
+    def _transaction(self, op: str, arg: Any, record: bool = True):
+        """
+        Connection for one mutation: commits and counts it as a new version
+        (recorded in the change log, or clearing it if not `record`), or rolls back.
+        """
+        conn = self._connect()
+        with conn:
+            self._begin(conn)
+            yield conn
+            self._count(conn, op, arg, record)
+
+    def _count(self, conn: sqlite3.Connection, op: str, arg: Any, record: bool = True) -> None:
+        """Count a mutation as a new version (see _transaction)."""
+        conn.execute(self._bump_sql, (time.time(), self.table))
+        if self.changes_limit and record:
+            conn.execute(self._record_sql, (
+                op,
+                json.dumps(change_ids(op, arg), ensure_ascii=False),
+                json.dumps(arg, ensure_ascii=False),
+                self.table
+            ))
+            conn.execute(self._trim_sql, (self.table, self.table, self.changes_limit))
+        elif self.changes_limit:
+            # older changes alone are of no use to anyone anymore
+            conn.execute(self._forget_sql, (self.table,))
+
+    def _begin(self, conn: sqlite3.Connection) -> None:
+        # take the write lock up front, reads and writes of one mutation are atomic
+        conn.execute("BEGIN IMMEDIATE;")
+
+    def _version_row(self) -> Tuple[int, float]:
+        try:
+            with self._connect() as conn:
+                row = conn.execute(self._version_sql, (self.table,)).fetchone()
         except sqlite3.Error as e:
             raise StorageError("sqlite read error") from e
+        return row if row else (0, 0.0)
+
+    def version(self) -> str:
+        try:
+            ino = os.stat(self.db_path).st_ino
+        except OSError:
+            ino = 0
+        return f"{ino:x}-{self._version_row()[0]:x}"
+
+    def last_modified(self) -> Optional[float]:
+        return self._version_row()[1]
+
+    def snapshot(self) -> Tuple[str, List[Dict]]:
+        try:
+            ino = os.stat(self.db_path).st_ino
+        except OSError:
+            ino = 0
+        try:
+            conn = self._connect()
+            with conn:
+                # one read transaction: version and rows belong together
+                conn.execute("BEGIN;")
+                row = conn.execute(self._version_sql, (self.table,)).fetchone()
+                rows = conn.execute(self._all_sql).fetchall()
+        except sqlite3.Error as e:
+            raise StorageError("sqlite read error") from e
+        return f"{ino:x}-{row[0] if row else 0:x}", self._decode_rows(rows)
+
+    def changes_since(self, token: str) -> Tuple[str, Optional[List[Dict]]]:
+        current = self.version()
+        if not self.changes_limit:
+            return current, None
+        tok_ino, _, tok_v = (token or "").partition("-")
+        cur_ino, _, cur_v = current.partition("-")
+        try:
+            v, last = int(tok_v, 16), int(cur_v, 16)
+        except ValueError:
+            return current, None
+        if tok_ino != cur_ino or v > last:
+            return current, None
+        if v == last:
+            return current, []
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(self._changes_sql, (self.table, v)).fetchall()
+        except sqlite3.Error as e:
+            raise StorageError("sqlite read error") from e
+        if not rows or rows[0][0] != v + 1:
+            # truncated
+            return current, None
+        return f"{cur_ino}-{rows[-1][0]:x}", [
+            {"version": f"{cur_ino}-{version:x}", "op": op, "ids": json.loads(ids), "data": json.loads(data)}
+            for version, op, ids, data in rows
+        ]
+
+    def _json(self, row: Tuple) -> Optional[str]:
+        """Return JSON text of a plant for stored column values or None if malformed."""
+        # written by _encode(), pass it through without decoding
+        data = row[1] or "{}"
+        return data if data.startswith("{") and data.endswith("}") else None
+
+    def iter_json(self) -> Iterator[str]:
+        try:
+            cursor = self._connect().execute(self._all_sql)
+        except sqlite3.Error as e:
+            raise StorageError("sqlite read error") from e
+        return self._iter_cursor(cursor)
+
+    def _iter_cursor(self, cursor: sqlite3.Cursor) -> Iterator[str]:
+        try:
+            while True:
+                rows = cursor.fetchmany(ITER_BATCH)
+                if not rows:
+                    return
+                for row in rows:
+                    text = self._json(row)
+                    if text is not None:
+                        yield text
+        except sqlite3.Error as e:
+            raise StorageError("sqlite read error") from e
+        finally:
+            cursor.close()
+
+    def _decode_rows(self, rows: List[Tuple]) -> List[Dict]:
+        result = []
+        for row in rows:
+            obj = self._decode(row)
+            # skip malformed row but continue
+            if obj is not None:
+                result.append(obj)
+        return result
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[Dict]:
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            raise StorageError("sqlite read error") from e
+        return self._decode_rows(rows)
+
+    def get_all(self) -> List[Dict]:
+        return self._query(self._all_sql)
+
+    def _append_rows(self, conn: sqlite3.Connection, plants: List[Dict]) -> None:
+        conn.executemany(self._insert_sql, (self._encode(p) for p in plants))
 
-    def append(self, plants: Iterable[Dict]) -> None:
-        sql = f'INSERT INTO "{self.table}" (id, data) VALUES (?, ?);'
+    def append(self, plants: Iterable[Dict], record: bool = True) -> None:
+        plants = list(plants)
         try:
-            with closing(self._connect()) as conn:
-                cur = conn.cursor()
-                for p in plants:
-                    pid = p.get("id")
-                    cur.execute(sql, (pid, json.dumps(p, ensure_ascii=False)))
-                conn.commit()
+            with self._transaction("append", plants, record) as conn:
+                self._append_rows(conn, plants)
         except sqlite3.Error as e:
             raise StorageError("sqlite write error") from e
+        self._notify("append", plants)
 
-    def update_one(self, plant: Dict) -> None:
+    def bulk_append(self, chunks: Iterable[List[Dict]]) -> Iterator[int]:
+        """One transaction per chunk, without recording the chunks in the change log."""
+        count = 0
+        for chunk in chunks:
+            self.append(chunk, record=False)
+            count += len(chunk)
+            yield count
+
+    def _update_row(self, conn: sqlite3.Connection, plant: Dict) -> None:
         # find first row with this id
-        select_sql = f'SELECT rowid, data FROM "{self.table}" WHERE id = ? ORDER BY rowid ASC LIMIT 1;'
-        update_sql = f'UPDATE "{self.table}" SET data = ? WHERE rowid = ?;'
-        insert_sql = f'INSERT INTO "{self.table}" (id, data) VALUES (?, ?);'
-        pid = plant.get("id")
-        try:
-            with closing(self._connect()) as conn:
-                cur = conn.cursor()
-                cur.execute(select_sql, (pid,))
-                row = cur.fetchone()
-                if row:
-                    rowid = row[0]
-                    cur.execute(update_sql, (json.dumps(plant, ensure_ascii=False), rowid))
-                else:
-                    cur.execute(insert_sql, (pid, json.dumps(plant, ensure_ascii=False)))
-                conn.commit()
+        row = conn.execute(self._select_sql, (plant.get("id"),)).fetchone()
+        if row:
+            rowid = row[0]
+            conn.execute(self._update_sql, (*self._encode(plant), rowid))
+        else:
+            conn.execute(self._insert_sql, self._encode(plant))
+
+    def update_one(self, plant: Dict) -> None:
+        try:
+            with self._transaction("update", plant) as conn:
+                self._update_row(conn, plant)
         except sqlite3.Error as e:
             raise StorageError("sqlite write error") from e
+        self._notify("update", plant)
+
+    def _merge_rows(self, conn: sqlite3.Connection, plants: List[Dict]) -> None:
+        # id -> [rowid (None for new rows), merged dict], in order of first appearance
+        pending: Dict = {}
+        for upd in plants:
+            pid = upd.get("id")
+            entry = pending.get(pid)
+            if entry is None:
+                row = conn.execute(self._select_sql, (pid,)).fetchone()
+                if row:
+                    existing = self._decode(row[1:]) or {}
+                    pending[pid] = [row[0], {**existing, **upd}]
+                else:
+                    pending[pid] = [None, upd]
+            else:
+                entry[1] = {**entry[1], **upd}
+        conn.executemany(
+            self._update_sql,
+            ((*self._encode(merged), rowid)
+             for rowid, merged in pending.values() if rowid is not None)
+        )
+        conn.executemany(
+            self._insert_sql,
+            (self._encode(merged)
+             for rowid, merged in pending.values() if rowid is None)
+        )
 
     def update_many(self, plants: Iterable[Dict]) -> None:
         """
         For each updated plant, find first row with matching id, merge with existing
         dict (existing | updated) to preserve original 'merge' behavior, then update.
         If not found, insert the updated plant as new row.
+        Lookups use the id index, writes are batched with executemany.
         """
-        select_sql = f'SELECT rowid, data FROM "{self.table}" WHERE id = ? ORDER BY rowid ASC LIMIT 1;'
-        update_sql = f'UPDATE "{self.table}" SET data = ? WHERE rowid = ?;'
-        insert_sql = f'INSERT INTO "{self.table}" (id, data) VALUES (?, ?);'
-        try:
-            with closing(self._connect()) as conn:
-                cur = conn.cursor()
-                for upd in plants:
-                    pid = upd.get("id")
-                    cur.execute(select_sql, (pid,))
-                    row = cur.fetchone()
-                    if row:
-                        rowid, existing_text = row[0], row[1]
-                        try:
-                            existing = json.loads(existing_text) if existing_text else {}
-                        except json.JSONDecodeError:
-                            existing = {}
-                        merged = {**existing, **upd}
-                        cur.execute(update_sql, (json.dumps(merged, ensure_ascii=False), rowid))
-                    else:
-                        cur.execute(insert_sql, (pid, json.dumps(upd, ensure_ascii=False)))
-                conn.commit()
+        plants = list(plants)
+        try:
+            with self._transaction("merge", plants) as conn:
+                self._merge_rows(conn, plants)
         except sqlite3.Error as e:
             raise StorageError("sqlite write error") from e
+        self._notify("merge", plants)
+
+    def _delete_rows(self, conn: sqlite3.Connection, ids: List) -> None:
+        conn.executemany(self._delete_sql, ((pid,) for pid in ids))
 
     def delete_by_ids(self, ids: Iterable) -> None:
-        # Build placeholders safely
-        ids_list = list(ids)
-        if not ids_list:
-            return
-        placeholders = ",".join("?" for _ in ids_list)
-        sql = f'DELETE FROM "{self.table}" WHERE id IN ({placeholders});'
-        try:
-            with closing(self._connect()) as conn:
-                conn.execute(sql, tuple(ids_list))
-                conn.commit()
+        ids = list(ids)
+        try:
+            with self._transaction("delete", ids) as conn:
+                self._delete_rows(conn, ids)
         except sqlite3.Error as e:
             raise StorageError("sqlite delete error") from e
+        self._notify("delete", ids)
+
+    def apply_batch(self, ops: Iterable[Tuple[str, Any]]) -> None:
+        """All mutations in one transaction, with one commit."""
+        writers = {
+            "append": self._append_rows, "update": self._update_row,
+            "merge": self._merge_rows, "delete": self._delete_rows,
+        }
+        ops = [(op, arg if op == "update" else list(arg)) for op, arg in ops]
+        for op, _ in ops:
+            if op not in writers:
+                raise StorageError(f"invalid operation \"{op}\"")
+        try:
+            conn = self._connect()
+            with conn:
+                self._begin(conn)
+                for op, arg in ops:
+                    writers[op](conn, arg)
+                    self._count(conn, op, arg)
+        except sqlite3.Error as e:
+            raise StorageError("sqlite write error") from e
+        for op, arg in ops:
+            self._notify(op, arg)
+
+
+class SQLiteGardenStorage(SQLiteStorage):
+    """
+    SQLite storage for placed plants with typed columns and a spatial index.
+
+    Table layout:
+      CREATE TABLE IF NOT EXISTS <table> (
+        rowid INTEGER PRIMARY KEY AUTOINCREMENT,
+        id,
+        plant_id TEXT,
+        x REAL,
+        y REAL,
+        data TEXT
+      );
+      CREATE VIRTUAL TABLE <table>_rtree USING rtree(id, min_x, max_x, min_y, max_y);
+
+    - id has no type affinity, so numeric ids keep their type like in garden.json.
+    - data holds any fields besides id/plant_id/x/y as JSON (NULL if none).
+    - The R*Tree is kept in sync with x/y by triggers. If SQLite was built
+      without R*Tree support, a plain (x, y) index is used instead.
+    - A table in the old blob layout (id, data) is migrated on startup.
+    """
+    COLUMNS = ("id", "plant_id", "x", "y", "data")
+    FIELDS = ("id", "plant_id", "x", "y")
+
+    def _encode(self, plant: Dict) -> Tuple:
+        extra = {k: v for k, v in plant.items() if k not in self.FIELDS}
+        return (
+            plant.get("id"), plant.get("plant_id"), plant.get("x"), plant.get("y"),
+            json.dumps(extra, ensure_ascii=False) if extra else None
+        )
+
+    def _decode(self, row: Tuple) -> Optional[Dict]:
+        obj = {k: v for k, v in zip(self.FIELDS, row) if v is not None}
+        if row[4]:
+            try:
+                extra = json.loads(row[4])
+            except json.JSONDecodeError:
+                return None
+            if isinstance(extra, dict):
+                obj.update(extra)
+        return obj
+
+    def _json(self, row: Tuple) -> Optional[str]:
+        obj = self._decode(row)
+        return None if obj is None else json.dumps(obj, ensure_ascii=False)
+
+    def _ensure_table(self) -> None:
+        t = self.table
+        rtree = f"{t}_rtree"
+        sql = f"""
+        CREATE TABLE IF NOT EXISTS "{t}" (
+          rowid INTEGER PRIMARY KEY AUTOINCREMENT,
+          id,
+          plant_id TEXT,
+          x REAL,
+          y REAL,
+          data TEXT
+        );
+        """
+        point = "new.rowid, new.x, new.x, new.y, new.y WHERE new.x IS NOT NULL AND new.y IS NOT NULL"
+        triggers = (
+            f'CREATE TRIGGER IF NOT EXISTS "{t}_rtree_insert" AFTER INSERT ON "{t}" BEGIN '
+            f'INSERT INTO "{rtree}" SELECT {point}; END;',
+            f'CREATE TRIGGER IF NOT EXISTS "{t}_rtree_update" AFTER UPDATE OF x, y ON "{t}" BEGIN '
+            f'DELETE FROM "{rtree}" WHERE id = old.rowid; INSERT INTO "{rtree}" SELECT {point}; END;',
+            f'CREATE TRIGGER IF NOT EXISTS "{t}_rtree_delete" AFTER DELETE ON "{t}" BEGIN '
+            f'DELETE FROM "{rtree}" WHERE id = old.rowid; END;',
+        )
+        try:
+            with self._connect() as conn:
+                # one transaction (DDL included): handles opening a new database
+                # concurrently must not both create and fill the R*Tree
+                conn.execute("BEGIN IMMEDIATE;")
+                columns = [r[1] for r in conn.execute(f'PRAGMA table_info("{t}");')]
+                if columns and "x" not in columns:
+                    self._migrate_blob_table(conn)
+                conn.execute(sql)
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "{t}_id" ON "{t}" (id);')
+                exists = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;", (rtree,)
+                ).fetchone()
+                if not exists:
+                    try:
+                        conn.execute(
+                            f'CREATE VIRTUAL TABLE "{rtree}" USING rtree(id, min_x, max_x, min_y, max_y);'
+                        )
+                    except sqlite3.OperationalError:
+                        # no R*Tree module compiled in
+                        self.rtree = False
+                        conn.execute(f'CREATE INDEX IF NOT EXISTS "{t}_xy" ON "{t}" (x, y);')
+                        return
+                    conn.execute(
+                        f'INSERT INTO "{rtree}" SELECT rowid, x, x, y, y FROM "{t}" '
+                        'WHERE x IS NOT NULL AND y IS NOT NULL;'
+                    )
+                for trigger in triggers:
+                    conn.execute(trigger)
+                self.rtree = True
+        except sqlite3.Error as e:
+            raise StorageError("failed to initialize sqlite storage") from e
+
+    def _migrate_blob_table(self, conn: sqlite3.Connection) -> None:
+        """Convert a table in SQLiteStorage's (id, data) layout into typed columns."""
+        t = self.table
+        # runs in _ensure_table()'s transaction
+        rows = conn.execute(f'SELECT rowid, data FROM "{t}" ORDER BY rowid ASC;').fetchall()
+        conn.execute(f'ALTER TABLE "{t}" RENAME TO "{t}_blob";')
+        conn.execute(f'DROP INDEX IF EXISTS "{t}_id";')
+        conn.execute(f"""
+        CREATE TABLE "{t}" (
+          rowid INTEGER PRIMARY KEY AUTOINCREMENT,
+          id,
+          plant_id TEXT,
+          x REAL,
+          y REAL,
+          data TEXT
+        );
+        """)
+        migrated = []
+        for rowid, data_text in rows:
+            obj = SQLiteStorage._decode(self, (None, data_text))
+            if obj is not None:
+                migrated.append((rowid, *self._encode(obj)))
+        conn.executemany(
+            f'INSERT INTO "{t}" (rowid, {", ".join(self.COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?);', migrated
+        )
+        conn.execute(f'DROP TABLE "{t}_blob";')
+
+    def _load_columns(self) -> GardenColumns:
+        # straight from the typed columns, without a dict per plant
+        columns = GardenColumns()
+        try:
+            with self._connect() as conn:
+                for row in conn.execute(f'SELECT id, plant_id, x, y FROM "{self.table}" ORDER BY rowid ASC;'):
+                    columns.add(*row)
+        except sqlite3.Error as e:
+            raise StorageError("sqlite read error") from e
+        return columns
+
+    def get_bbox(self, x0: float, y0: float, x1: float, y1: float) -> List[Dict]:
+        columns = ", ".join(f"t.{c}" for c in self.COLUMNS)
+        if self.rtree:
+            sql = (
+                f'SELECT {columns} FROM "{self.table}_rtree" AS r JOIN "{self.table}" AS t ON t.rowid = r.id '
+                'WHERE r.max_x >= ? AND r.min_x <= ? AND r.max_y >= ? AND r.min_y <= ? '
+                # the R*Tree stores float32 bounds, filter exact positions
+                'AND t.x BETWEEN ? AND ? AND t.y BETWEEN ? AND ? ORDER BY t.rowid ASC;'
+            )
+            params = (x0, x1, y0, y1, x0, x1, y0, y1)
+        else:
+            sql = (
+                f'SELECT {columns} FROM "{self.table}" AS t '
+                'WHERE t.x BETWEEN ? AND ? AND t.y BETWEEN ? AND ? ORDER BY t.rowid ASC;'
+            )
+            params = (x0, x1, y0, y1)
+        return self._query(sql, params)
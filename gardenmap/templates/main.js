@@ -9,8 +9,15 @@ const palette = document.getElementById("palette");
 
 /* complete model of garden with plant references to plant palette */
 let garden = {};
+/* garden version the model reflects (see /garden/changes) */
+let gardenVersion = null;
+/* garden change notifications (see /garden/events) */
+let gardenEvents = null;
+let gardenReloadPending = false;
 /* plant palette */
 let plants = {};
+/* per-month icon sprite sheets: { month: { url, icons: Set } } */
+let sprites = {};
 /* anim frame pending */
 let af_pending = false;
 /* cached CTM */
@@ -68,15 +75,29 @@ const gardenMaxHeight = 200.0;          // max plant height (in cm)
 /* ---------------------------------------------------------------------------*/
 function paletteLoad() {
     /* load plants */
-    return fetch('/plants')
+    return fetch('plants')
         .then(res => res.json())
         .then(data => {
             data.plantlist.forEach(plant => {
                 plants[plant['id']] = plant;
             });
+            sprites = {};
+            for (const [month, sprite] of Object.entries(data.sprites || {})) {
+                sprites[month] = { url: sprite.url, icons: new Set(sprite.icons) };
+            }
         }).then(() => paletteRender());
 }
 
+/* reference to the plant's icon in the sprite sheet of the selected month (or null) */
+function spriteIconHref(plant_model) {
+    const icon = plant_model.vegetation.icon[monthSelected];
+    const sprite = sprites[monthSelected];
+    if (!sprite || !sprite.icons.has(icon)) {
+        return null;
+    }
+    return sprite.url + "#" + icon.split("/").pop().replace(/\.svg$/, "");
+}
+
 /* render filter form */
 function filterRender(id, elements) {
     const filter = document.getElementById(id);
@@ -175,7 +196,7 @@ function paletteAdd() {
             height: Object.fromEntries([...Array(12)].map((_, i) => [i + 1, 15]))
         }
     };
-    fetch('/plants', {
+    fetch('plants', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(newPlant)
@@ -290,7 +311,7 @@ function paletteSaveEdit() {
     plant.propagation = document.getElementById('edit-propagation').value.split(",");
     plant.snails = document.getElementById('edit-snails').value;
 
-    fetch('/plants', {
+    fetch('plants', {
         method: 'PUT',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(plant)
@@ -411,22 +432,87 @@ function paletteFilterNow() {
 
 function gardenLoad() {
     /* remove all plants */
-    document.querySelectorAll('#gardensvg image').forEach(e => e.remove());
+    document.querySelectorAll('#gardensvg image, #plantlist use').forEach(e => e.remove());
 
-    /* load garden */
-    return fetch('/garden')
+    /* load garden (only changes since last load if possible) */
+    const url = gardenVersion ? 'garden/changes?since=' + encodeURIComponent(gardenVersion) : 'garden/changes';
+    return fetch(url)
         .then(res => res.json())
         .then(data => {
-            /* initialize each plant icon */
-            garden = {};
-            data.plantlist.forEach(plant => {
-                /* store model */
-                garden[plant.id] = plant;
-            });
+            if (data.snapshot) {
+                /* initialize each plant icon */
+                garden = {};
+                data.snapshot.forEach(plant => {
+                    /* store model */
+                    garden[plant.id] = plant;
+                });
+            } else {
+                gardenApplyChanges(data.changes);
+            }
+            gardenVersion = data.version;
         })
         .then(() => { gardenRender(); });
 }
 
+/* reload garden when it was changed (by this or other clients) */
+function gardenSubscribe() {
+    if (!window.EventSource || gardenEvents) {
+        return;
+    }
+    gardenEvents = new EventSource('garden/events?since=' + encodeURIComponent(gardenVersion || ""));
+    const reload = (reset) => {
+        if (reset) {
+            gardenVersion = null;
+        }
+        if (gardenReloadPending) {
+            return;
+        }
+        gardenReloadPending = true;
+        setTimeout(function retry() {
+            /* don't re-render while plants are dragged */
+            if (selectionDragStartPositions.length > 0) {
+                setTimeout(retry, 250);
+                return;
+            }
+            gardenReloadPending = false;
+            gardenLoad();
+        }, 100);
+    };
+    gardenEvents.addEventListener("change", () => reload(false));
+    gardenEvents.addEventListener("reset", () => reload(true));
+    const events = gardenEvents;
+    events.addEventListener("error", () => {
+        /* not reconnecting by itself (e.g. after 503 from a busy server): subscribe again later */
+        if (events.readyState === EventSource.CLOSED && gardenEvents === events) {
+            gardenEvents = null;
+            setTimeout(gardenSubscribe, 5000);
+        }
+    });
+}
+
+/* apply changes from /garden/changes to garden model */
+function gardenApplyChanges(changes) {
+    for (const change of changes) {
+        switch(change.op) {
+            case "append":
+                change.data.forEach(plant => { garden[plant.id] = plant; });
+                break;
+
+            case "update":
+                garden[change.data.id] = change.data;
+                break;
+
+            case "merge":
+                change.data.forEach(plant => { garden[plant.id] = { ...garden[plant.id], ...plant }; });
+                break;
+
+            case "delete":
+                change.ids.forEach(id => { delete garden[id]; });
+                break;
+        }
+    }
+}
+
 function gardenRender() {
     /* remove all images */
     plantlist.innerHTML = "";
@@ -439,9 +525,10 @@ function gardenRender() {
         switch(viewMode) {
             /* draw icons */
             case "iconVisMode":
-                /* create new image */
-                el = document.createElementNS("http://www.w3.org/2000/svg", "image");
-                el.setAttribute("href", plant_model.vegetation.icon[monthSelected]);
+                /* use sprite sheet symbol if available, single image otherwise */
+                const sprite_href = spriteIconHref(plant_model);
+                el = document.createElementNS("http://www.w3.org/2000/svg", sprite_href ? "use" : "image");
+                el.setAttribute("href", sprite_href || plant_model.vegetation.icon[monthSelected]);
                 break;
 
             /* visualize max height */
@@ -524,7 +611,7 @@ function gardenRender() {
 }
 
 function gardenDeletePlant() {
-    fetch('/garden', {
+    fetch('garden', {
         method: 'DELETE',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(selection)
@@ -536,7 +623,7 @@ function gardenDeletePlant() {
 
 /* export garden JSON (all attributes from DB) */
 function gardenExportJson() {
-    fetch('/garden')
+    fetch('garden')
         .then(res => {
             if (!res.ok) throw new Error('Failed to fetch garden data');
             return res.json();
@@ -574,75 +661,56 @@ if (importGardenInput) {
         const file = e.target.files && e.target.files[0];
         if (!file) return;
 
-        // Optional: client-side size check against common server MAX_CONTENT_LENGTH (1MB)
-        const MAX_CLIENT_FILE_SIZE = 40 * 1024 * 1024; // 40 MB
-        if (file.size > MAX_CLIENT_FILE_SIZE) {
-            const proceed = confirm('Selected file is larger than 40 MB. The server may reject large uploads. Proceed?');
-            if (!proceed) {
-                importGardenInput.value = '';
-                return;
-            }
-        }
-
-        const reader = new FileReader();
-        reader.onload = () => {
-            let parsed;
-            try {
-                parsed = JSON.parse(reader.result);
-            } catch (ex) {
-                alert('Invalid JSON file: ' + ex.message);
-                importGardenInput.value = '';
-                return;
-            }
-
-            let plantsToPost = null;
-            if (Array.isArray(parsed)) {
-                // file contains an array of plant objects
-                plantsToPost = parsed;
-            } else if (parsed && Array.isArray(parsed.plantlist)) {
-                // file uses wrapped format { plantlist: [...] }
-                plantsToPost = parsed.plantlist;
-            } else if (parsed && typeof parsed === 'object' && parsed.id) {
-                // single plant object
-                plantsToPost = [parsed];
-            } else {
-                alert('JSON does not appear to contain plant data (expected array or {plantlist: [...] }).');
-                importGardenInput.value = '';
-                return;
+        /* stream file to server, it reports progress as one JSON line per stored chunk */
+        const title = document.title;
+        fetch('garden/import', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: file
+        })
+        .then(res => {
+            if (!res.ok || !res.body) {
+                return res.text().then(t => { throw new Error(t || 'Server rejected import'); });
             }
-
-            // POST to /garden to preserve existing behavior (accepts single or list)
-            fetch('/garden', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(plantsToPost)
-            })
-            .then(res => {
-                if (!res.ok) {
-                    return res.text().then(t => { throw new Error(t || 'Server rejected import'); });
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffered = '';
+            let result = null;
+            const read = () => reader.read().then(({ done, value }) => {
+                buffered += decoder.decode(value || new Uint8Array(), { stream: !done });
+                const lines = buffered.split('\n');
+                buffered = lines.pop();
+                for (const line of lines.filter(l => l.trim())) {
+                    result = JSON.parse(line);
+                    document.title = `importing… ${result.imported}`;
                 }
-                return res.json();
-            })
-            .then(() => {
-                // reload data and UI
-                gardenLoad().then(() => {
-                    alert('Import successful');
-                });
-            })
-            .catch(err => {
-                alert('Import failed: ' + err.message);
-            })
-            .finally(() => {
-                importGardenInput.value = '';
+                return done ? result : read();
             });
-        };
-        reader.readAsText(file);
+            return read();
+        })
+        .then(result => {
+            document.title = title;
+            // reload data and UI
+            return gardenLoad().then(() => {
+                if (!result || result.status !== 'success') {
+                    throw new Error((result && result.error) || 'no result');
+                }
+                alert(`Import successful: ${result.imported} plants imported, ${result.rejected} rejected`);
+            });
+        })
+        .catch(err => {
+            alert('Import failed: ' + err.message);
+        })
+        .finally(() => {
+            document.title = title;
+            importGardenInput.value = '';
+        });
     });
 }
 
 /* export plant species JSON (all attributes from DB) */
 function plantExportJson() {
-    fetch('/plants')
+    fetch('plants')
         .then(res => {
             if (!res.ok) throw new Error('Failed to fetch plant palette');
             return res.json();
@@ -717,7 +785,7 @@ if (importPlantsInput) {
             }
 
             // POST to /plants to append species; /plants endpoint accepts list or single object
-            fetch('/plants', {
+            fetch('plants', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify(plantsToPost)
@@ -754,7 +822,7 @@ function gardenAddPlant(id, x, y) {
         plant_id: id,
         id: randomId()
     };
-    fetch('/garden', {
+    fetch('garden', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(newPlant)
@@ -773,13 +841,9 @@ function gardenAddSelectedPlant() {
 
 /* export SVG */
 function gardenExportSvg() {
-    /* serialize SVG */
-    let xml = new XMLSerializer().serializeToString(svg);
-    /* add FQDN to image hrefs */
-    xml = xml.replaceAll('href=\"/', `href="${location}`);
-    /* append as hidden element to document */
-    var element = document.createElement('a');
-    element.setAttribute('href', 'data:text/plain;charset=utf-8,' + encodeURIComponent(xml));
+    /* rendered by the server, icons are inlined */
+    const element = document.createElement('a');
+    element.setAttribute('href', `garden/export.svg?month=${monthSelected}`);
     element.setAttribute('download', `garden-${monthSelected}.svg`);
     element.style.display = 'none';
     document.body.appendChild(element);
@@ -1130,7 +1194,7 @@ svg.addEventListener("pointerup", (e) => {
                 });
             }
         });
-        fetch('/garden', {
+        fetch('garden', {
             method: 'PUT',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(dragged_plants)
@@ -1160,7 +1224,7 @@ svg.addEventListener("pointerup", (e) => {
     /* click anywhere clears selection
      * (except box select mode is active)
      */
-    else if (e.target.tagName !== 'image' && !viewIsPanning && !selectionBoxMode) {
+    else if (e.target.tagName !== 'image' && e.target.tagName !== 'use' && !viewIsPanning && !selectionBoxMode) {
         selectionClear();
     }
     /* finish pinch zoom */
@@ -1340,7 +1404,7 @@ document.onpaste = (e) => {
         }
 
         /* add pasted plants to garden */
-        fetch('/garden', {
+        fetch('garden', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(pasted_plants)
@@ -1382,8 +1446,8 @@ window.onload = () => {
     monthRender();
     paletteLoad()
         .then(() => {
-            /* load garden plants */
-            gardenLoad();
+            /* load garden plants, then follow changes */
+            gardenLoad().then(() => gardenSubscribe());
         })
         .then(() => viewUpdateTransform());
 }
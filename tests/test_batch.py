@@ -0,0 +1,175 @@
+"""Group commit of BatchedStorage with concurrent writer threads."""
+
+import threading
+import time
+
+import pytest
+
+from gardenmap.storage import StorageError
+from gardenmap.storage.batch import BatchedStorage
+from gardenmap.storage.json import JSONFileStorage
+
+
+class GatedStorage(JSONFileStorage):
+    """JSONFileStorage recording its batches, optionally held open (gate) or failed (fail)."""
+
+    def __init__(self, path, **kwargs):
+        super().__init__(path, **kwargs)
+        self.batches = []
+        self.leaders = []
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fail = None
+
+    def apply_batch(self, ops):
+        ops = list(ops)
+        self.batches.append([arg[0]["id"] for _, arg in ops])
+        self.leaders.append(threading.current_thread().name)
+        self.entered.set()
+        self.gate.wait(10)
+        if self.fail is not None and self.fail(ops):
+            raise self.fail_with
+        super().apply_batch(ops)
+
+
+def plant(pid):
+    return {"id": pid, "plant_id": "p", "x": 1.0, "y": 2.0}
+
+
+def run_writers(batched, ids, results):
+    """Start one thread per id appending it, named after it. Outcomes go to results[id]."""
+    def write(pid):
+        try:
+            batched.append([plant(pid)])
+        except BaseException as e:
+            results[pid] = e
+        else:
+            results[pid] = None
+    threads = [threading.Thread(target=write, args=(pid,), name=pid) for pid in ids]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def wait_queued(batched, n):
+    deadline = time.monotonic() + 10
+    while len(batched._queue) < n:
+        assert time.monotonic() < deadline, "writers did not queue up"
+        time.sleep(0.001)
+
+
+def hold_first(batched, storage, results):
+    """Let a first write lead and block inside apply_batch()."""
+    storage.gate.clear()
+    threads = run_writers(batched, ["first"], results)
+    assert storage.entered.wait(10)
+    return threads
+
+
+@pytest.mark.parametrize("journal", [False, True])
+def test_concurrent_writes_all_land(tmp_path, journal):
+    path = tmp_path / "garden.json"
+    batched = BatchedStorage(JSONFileStorage(path, journal=journal))
+    results = {}
+    ids = [f"{t}-{i}" for t in range(16) for i in range(25)]
+
+    def writer(t):
+        for i in range(25):
+            batched.append([plant(f"{t}-{i}")])
+    threads = [threading.Thread(target=writer, args=(t,)) for t in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # read through a storage of its own, not the writer's cache
+    stored = [p["id"] for p in JSONFileStorage(path, journal=journal).get_all()]
+    assert sorted(stored) == sorted(ids)
+    assert not results
+
+
+def test_waiting_writes_form_next_batch_led_by_first_waiter(tmp_path):
+    storage = GatedStorage(tmp_path / "garden.json")
+    batched = BatchedStorage(storage)
+    results = {}
+    threads = hold_first(batched, storage, results)
+    ids = [f"w{i}" for i in range(5)]
+    for pid in ids:
+        threads += run_writers(batched, [pid], results)
+        wait_queued(batched, ids.index(pid) + 1)
+    storage.gate.set()
+    for thread in threads:
+        thread.join(10)
+
+    assert storage.batches == [["first"], ids]
+    # the successor woken to lead is the oldest waiting write's thread
+    assert storage.leaders == ["first", "w0"]
+    assert results == dict.fromkeys(["first"] + ids)
+    assert not batched._leading and not batched._queue
+
+
+def test_max_ops_splits_batches(tmp_path):
+    storage = GatedStorage(tmp_path / "garden.json")
+    batched = BatchedStorage(storage, max_ops=3)
+    results = {}
+    threads = hold_first(batched, storage, results)
+    ids = [f"w{i}" for i in range(7)]
+    for pid in ids:
+        threads += run_writers(batched, [pid], results)
+        wait_queued(batched, ids.index(pid) + 1)
+    storage.gate.set()
+    for thread in threads:
+        thread.join(10)
+
+    assert storage.batches == [["first"], ids[0:3], ids[3:6], ids[6:7]]
+    assert storage.leaders == ["first", "w0", "w3", "w6"]
+    assert sorted(p["id"] for p in storage.get_all()) == sorted(["first"] + ids)
+
+
+def test_failed_batch_fails_every_write_of_it(tmp_path):
+    storage = GatedStorage(tmp_path / "garden.json")
+    batched = BatchedStorage(storage, max_ops=3)
+    storage.fail = lambda ops: any(arg[0]["id"] == "w1" for _, arg in ops)
+    storage.fail_with = OSError("disk full")
+    results = {}
+    threads = hold_first(batched, storage, results)
+    ids = [f"w{i}" for i in range(5)]
+    for pid in ids:
+        threads += run_writers(batched, [pid], results)
+        wait_queued(batched, ids.index(pid) + 1)
+    storage.gate.set()
+    for thread in threads:
+        thread.join(10)
+
+    assert storage.batches == [["first"], ["w0", "w1", "w2"], ["w3", "w4"]]
+    for pid in ("w0", "w1", "w2"):
+        assert isinstance(results[pid], StorageError)
+        assert isinstance(results[pid].__cause__, OSError)
+    assert results["first"] is None and results["w3"] is None and results["w4"] is None
+    assert sorted(p["id"] for p in storage.get_all()) == ["first", "w3", "w4"]
+
+
+def test_base_exception_of_leader_hands_over(tmp_path):
+    storage = GatedStorage(tmp_path / "garden.json")
+    batched = BatchedStorage(storage, max_ops=2)
+    storage.fail = lambda ops: any(arg[0]["id"] == "w0" for _, arg in ops)
+    storage.fail_with = KeyboardInterrupt()
+    results = {}
+    threads = hold_first(batched, storage, results)
+    ids = [f"w{i}" for i in range(4)]
+    for pid in ids:
+        threads += run_writers(batched, [pid], results)
+        wait_queued(batched, ids.index(pid) + 1)
+    storage.gate.set()
+    for thread in threads:
+        thread.join(10)
+        assert not thread.is_alive()
+
+    # the leader gets the exception itself, the others of its batch a StorageError
+    assert isinstance(results["w0"], KeyboardInterrupt)
+    assert isinstance(results["w1"], StorageError)
+    # and the next batch is still committed
+    assert storage.batches == [["first"], ["w0", "w1"], ["w2", "w3"]]
+    assert results["w2"] is None and results["w3"] is None
+    assert not batched._leading
@@ -0,0 +1,124 @@
+"""JSONItemReader fed in small reads."""
+
+import io
+import json
+
+import pytest
+
+from gardenmap.importer import ImportFormatError, JSONItemReader, _TAIL
+
+
+# reads of a single byte cut every value, also within UTF-8 sequences
+READ_SIZES = [1, 2, 3, 7, _TAIL, _TAIL + 1, 64 * 1024]
+
+
+def read(text, read_size, **kwargs):
+    data = text.encode("utf-8") if isinstance(text, str) else text
+    return list(JSONItemReader(io.BytesIO(data), read_size=read_size, **kwargs))
+
+
+ITEMS = [
+    {"id": 1, "plant_id": "aster", "x": 1.5e3, "y": -0.000125},
+    {"id": "a1b2c3", "plant_id": "bärénklau ☃ \U0001f33b", "x": 12345678901234567890, "y": 0},
+    {"id": 3, "plant_id": "tr\"ue", "x": -7, "y": 2.5E-3, "extra": [True, False, None, {"n": 1e-7}]},
+]
+
+
+@pytest.mark.parametrize("read_size", READ_SIZES)
+@pytest.mark.parametrize("text", [
+    json.dumps(ITEMS),
+    json.dumps(ITEMS, ensure_ascii=False, indent=4),
+    json.dumps({"name": "garden", "plantlist": ITEMS, "version": 2}, ensure_ascii=False),
+    json.dumps({"plantlist": ITEMS}),
+])
+def test_items_split_across_reads(text, read_size):
+    assert read(text, read_size) == ITEMS
+
+
+@pytest.mark.parametrize("read_size", READ_SIZES)
+@pytest.mark.parametrize("number", ["1.5e3", "-0.25", "1234567890123", "1E+10", "0"])
+def test_number_cut_at_end_of_read(number, read_size):
+    # numbers are complete when they end with the buffer, unless more follows
+    assert read(f"[{number},{number}]", read_size) == [json.loads(number)] * 2
+    assert read(f"[\n{number}\n]", read_size) == [json.loads(number)]
+
+
+@pytest.mark.parametrize("read_size", READ_SIZES)
+def test_single_item_and_empty_documents(read_size):
+    assert read(json.dumps(ITEMS[1], ensure_ascii=False), read_size) == [ITEMS[1]]
+    assert read("[]", read_size) == []
+    assert read(" [ ] \n", read_size) == []
+    assert read('{"plantlist": []}', read_size) == []
+    assert read("{}", read_size) == [{}]
+
+
+@pytest.mark.parametrize("read_size", READ_SIZES)
+def test_byte_order_mark(read_size):
+    assert read(b"\xef\xbb\xbf" + json.dumps(ITEMS).encode(), read_size) == ITEMS
+
+
+# (a value within one read is bounded by the read size already)
+@pytest.mark.parametrize("read_size", [1, 7, 64])
+def test_value_over_max_size(read_size):
+    big = {"id": 1, "plant_id": "x" * 200}
+    with pytest.raises(ImportFormatError, match="exceeds 100 characters"):
+        read(json.dumps([ITEMS[0], big]), read_size, max_value=100)
+    with pytest.raises(ImportFormatError, match="exceeds 100 characters"):
+        read(json.dumps({"notes": "x" * 200, "plantlist": []}), read_size, max_value=100)
+    # the limit is per value, not per document
+    assert read(json.dumps([ITEMS[0]] * 20), read_size, max_value=100) == [ITEMS[0]] * 20
+
+
+@pytest.mark.parametrize("read_size", READ_SIZES)
+@pytest.mark.parametrize("text", [
+    "",
+    "[",
+    "[1",
+    "[1,",
+    "[1, 2",
+    '[{"id": 1',
+    '[{"id": "abc',
+    '[{"id": 1.5e',
+    '[tru',
+    '{"plantlist": [1, 2]',
+    '{"plantlist": [1',
+    '{"id": 1,',
+    "[\"\\u00",
+])
+def test_truncated(text, read_size):
+    with pytest.raises(ImportFormatError):
+        read(text, read_size)
+
+
+@pytest.mark.parametrize("read_size", READ_SIZES)
+@pytest.mark.parametrize("text", [
+    "[1] x",
+    "[1][2]",
+    "[1],",
+    '{"id": 1} {"id": 2}',
+    '{"plantlist": []} []',
+    "[1, 2 3]",
+    "[1, x]",
+    "{1: 2}",
+    '{"id": 1, 2: 3}',
+    "x",
+])
+def test_invalid_or_trailing_data(text, read_size):
+    with pytest.raises(ImportFormatError):
+        read(text, read_size)
+
+
+@pytest.mark.parametrize("read_size", READ_SIZES)
+def test_error_offset_counts_consumed_text(read_size):
+    with pytest.raises(ImportFormatError, match="after document at offset 13"):
+        read("[1, \"é\", 3]  x", read_size)
+    with pytest.raises(ImportFormatError, match="at offset 4"):
+        read("[1, , 2]", read_size)
+
+
+def test_items_before_an_error_are_yielded():
+    reader = iter(JSONItemReader(io.BytesIO(b'[{"id": 1}, {"id": 2}, oops]'), read_size=2))
+    assert next(reader) == {"id": 1}
+    assert next(reader) == {"id": 2}
+    with pytest.raises(ImportFormatError):
+        next(reader)
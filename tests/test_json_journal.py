@@ -0,0 +1,142 @@
+"""Journal mode of JSONFileStorage, written and read by separate instances (as by two workers)."""
+
+import json
+import os
+import shutil
+
+import pytest
+
+from gardenmap.storage import StorageError
+from gardenmap.storage.json import JSONFileStorage
+
+
+def plant(pid, x=1.0):
+    return {"id": pid, "plant_id": "p", "x": x, "y": 2.0}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "garden.json")
+
+
+def storage(path, **kwargs):
+    # no background compaction, tests compact explicitly
+    return JSONFileStorage(path, journal=True, compact_bytes=1 << 30, compact_interval=1e9, **kwargs)
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def ids(s):
+    return [p["id"] for p in s.get_all()]
+
+
+def mutate(s):
+    s.append([plant(1), plant(2), plant(3)])
+    s.update_one(plant(2, x=5.0))
+    s.update_many([{"id": 3, "x": 7.0}, plant(4)])
+    s.delete_by_ids([1])
+
+
+EXPECTED = [plant(2, x=5.0), plant(3, x=7.0), plant(4)]
+
+
+def test_second_instance_replays_journal(path):
+    writer, reader = storage(path), storage(path)
+    assert reader.get_all() == []
+    mutate(writer)
+    assert os.path.exists(f"{path}.log")
+    # the snapshot itself is untouched
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == {"plantlist": []}
+    assert reader.get_all() == EXPECTED
+    # new entries only are applied on top of the cached document
+    writer.append([plant(5)])
+    assert ids(reader) == [2, 3, 4, 5]
+    assert reader.get_all() == writer.get_all()
+
+
+def test_replay_after_compaction(path):
+    writer, reader = storage(path), storage(path)
+    mutate(writer)
+    assert reader.get_all() == EXPECTED
+    writer.compact()
+    assert not os.path.exists(f"{path}.log")
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["plantlist"] == EXPECTED
+    # the reader's cached log position is of the old log
+    assert reader.get_all() == EXPECTED
+    # writes after compaction start a log based on the new snapshot
+    writer.append([plant(6)])
+    writer.delete_by_ids([2])
+    assert ids(reader) == [3, 4, 6]
+    # compaction by the other instance
+    reader.compact()
+    writer.update_one(plant(3, x=0.0))
+    assert writer.get_all() == reader.get_all() == [plant(3, x=0.0), plant(4), plant(6)]
+    assert storage(path).get_all() == writer.get_all()
+
+
+def test_compaction_between_reads_without_new_writes(path):
+    writer, reader = storage(path), storage(path)
+    writer.append([plant(1)])
+    assert ids(reader) == [1]
+    writer.append([plant(2)])
+    writer.compact()
+    writer.append([plant(3)])
+    assert ids(reader) == [1, 2, 3]
+
+
+def test_stale_log_is_ignored(path):
+    """A log whose header names an earlier snapshot (left by an interrupted compaction)."""
+    writer = storage(path)
+    mutate(writer)
+    shutil.copy(f"{path}.log", f"{path}.stale")
+    writer.compact()
+    # compaction replaced the snapshot, but "crashed" before removing the log
+    os.replace(f"{path}.stale", f"{path}.log")
+
+    # applying the log again would duplicate items or bring back deleted ones
+    assert storage(path).get_all() == EXPECTED
+    # a new write replaces the stale log
+    writer.append([plant(9)])
+    with open(f"{path}.log", encoding="utf-8") as f:
+        header, *entries = f.read().splitlines()
+    assert json.loads(header)["base"] == list(_stamp(path))
+    assert len(entries) == 1
+    assert ids(storage(path)) == [2, 3, 4, 9]
+
+
+def test_log_with_foreign_header_is_ignored(path):
+    writer = storage(path)
+    writer.append([plant(1)])
+    writer.compact()
+    st = os.stat(path)
+    with open(f"{path}.log", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"base": [st.st_ino, st.st_mtime_ns + 1, st.st_size], "created": 0}) + "\n")
+        f.write(json.dumps({"op": "append", "arg": [plant(2)]}) + "\n")
+    assert ids(storage(path)) == [1]
+
+
+def test_partial_last_line_is_not_replayed(path):
+    writer, reader = storage(path), storage(path)
+    writer.append([plant(1)])
+    line = json.dumps({"op": "append", "arg": [plant(2)]}) + "\n"
+    with open(f"{path}.log", "a", encoding="utf-8") as f:
+        f.write(line[:10])
+    assert ids(reader) == [1]
+    with open(f"{path}.log", "a", encoding="utf-8") as f:
+        f.write(line[10:])
+    assert ids(reader) == [1, 2]
+    assert ids(storage(path)) == [1, 2]
+
+
+def test_corrupt_log(path):
+    writer = storage(path)
+    writer.append([plant(1)])
+    with open(f"{path}.log", "a", encoding="utf-8") as f:
+        f.write('{"op": "append"}\n')
+    with pytest.raises(StorageError):
+        storage(path).get_all()